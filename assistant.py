@@ -8,7 +8,7 @@ import re
 from typing import Optional, Tuple, Dict, List
 
 from core.llm_factory import create_llm_client, normalize_provider
-from core.storage import Storage
+from core.storage import create_storage
 from core.interview import InterviewManager
 from core.environment import EnvironmentCollector
 from core.research import ResearchEngine
@@ -20,7 +20,7 @@ class InvestmentAssistant:
 
     def __init__(self):
         self.display = Display()
-        self.storage = Storage()
+        self.storage = create_storage()
 
         # 获取 API Key（OpenAI 或 Gemini）
         if not (self.storage.get_openai_api_key() or self.storage.get_gemini_api_key()):
@@ -531,7 +531,7 @@ class InvestmentAssistant:
     def _show_history(self, stock_name: str):
         """显示研究历史"""
         stock_id = stock_name.lower().replace(" ", "_")
-        history = self.storage.get_research_history(stock_id)
+        history = self.storage.get_research_history(stock_id, include_reports=False)
         records = history.get("records", [])
         self.display.history_table(records)
 
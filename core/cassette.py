@@ -0,0 +1,281 @@
+"""Record / replay cassettes for external calls (search providers, RSS, LLM chat).
+
+Wrapped calls go through `record_or_replay(kind, route, request, fn)`:
+
+- record: `fn` runs live; the request, the response (or the error) and the latency
+  are appended to the cassette, one JSON interaction per line.
+- replay: `fn` never runs; the matching recorded response is returned (or the
+  recorded error raised), optionally after sleeping the recorded latency. A
+  recorded timeout is raised as `ReplayedTimeout`, a `TimeoutError`, so callers
+  classify it as they would the live timeout.
+- no active cassette: `fn()` is returned as is.
+
+Configuration: `IA_CASSETTE_MODE` (record / replay) and `IA_CASSETTE_PATH` (the
+JSONL file), `IA_CASSETTE_LATENCY` (replay latency scale: 0 = instant, the
+default, 1 = as recorded) and `IA_CASSETTE_STRICT=1`. Tests and scripts can use
+`use_cassette(...)` instead.
+
+Matching: an unconsumed interaction with the exact same request comes first.
+Prompts embed dates and stored research history, so a replayed run rarely repeats
+its LLM requests byte for byte. Unless strict, replay therefore falls back to the
+next unconsumed interaction on the same route (e.g. `openai:gpt-5.2`,
+`tavily`), in recorded order.
+
+Route order: interactions are appended as calls complete, so callers whose
+order matters (the search providers' priority) record it with `set_routes`;
+`routes` returns that order on replay.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+
+
+class CassetteMiss(RuntimeError):
+    """Replay found no recorded interaction for a call."""
+
+
+class ReplayedError(RuntimeError):
+    """A call that failed while recording fails the same way on replay."""
+
+    def __init__(self, error_type: str, message: str):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+
+
+class ReplayedTimeout(ReplayedError, TimeoutError):
+    """A call that timed out while recording; still a `TimeoutError` on replay."""
+
+
+def _is_timeout(error_type: str) -> bool:
+    # covers TimeoutError / DeadlineExceeded / requests' ReadTimeout / openai's APITimeoutError
+    return "Timeout" in error_type or error_type == "DeadlineExceeded"
+
+
+def _request_key(kind: str, route: str, request: Any) -> str:
+    raw = json.dumps({"kind": kind, "route": route, "request": request}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """One cassette file in record or replay mode (thread-safe)."""
+
+    def __init__(self, path: str, mode: str, *, latency_scale: float = 0.0, strict: bool = False):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"cassette mode must be one of {CASSETTE_MODES}, got {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = max(0.0, latency_scale)
+        self.strict = strict
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._scratch: Optional[str] = None
+        self._records: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, Deque[int]] = {}
+        self._by_route: Dict[Tuple[str, str], Deque[int]] = {}
+        self._used: set = set()
+        self._route_order: Dict[str, List[str]] = {}
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("", "utf-8")  # a recording starts from an empty cassette
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                rec = json.loads(line)
+                if rec.get("meta") == "routes":
+                    self._route_order[rec["kind"]] = rec["routes"]
+                    continue
+                idx = len(self._records)
+                self._records.append(rec)
+                self._by_key.setdefault(rec["key"], deque()).append(idx)
+                self._by_route.setdefault((rec["kind"], rec["route"]), deque()).append(idx)
+        logger.info(f"[Cassette._load] {len(self._records)} interaction(s) from {self.path}")
+
+    def routes(self, kind: str) -> List[str]:
+        """Recorded routes of one kind: the order given to `set_routes`, then any
+        other route in order of first appearance."""
+        with self._lock:
+            ordered = list(self._route_order.get(kind, []))
+            ordered += [r["route"] for r in self._records if r["kind"] == kind]
+        return list(dict.fromkeys(ordered))
+
+    def set_routes(self, kind: str, routes: List[str]) -> None:
+        """Record the intended order of `kind` routes (e.g. provider priority).
+
+        Routes not seen before are appended to the order already recorded; the
+        cassette is only written when that order changes. No-op on replay.
+        """
+        if self.mode != "record":
+            return
+        with self._lock:
+            current = self._route_order.get(kind, [])
+            merged = list(dict.fromkeys(current + list(routes)))
+            if merged == current:
+                return
+            self._route_order[kind] = merged
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"meta": "routes", "kind": kind, "routes": merged}, ensure_ascii=False) + "\n")
+
+    def scratch_dir(self) -> str:
+        """Per-run temp directory (e.g. an empty search cache so record and replay make the same calls)."""
+        with self._lock:
+            if self._scratch is None:
+                self._scratch = tempfile.mkdtemp(prefix="ia-cassette-")
+            return self._scratch
+
+    def call(
+        self,
+        kind: str,
+        route: str,
+        request: Any,
+        fn: Callable[[], Any],
+        *,
+        encode: Optional[Callable[[Any], Any]] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        if self.mode == "record":
+            return self._record(kind, route, request, fn, encode)
+        return self._replay(kind, route, request, decode)
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            rec["seq"] = len(self._records)
+            self._records.append(rec)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+            self.stats["recorded"] += 1
+
+    def _record(self, kind, route, request, fn, encode) -> Any:
+        rec: Dict[str, Any] = {"kind": kind, "route": route, "key": _request_key(kind, route, request), "request": request}
+        start = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            timeout = isinstance(e, TimeoutError) or _is_timeout(type(e).__name__)
+            error = {"type": type(e).__name__, "message": str(e), "timeout": timeout}
+            rec.update(response=None, error=error, latency=time.monotonic() - start)
+            self._append(rec)
+            raise
+        rec.update(response=encode(result) if encode else result, error=None, latency=time.monotonic() - start)
+        self._append(rec)
+        return result
+
+    def _take(self, kind: str, route: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queues = [(self._by_key.get(key), "replayed")]
+            if not self.strict:
+                queues.append((self._by_route.get((kind, route)), "fallback"))
+            for queue, outcome in queues:
+                while queue:
+                    idx = queue.popleft()
+                    if idx in self._used:
+                        continue
+                    self._used.add(idx)
+                    self.stats[outcome] += 1
+                    return self._records[idx]
+            self.stats["missed"] += 1
+            return None
+
+    def _replay(self, kind, route, request, decode) -> Any:
+        rec = self._take(kind, route, _request_key(kind, route, request))
+        if rec is None:
+            raise CassetteMiss(f"no recorded {kind} interaction for route {route!r} in {self.path}")
+        if rec["key"] != _request_key(kind, route, request):
+            logger.debug(f"[Cassette._replay] {kind}/{route}: request differs from recording, replaying by route order")
+        if self.latency_scale and rec.get("latency"):
+            time.sleep(rec["latency"] * self.latency_scale)
+        error = rec.get("error")
+        if error:
+            error_type = error.get("type", "Error")
+            timeout = error.get("timeout", _is_timeout(error_type))  # cassettes recorded before the flag
+            raise (ReplayedTimeout if timeout else ReplayedError)(error_type, error.get("message", ""))
+        response = rec.get("response")
+        return decode(response) if decode else response
+
+
+_OVERRIDE_LOCK = threading.Lock()
+_OVERRIDE: List[Cassette] = []  # stack; set by use_cassette / set_cassette
+_ENV_CASSETTE: Dict[str, Any] = {"signature": None, "cassette": None}
+
+
+def _env_cassette() -> Optional[Cassette]:
+    mode = (os.getenv("IA_CASSETTE_MODE") or "").strip().lower()
+    path = (os.getenv("IA_CASSETTE_PATH") or "").strip()
+    if mode not in CASSETTE_MODES or not path:
+        return None
+    latency = float(os.getenv("IA_CASSETTE_LATENCY") or 0)
+    strict = (os.getenv("IA_CASSETTE_STRICT") or "").strip() in ("1", "true", "yes")
+    signature = (mode, path, latency, strict)
+    with _OVERRIDE_LOCK:
+        if _ENV_CASSETTE["signature"] != signature:
+            _ENV_CASSETTE["cassette"] = Cassette(path, mode, latency_scale=latency, strict=strict)
+            _ENV_CASSETTE["signature"] = signature
+            logger.info(f"[cassette] {mode} mode, cassette={path}")
+        return _ENV_CASSETTE["cassette"]
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The active cassette: `use_cassette` / `set_cassette` override, else from env (one per process)."""
+    if _OVERRIDE:
+        return _OVERRIDE[-1]
+    return _env_cassette()
+
+
+def set_cassette(cassette: Optional[Cassette]) -> None:
+    """Install `cassette` for the whole process (None = fall back to env)."""
+    with _OVERRIDE_LOCK:
+        _OVERRIDE.clear()
+        if cassette is not None:
+            _OVERRIDE.append(cassette)
+
+
+@contextmanager
+def use_cassette(path: str, mode: str, **kwargs) -> Iterator[Cassette]:
+    cassette = Cassette(path, mode, **kwargs)
+    with _OVERRIDE_LOCK:
+        _OVERRIDE.append(cassette)
+    try:
+        yield cassette
+    finally:
+        with _OVERRIDE_LOCK:
+            _OVERRIDE.remove(cassette)
+
+
+def record_or_replay(
+    kind: str,
+    route: str,
+    request: Any,
+    fn: Callable[[], Any],
+    *,
+    encode: Optional[Callable[[Any], Any]] = None,
+    decode: Optional[Callable[[Any], Any]] = None,
+) -> Any:
+    """Run `fn` through the active cassette, or directly when none is active.
+
+    `request` must be JSON-serializable and identify the call; `encode` / `decode`
+    convert the response to and from JSON-friendly values.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return fn()
+    return cassette.call(kind, route, request, fn, encode=encode, decode=decode)
@@ -9,6 +9,7 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 from .openai_client import OpenAIClient
+from .retrieval import Deadline
 from .storage import Storage
 
 
@@ -151,13 +152,23 @@ IMPACT_ASSESSMENT_PROMPT = """## 角色
 class EnvironmentCollector:
     """Environment 采集器"""
 
+    # 新闻采集（检索 + RSS 补充）的默认总时间预算（秒）
+    NEWS_DEADLINE_SECONDS = 90
+
     def __init__(self, client: OpenAIClient, storage: Storage):
         self.client = client
         self.storage = storage
 
-    def collect_news(self, stock_id: str, stock_name: str, time_range_days: int = 7) -> Dict:
+    def collect_news(self, stock_id: str, stock_name: str, time_range_days: int = 7,
+                     allow_stale: bool = False, deadline: Optional[Deadline] = None) -> Dict:
         """采集相关新闻（使用多维度分层搜索）
 
+        allow_stale=True 时检索层可直接返回过期缓存并后台刷新（批量扫描用），
+        search_metadata.stale 标记是否使用了过期结果。
+
+        deadline 为本次采集的时间预算（默认 NEWS_DEADLINE_SECONDS），所有检索请求以剩余时间为超时；
+        预算耗尽时返回已取得的部分结果，search_metadata.deadline_exceeded 为 True。
+
         返回格式: {
             "news": List[Dict],  # 新闻列表
             "search_metadata": Dict  # 搜索元数据，包含警告信息
@@ -172,13 +183,18 @@ class EnvironmentCollector:
             related_entities = playbook.get("related_entities", [])
             logger.debug(f"[collect_news] Related entities: {related_entities}")
 
+        if deadline is None:
+            deadline = Deadline(self.NEWS_DEADLINE_SECONDS)
+
         # 使用多维度结构化新闻搜索
         try:
             raw_result = self.client.search_news_structured(
                 stock_name=stock_name,
                 related_entities=related_entities,
                 time_range_days=time_range_days,
-                playbook=playbook  # 传入 Playbook 以增强搜索
+                playbook=playbook,  # 传入 Playbook 以增强搜索
+                allow_stale=allow_stale,
+                deadline=deadline,
             )
         except Exception as e:
             logger.error(f"[collect_news] search_news_structured exception: {type(e).__name__}: {e}")
@@ -325,12 +341,13 @@ class EnvironmentCollector:
     ) -> Dict:
         """评估影响，判断是否需要 Deep Research"""
         # 获取所需数据
-        portfolio = self.storage.get_portfolio_playbook()
-        stock_playbook = self.storage.get_stock_playbook(stock_id)
-        recent_history = self.storage.get_recent_research(stock_id, limit=3)
-        research_context = self.storage.get_research_context(stock_id, limit=3)  # 带用户反馈的历史
-        user_preferences = self.storage.get_preferences_for_prompt()  # 用户偏好
-        historical_uploads = self.storage.get_historical_uploads(stock_id, limit=5)  # 历史上传文件
+        bundle = self.storage.get_stock_context_bundle(stock_id, recent_limit=3, context_limit=3, uploads_limit=5)
+        portfolio = bundle["portfolio_playbook"]
+        stock_playbook = bundle["stock_playbook"]
+        recent_history = bundle["recent_research"]
+        research_context = bundle["research_context"]  # 带用户反馈的历史
+        user_preferences = bundle["preferences_prompt"]  # 用户偏好
+        historical_uploads = bundle["historical_uploads"]  # 历史上传文件
 
         # 格式化数据
         portfolio_str = json.dumps(portfolio, ensure_ascii=False, indent=2) if portfolio else "（暂无）"
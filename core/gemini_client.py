@@ -11,13 +11,20 @@ import urllib.request
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Tuple, TYPE_CHECKING
 
 try:
     from google import genai
 except ImportError as e:
     raise ImportError("请先安装 google-genai: pip install google-genai") from e
 
+from .cassette import record_or_replay
+from .news_pipeline import STRUCTURE_LIMIT, NewsRun
+from .urlnorm import canonicalize_url, url_dedup_key
+
+if TYPE_CHECKING:
+    from .retrieval import Deadline
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,20 +61,36 @@ class GeminiClient:
         contents.append({"role": "user", "parts": [{"text": prompt}]})
         return contents
 
+    def _generate(self, model: str, contents: List[Dict], system_instruction: Optional[str] = None) -> str:
+        request: Dict = {"contents": contents}
+        if system_instruction is not None:
+            request["system_instruction"] = system_instruction
+        return record_or_replay(
+            "chat", f"gemini:{model}", request, lambda: self._generate_live(model, contents, system_instruction)
+        )
+
+    def _generate_live(self, model: str, contents: List[Dict], system_instruction: Optional[str] = None) -> str:
+        if system_instruction is None:
+            resp = self.client.models.generate_content(model=model, contents=contents)
+        else:
+            resp = self.client.models.generate_content(
+                model=model,
+                contents=contents,
+                system_instruction=system_instruction,
+            )
+        text = getattr(resp, "text", None)
+        return text or ""
+
     def chat(self, prompt: str, history: Optional[List[Dict]] = None) -> str:
         return self.chat_pro(prompt, history)
 
     def chat_pro(self, prompt: str, history: Optional[List[Dict]] = None) -> str:
         contents = self._build_contents(prompt, history)
-        resp = self.client.models.generate_content(model=self._model_pro, contents=contents)
-        text = getattr(resp, "text", None)
-        return text or ""
+        return self._generate(self._model_pro, contents)
 
     def chat_flash(self, prompt: str, history: Optional[List[Dict]] = None) -> str:
         contents = self._build_contents(prompt, history)
-        resp = self.client.models.generate_content(model=self._model_flash, contents=contents)
-        text = getattr(resp, "text", None)
-        return text or ""
+        return self._generate(self._model_flash, contents)
 
     def chat_with_system(self, system_prompt: str, user_message: str,
                          history: Optional[List[Dict]] = None) -> str:
@@ -76,24 +99,12 @@ class GeminiClient:
     def chat_with_system_pro(self, system_prompt: str, user_message: str,
                              history: Optional[List[Dict]] = None) -> str:
         contents = self._build_contents(user_message, history)
-        resp = self.client.models.generate_content(
-            model=self._model_pro,
-            contents=contents,
-            system_instruction=system_prompt,
-        )
-        text = getattr(resp, "text", None)
-        return text or ""
+        return self._generate(self._model_pro, contents, system_prompt)
 
     def chat_with_system_flash(self, system_prompt: str, user_message: str,
                                history: Optional[List[Dict]] = None) -> str:
         contents = self._build_contents(user_message, history)
-        resp = self.client.models.generate_content(
-            model=self._model_flash,
-            contents=contents,
-            system_instruction=system_prompt,
-        )
-        text = getattr(resp, "text", None)
-        return text or ""
+        return self._generate(self._model_flash, contents, system_prompt)
 
     def search(self, query: str, time_range_days: int = 7) -> str:
         """降级：不进行联网搜索，仅返回提示。"""
@@ -121,18 +132,31 @@ class GeminiClient:
     def model_pro(self) -> str:
         return self._model_pro
 
-    def _fetch_google_news_rss(self, query: str, time_range_days: int, limit: int = 8) -> Tuple[List[Dict[str, str]], Optional[str]]:
-        """Fetch Google News RSS items.
+    def _fetch_google_news_rss(
+        self, query: str, time_range_days: int, limit: int = 8, timeout: float = 20
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """Fetch Google News RSS items (recorded / replayed when a cassette is active).
 
         Returns (items, error). Each item: {title, link, pubDate, source}.
         """
+        items, error = record_or_replay(
+            "rss",
+            "google_news",
+            {"query": query, "time_range_days": time_range_days, "limit": limit},
+            lambda: self._fetch_google_news_rss_live(query, time_range_days, limit, timeout),
+        )
+        return items, error
+
+    def _fetch_google_news_rss_live(
+        self, query: str, time_range_days: int, limit: int, timeout: float
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
         try:
             q_str = query
             if "when:" not in q_str:
                 q_str = f"{q_str} when:{time_range_days}d"
             q = urllib.parse.quote(q_str)
             url = f"https://news.google.com/rss/search?q={q}&hl=zh-CN&gl=CN&ceid=CN:zh-Hans"
-            with urllib.request.urlopen(url, timeout=20) as resp:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
                 xml_bytes = resp.read()
             root = ET.fromstring(xml_bytes)
             channel = root.find('channel')
@@ -141,7 +165,7 @@ class GeminiClient:
             items = []
             for it in channel.findall('item'):
                 title = (it.findtext('title') or '').strip()
-                link = (it.findtext('link') or '').strip()
+                link = canonicalize_url((it.findtext('link') or '').strip())
                 pub_raw = (it.findtext('pubDate') or '').strip()
                 try:
                     pub = parsedate_to_datetime(pub_raw).strftime('%Y-%m-%d')
@@ -168,12 +192,13 @@ class GeminiClient:
             return []
 
         compact = []
-        for x in rss_items[:8]:
+        for x in rss_items[:STRUCTURE_LIMIT]:
             compact.append({
                 "title": x.get("title", ""),
                 "source": x.get("source", ""),
                 "date": x.get("pubDate", ""),
                 "link": x.get("link", ""),
+                "coverage": x.get("cluster_size", 1),
             })
 
         prompt = f"""你在做投资环境跟踪。目标公司/标的：{stock_name}
@@ -181,7 +206,7 @@ class GeminiClient:
 维度：{dimension}
 关注点：{focus}
 
-下面是 Google News RSS 抓取到的原始条目（可能有噪音/重复/标题党），请你筛出最多 5 条最重要的，并严格输出 JSON（只输出 JSON，不要解释）：
+下面是 Google News RSS 抓取到的原始条目（可能有噪音/重复/标题党；coverage 为报道同一事件的来源数，已合并近似重复），请你筛出最多 5 条最重要的，并严格输出 JSON（只输出 JSON，不要解释）：
 
 {{
   \"news\": [
@@ -218,6 +243,7 @@ class GeminiClient:
                     "importance": "中",
                     "source": x.get("source", ""),
                     "url": x.get("link", ""),
+                    "cluster_size": x.get("coverage", 1),
                 })
             return fallback
 
@@ -227,8 +253,10 @@ class GeminiClient:
         try:
             obj = json.loads(m.group(0))
             out = obj.get('news', [])
+            coverage = {url_dedup_key(x["link"]): x["coverage"] for x in compact if x.get("link")}
             for n in out:
                 n['dimension'] = dimension
+                n['cluster_size'] = coverage.get(url_dedup_key(n.get('url') or ''), 1)
             return out[:5]
         except Exception:
             return []
@@ -275,8 +303,13 @@ class GeminiClient:
         related_entities: List[str],
         time_range_days: int = 7,
         playbook: Optional[Dict] = None,
+        allow_stale: bool = False,
+        deadline: Optional["Deadline"] = None,
     ) -> List[Dict]:
-        """结构化新闻搜索。"""
+        """结构化新闻搜索。allow_stale=True 时允许返回过期缓存并后台刷新。
+
+        deadline 为整次采集的时间预算，耗尽后返回部分结果（metadata.deadline_exceeded）。
+        """
         logger.info(f"[search_news_structured] Starting for {stock_name}, range={time_range_days}d")
 
         end_date = datetime.now()
@@ -302,39 +335,33 @@ class GeminiClient:
         total_rss_items = 0
         missing_dims: List[tuple] = []
 
-        from .retrieval import SearchManager, TavilyProvider, OpenClawWebSearchProvider
+        from .retrieval import SEARCH_STALE_TTL_SECONDS, SearchManager, get_search_providers
 
         tavily_key = self._tavily_api_key
-        providers = []
-        if tavily_key:
-            try:
-                providers.append(TavilyProvider(api_key=tavily_key))
-            except Exception as e:
-                logger.error(f"[search_news_structured] TavilyProvider init failed: {e}")
-        try:
-            oc = OpenClawWebSearchProvider()
-            if oc.is_available():
-                providers.append(oc)
-        except Exception as e:
-            logger.error(f"[search_news_structured] OpenClawWebSearchProvider init failed: {e}")
+        providers = get_search_providers(tavily_key)
 
         sm = SearchManager(
             providers=providers,
             cache_ttl_seconds=6 * 3600,
             hard_timeout_seconds=20,
+            stale_ttl_seconds=SEARCH_STALE_TTL_SECONDS if allow_stale else None,
+            caller="collect_news",
         )
         logger.info(f"[search_news_structured] {len(sm.providers)} provider(s)")
 
         def _merge_hits(a, b):
             merged, seen = [], set()
             for h in (a or []) + (b or []):
-                url = (h.url or "").strip()
-                if not url or url in seen:
+                key = url_dedup_key(h.url or "")
+                if not key or key in seen:
                     continue
-                seen.add(url)
+                seen.add(key)
                 merged.append(h)
             return merged
 
+        # 跨维度去重、论点重排、deadline 与 Provider 统计（见 core/news_pipeline.py）
+        run = NewsRun(playbook=playbook, deadline=deadline)
+
         def _dedup_by_title(items: List[Dict]) -> List[Dict]:
             seen_t, out = set(), []
             for n in items:
@@ -350,31 +377,39 @@ class GeminiClient:
             rss_fallback_triggered = True
             rss_fallback_reason.append("no_providers")
             for dim, q, focus in dims:
-                items, err = self._fetch_google_news_rss(q, time_range_days=time_range_days, limit=8)
+                items, err = run.fetch_rss(self._fetch_google_news_rss, dim, q, time_range_days)
                 if err:
                     failed.append({"dimension": dim, "error": err})
                     continue
                 total_rss_items += len(items)
-                structured = self._rss_items_to_structured_news(stock_name, dim, focus, items)
+                structured = self._rss_items_to_structured_news(stock_name, dim, focus, run.take_unseen(items))
                 all_news.extend(structured)
         else:
             warnings.append("新闻来源=Tavily + Brave Search（union）。")
+            en_queries = {dim: self._build_english_query(dim, english_aliases) for dim, _, _ in dims}
+            batch = [q for _, q, _ in dims] + [eq for eq in en_queries.values() if eq]
+            outcomes = sm.search_many(batch, max_results=8, topic="news", depth="basic", deadline=deadline)
+            for outcome in outcomes.values():
+                run.record_outcome(outcome)
+
             for dim, q, focus in dims:
-                cn_hits = sm.search(q, max_results=8, topic="news", depth="basic")
+                cn_outcome = outcomes.get(q)
+                cn_hits = cn_outcome.results if cn_outcome else []
                 en_hits = []
-                en_query = self._build_english_query(dim, english_aliases)
+                en_query = en_queries.get(dim)
                 if en_query:
-                    en_hits = sm.search(en_query, max_results=8, topic="news", depth="basic")
+                    en_outcome = outcomes.get(en_query)
+                    en_hits = en_outcome.results if en_outcome else []
 
                 hits = _merge_hits(cn_hits, en_hits)
                 if not hits:
                     missing_dims.append((dim, q, focus))
 
                 rss_like = [
-                    {"title": h.title, "source": h.provider, "pubDate": h.published or "", "link": h.url}
+                    {"title": h.title, "source": h.provider, "pubDate": h.published or "", "link": h.url, "snippet": h.snippet}
                     for h in hits if h.title and h.url
                 ]
-                structured = self._rss_items_to_structured_news(stock_name, dim, focus, rss_like)
+                structured = self._rss_items_to_structured_news(stock_name, dim, focus, run.take_unseen(rss_like))
                 all_news.extend(structured)
 
             uniq_pre = _dedup_by_title(all_news)
@@ -387,12 +422,12 @@ class GeminiClient:
                 dims_to_fetch = dims if len(uniq_pre) < 10 else missing_dims
                 logger.info(f"[search_news_structured] RSS fallback: uniq={len(uniq_pre)}, missing={len(missing_dims)}")
                 for dim, q, focus in dims_to_fetch:
-                    items, err = self._fetch_google_news_rss(q, time_range_days=time_range_days, limit=8)
+                    items, err = run.fetch_rss(self._fetch_google_news_rss, dim, q, time_range_days)
                     if err:
                         failed.append({"dimension": dim, "error": err})
                         continue
                     total_rss_items += len(items)
-                    structured = self._rss_items_to_structured_news(stock_name, dim, focus, items)
+                    structured = self._rss_items_to_structured_news(stock_name, dim, focus, run.take_unseen(items))
                     all_news.extend(structured)
 
         uniq = _dedup_by_title(all_news)
@@ -400,6 +435,8 @@ class GeminiClient:
         imp = {"高": 0, "中": 1, "低": 2}
         uniq.sort(key=lambda x: (imp.get(x.get('importance', '低'), 2), x.get('date', '')), reverse=False)
 
+        warnings.extend(run.warnings())
+
         metadata = {
             "_is_metadata": True,
             "total_dimensions": len(dims),
@@ -407,7 +444,10 @@ class GeminiClient:
             "failed_dimensions": failed,
             "rss_fallback_triggered": rss_fallback_triggered,
             "rss_fallback_reason": rss_fallback_reason,
+            **run.metadata(),
             "total_rss_items": total_rss_items,
+            "provider_health": sm.health.snapshot([p.name for p in sm.providers]),
+            "rate_limits": sm.limits.stats([p.name for p in sm.providers]),
             "search_warnings": [
                 *warnings,
                 f"range={start_date.strftime('%Y-%m-%d')}..{end_date.strftime('%Y-%m-%d')}",
@@ -8,6 +8,7 @@ from typing import Optional, Dict
 from .storage import Storage
 from .openai_client import OpenAIClient
 from .gemini_client import GeminiClient
+from .retrieval import configure_rate_limits
 
 OPENAI_DEFAULT_MODEL_PRO = "gpt-5.2"
 OPENAI_DEFAULT_MODEL_FLASH = "gpt-5.2"
@@ -94,6 +95,7 @@ def create_llm_client(
     model_flash = resolve_llm_model_flash(storage, provider, model_flash)
 
     tavily_api_key = storage.get_tavily_api_key()
+    configure_rate_limits(storage.get_search_rate_limits())
 
     if provider == "gemini":
         api_key = storage.get_gemini_api_key()
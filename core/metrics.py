@@ -0,0 +1,164 @@
+"""In-process counters and histograms (thread-safe, JSON-dumpable).
+
+Series are identified by a name plus string labels. Queries take a label
+subset and aggregate every matching series, so `counter("provider_calls",
+provider="tavily")` sums over all callers while adding `caller="collect_news"`
+narrows it to one.
+
+Histograms use fixed bucket upper bounds; quantiles are estimated as the upper
+bound of the bucket holding the requested rank (the observed max for the
+overflow bucket).
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+COUNT_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 8, 10, 20, 50)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _matches(series: _Labels, query: _Labels) -> bool:
+    return set(query) <= set(series)
+
+
+class Histogram:
+    """Bucketed distribution with count / sum / min / max."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "Histogram") -> None:
+        if other.buckets != self.buckets:
+            raise ValueError("cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        for v in (other.min, other.max):
+            if v is not None:
+                self.min = v if self.min is None else min(self.min, v)
+                self.max = v if self.max is None else max(self.max, v)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))  # nearest-rank
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                bound = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "mean": None if self.mean is None else round(self.mean, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(b): c for b, c in zip(list(self.buckets) + ["+Inf"], self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """Named, labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, _Labels], float] = {}
+        self._histograms: Dict[Tuple[str, _Labels], Histogram] = {}
+
+    def inc(self, name: str, n: float = 1, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, name: str, value: float, *, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Sum of every `name` series whose labels include `labels`."""
+        query = _labels(labels)
+        with self._lock:
+            return sum(v for (n, l), v in self._counters.items() if n == name and _matches(l, query))
+
+    def histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+        """Merged copy of every matching `name` histogram (None if nothing was observed)."""
+        query = _labels(labels)
+        merged: Optional[Histogram] = None
+        with self._lock:
+            for (n, l), hist in self._histograms.items():
+                if n != name or not _matches(l, query):
+                    continue
+                if merged is None:
+                    merged = Histogram(hist.buckets)
+                merged.merge(hist)
+        return merged
+
+    def label_values(self, label: str, name: Optional[str] = None) -> List[str]:
+        """Distinct values of one label (optionally for one metric), in first-seen order."""
+        with self._lock:
+            keys = list(self._counters) + list(self._histograms)
+        values = (v for n, l in keys if name is None or n == name for k, v in l if k == label)
+        return list(dict.fromkeys(values))
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            counters = [
+                {"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())
+            ]
+            histograms = [
+                {"name": n, "labels": dict(l), **h.snapshot()} for (n, l), h in sorted(self._histograms.items(), key=lambda kv: kv[0])
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def dump(self, path: str) -> None:
+        Path(path).write_text(self.to_json(), "utf-8")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
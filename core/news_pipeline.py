@@ -0,0 +1,135 @@
+"""Per-run state shared by the clients' `search_news_structured`.
+
+Both the OpenAI and Gemini clients search several news dimensions and hand
+each dimension's candidates to the flash model for structuring. `NewsRun`
+holds what spans dimensions in one run:
+
+- cross-dimension URL dedupe and near-duplicate clustering, then the playbook
+  thesis re-rank ahead of the structuring cut (`take_unseen`)
+- the run's deadline for Google News RSS requests (`fetch_rss`)
+- provider bookkeeping from `SearchOutcome`s (`record_outcome`)
+
+and renders the resulting warnings and metadata fields.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .neardup import NearDuplicateIndex, cluster_near_duplicates
+from .rerank import PlaybookRanker
+from .urlnorm import url_dedup_key
+
+if TYPE_CHECKING:
+    from .retrieval import Deadline, SearchOutcome
+
+
+# Items per dimension handed to the structuring model.
+STRUCTURE_LIMIT = 8
+RSS_TIMEOUT_SECONDS = 20
+
+def _title(item: Dict) -> str:
+    return item.get("title") or ""
+
+
+RssFetch = Callable[..., Tuple[List[Dict[str, str]], Optional[str]]]
+
+
+class NewsRun:
+    """Dedupe, ranking, deadline and provider bookkeeping for one news collection."""
+
+    def __init__(self, *, playbook: Optional[Dict] = None, deadline: Optional["Deadline"] = None):
+        self.deadline = deadline
+        self.ranker = PlaybookRanker.from_playbook(playbook)
+        self.seen_url_keys = set()
+        self.near_dup_index = NearDuplicateIndex()
+        self.duplicate_urls_skipped = 0
+        self.near_duplicates_skipped = 0
+        self.deadline_skipped: List[str] = []
+        self.provider_hits: Dict[str, int] = {}
+        self.timed_out_providers: List[str] = []
+        self.skipped_providers: List[str] = []
+        self.stale_queries = 0
+
+    def take_unseen(self, items: List[Dict]) -> List[Dict]:
+        """The items to structure for one dimension (at most STRUCTURE_LIMIT).
+
+        URL dedupe against the run, then near-duplicate clustering: items matching
+        a headline structured earlier in the run are dropped, the rest are clustered
+        within the batch (representatives carry `cluster_size`). Representatives
+        are re-ranked against the playbook thesis and cut to the limit; only the
+        returned items are marked seen (canonical URL and near-duplicate index), so
+        an item cut here can still be structured by a later dimension or the RSS
+        fallback.
+        Items are RSS-like dicts (`title`, `link`, optional `snippet`).
+        """
+        out = []
+        batch_keys = set()
+        for it in items:
+            key = url_dedup_key(it.get("link") or "")
+            if key and (key in self.seen_url_keys or key in batch_keys):
+                self.duplicate_urls_skipped += 1
+                continue
+            if key:
+                batch_keys.add(key)
+            out.append(it)
+        fresh = [it for it in out if self.near_dup_index.match(_title(it)) is None]
+        reps, dropped = cluster_near_duplicates(fresh, text_of=_title)
+        self.near_duplicates_skipped += len(out) - len(fresh) + dropped
+        if self.ranker is not None:
+            reps = self.ranker.rank(reps, lambda x: f"{x.get('title', '')} {x.get('snippet', '')}")
+        selected = reps[:STRUCTURE_LIMIT]
+        for it in selected:
+            self.near_dup_index.add(_title(it))
+            key = url_dedup_key(it.get("link") or "")
+            if key:
+                self.seen_url_keys.add(key)
+        return selected
+
+    def fetch_rss(self, fetch: RssFetch, dimension: str, query: str, time_range_days: int):
+        """Call `fetch` (a client's `_fetch_google_news_rss`) within the run's deadline.
+
+        Once the budget is spent no request is made and the dimension is recorded
+        as skipped; otherwise the remaining budget is the request timeout.
+        """
+        if self.deadline is not None and self.deadline.expired:
+            self.deadline_skipped.append(dimension)
+            return [], "deadline exceeded"
+        timeout = self.deadline.timeout(cap=RSS_TIMEOUT_SECONDS) if self.deadline is not None else RSS_TIMEOUT_SECONDS
+        return fetch(query, time_range_days=time_range_days, limit=STRUCTURE_LIMIT, timeout=timeout)
+
+    def record_outcome(self, outcome: "SearchOutcome") -> None:
+        if outcome.stale:
+            self.stale_queries += 1
+        for r in outcome.results:
+            self.provider_hits[r.provider] = self.provider_hits.get(r.provider, 0) + 1
+        for name in outcome.timed_out:
+            if name not in self.timed_out_providers:
+                self.timed_out_providers.append(name)
+        for name in outcome.skipped:
+            if name not in self.skipped_providers:
+                self.skipped_providers.append(name)
+
+    def warnings(self) -> List[str]:
+        warnings = []
+        if self.skipped_providers:
+            warnings.append(f"检索源熔断中，已跳过：{', '.join(self.skipped_providers)}。")
+        if self.stale_queries:
+            warnings.append(f"{self.stale_queries} 个检索结果来自过期缓存，已在后台刷新。")
+        if self.deadline_skipped:
+            warnings.append(f"检索时间预算已用尽，{len(self.deadline_skipped)} 个维度未做 RSS 补充，结果不完整。")
+        return warnings
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "duplicate_urls_skipped": self.duplicate_urls_skipped,
+            "near_duplicates_skipped": self.near_duplicates_skipped,
+            "thesis_rerank": self.ranker is not None,
+            "deadline_exceeded": bool(self.deadline is not None and self.deadline.expired),
+            "deadline_skipped_dimensions": self.deadline_skipped,
+            "provider_hits": self.provider_hits,
+            "timed_out_providers": self.timed_out_providers,
+            "skipped_providers": self.skipped_providers,
+            "stale": self.stale_queries > 0,
+            "stale_queries": self.stale_queries,
+        }
@@ -19,13 +19,20 @@ import urllib.request
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, TYPE_CHECKING
 
 try:
     from openai import OpenAI
 except ImportError as e:
     raise ImportError("请先安装 openai: pip install openai") from e
 
+from .cassette import record_or_replay
+from .news_pipeline import STRUCTURE_LIMIT, NewsRun
+from .urlnorm import canonicalize_url, url_dedup_key
+
+if TYPE_CHECKING:
+    from .retrieval import Deadline
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,6 +60,11 @@ class OpenAIClient:
         self.model = resolved_pro
 
     def _chat(self, messages: List[Dict[str, str]], model: str) -> str:
+        return record_or_replay(
+            "chat", f"openai:{model}", {"messages": messages}, lambda: self._chat_live(messages, model)
+        )
+
+    def _chat_live(self, messages: List[Dict[str, str]], model: str) -> str:
         resp = self.client.chat.completions.create(
             model=model,
             messages=messages,
@@ -150,11 +162,24 @@ class OpenAIClient:
     def model_pro(self) -> str:
         return self._model_pro
 
-    def _fetch_google_news_rss(self, query: str, time_range_days: int, limit: int = 8) -> Tuple[List[Dict[str, str]], Optional[str]]:
-        """Fetch Google News RSS items.
+    def _fetch_google_news_rss(
+        self, query: str, time_range_days: int, limit: int = 8, timeout: float = 20
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """Fetch Google News RSS items (recorded / replayed when a cassette is active).
 
         Returns (items, error). Each item: {title, link, pubDate, source}.
         """
+        items, error = record_or_replay(
+            "rss",
+            "google_news",
+            {"query": query, "time_range_days": time_range_days, "limit": limit},
+            lambda: self._fetch_google_news_rss_live(query, time_range_days, limit, timeout),
+        )
+        return items, error
+
+    def _fetch_google_news_rss_live(
+        self, query: str, time_range_days: int, limit: int, timeout: float
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
         try:
             # enforce freshness using Google News query operator when:N d
             # (best-effort; Google may ignore in some cases)
@@ -164,7 +189,7 @@ class OpenAIClient:
             q = urllib.parse.quote(q_str)
             # CN zh RSS is generally better for Chinese names; still includes global sources.
             url = f"https://news.google.com/rss/search?q={q}&hl=zh-CN&gl=CN&ceid=CN:zh-Hans"
-            with urllib.request.urlopen(url, timeout=20) as resp:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
                 xml_bytes = resp.read()
             root = ET.fromstring(xml_bytes)
             channel = root.find('channel')
@@ -173,7 +198,7 @@ class OpenAIClient:
             items = []
             for it in channel.findall('item'):
                 title = (it.findtext('title') or '').strip()
-                link = (it.findtext('link') or '').strip()
+                link = canonicalize_url((it.findtext('link') or '').strip())
                 pub_raw = (it.findtext('pubDate') or '').strip()
                 try:
                     pub = parsedate_to_datetime(pub_raw).strftime('%Y-%m-%d')
@@ -201,12 +226,13 @@ class OpenAIClient:
 
         # Keep prompt small; provide the raw items and ask for strict JSON.
         compact = []
-        for x in rss_items[:8]:
+        for x in rss_items[:STRUCTURE_LIMIT]:
             compact.append({
                 "title": x.get("title", ""),
                 "source": x.get("source", ""),
                 "date": x.get("pubDate", ""),
                 "link": x.get("link", ""),
+                "coverage": x.get("cluster_size", 1),
             })
 
         prompt = f"""你在做投资环境跟踪。目标公司/标的：{stock_name}
@@ -214,7 +240,7 @@ class OpenAIClient:
 维度：{dimension}
 关注点：{focus}
 
-下面是 Google News RSS 抓取到的原始条目（可能有噪音/重复/标题党），请你筛出最多 5 条最重要的，并严格输出 JSON（只输出 JSON，不要解释）：
+下面是 Google News RSS 抓取到的原始条目（可能有噪音/重复/标题党；coverage 为报道同一事件的来源数，已合并近似重复），请你筛出最多 5 条最重要的，并严格输出 JSON（只输出 JSON，不要解释）：
 
 {{
   \"news\": [
@@ -251,6 +277,7 @@ class OpenAIClient:
                     "importance": "中",
                     "source": x.get("source", ""),
                     "url": x.get("link", ""),
+                    "cluster_size": x.get("coverage", 1),
                 })
             return fallback
 
@@ -261,8 +288,10 @@ class OpenAIClient:
         try:
             obj = json.loads(m.group(0))
             out = obj.get('news', [])
+            coverage = {url_dedup_key(x["link"]): x["coverage"] for x in compact if x.get("link")}
             for n in out:
                 n['dimension'] = dimension
+                n['cluster_size'] = coverage.get(url_dedup_key(n.get('url') or ''), 1)
             return out[:5]
         except Exception:
             return []
@@ -320,6 +349,8 @@ class OpenAIClient:
         related_entities: List[str],
         time_range_days: int = 7,
         playbook: Optional[Dict] = None,
+        allow_stale: bool = False,
+        deadline: Optional["Deadline"] = None,
     ) -> List[Dict]:
         """结构化新闻搜索。
 
@@ -327,6 +358,12 @@ class OpenAIClient:
         1) Tavily（若设置 TAVILY_API_KEY）→ 更强覆盖、更适合 LLM 的结果
         2) Google News RSS（无需额外 key）→ 兜底保证可用性
 
+        allow_stale=True 时，超过缓存 TTL 但未超过硬 TTL 的检索结果直接返回并在后台刷新
+        （metadata 中 stale_queries > 0）。
+
+        deadline（retrieval.Deadline）为整次采集的时间预算：检索与 RSS 请求以剩余时间为超时，
+        预算耗尽后返回已有结果（metadata.deadline_exceeded / timed_out_providers）。
+
         返回：List[Dict]，第 0 项为 metadata。
         """
         logger.info(f"[search_news_structured] Starting for {stock_name}, range={time_range_days}d, entities={related_entities[:2]}")
@@ -356,37 +393,20 @@ class OpenAIClient:
         missing_dims: List[tuple] = []
 
         # Use union search (Tavily + OpenClaw web_search) for better recall.
-        from .retrieval import SearchManager, TavilyProvider, OpenClawWebSearchProvider
+        from .retrieval import SEARCH_STALE_TTL_SECONDS, SearchManager, get_search_providers
 
         tavily_key = self._tavily_api_key
         logger.debug(f"[search_news_structured] Tavily key available: {bool(tavily_key)}")
         
-        providers = []
-        
-        # Initialize Tavily provider
-        if tavily_key:
-            try:
-                tavily_provider = TavilyProvider(api_key=tavily_key)
-                providers.append(tavily_provider)
-                logger.debug(f"[search_news_structured] TavilyProvider initialized successfully")
-            except Exception as e:
-                logger.error(f"[search_news_structured] Failed to initialize TavilyProvider: {e}")
-        
-        # Always try OpenClaw provider
-        try:
-            openclaw_provider = OpenClawWebSearchProvider()
-            if openclaw_provider.is_available():
-                providers.append(openclaw_provider)
-                logger.debug(f"[search_news_structured] OpenClawWebSearchProvider initialized successfully")
-            else:
-                logger.debug(f"[search_news_structured] OpenClawWebSearchProvider not available (missing config)")
-        except Exception as e:
-            logger.error(f"[search_news_structured] Failed to initialize OpenClawWebSearchProvider: {e}")
+        # 共享的 Provider 实例（复用 TavilyClient 与 OpenClaw keep-alive 连接池）
+        providers = get_search_providers(tavily_key)
         
         sm = SearchManager(
             providers=providers,
             cache_ttl_seconds=6 * 3600,
             hard_timeout_seconds=20,
+            stale_ttl_seconds=SEARCH_STALE_TTL_SECONDS if allow_stale else None,
+            caller="collect_news",
         )
         
         logger.info(f"[search_news_structured] SearchManager initialized with {len(sm.providers)} provider(s)")
@@ -397,13 +417,16 @@ class OpenAIClient:
             merged = []
             seen = set()
             for h in (primary_hits or []) + (secondary_hits or []):
-                url = (h.url or "").strip()
-                if not url or url in seen:
+                key = url_dedup_key(h.url or "")
+                if not key or key in seen:
                     continue
-                seen.add(url)
+                seen.add(key)
                 merged.append(h)
             return merged
 
+        # 跨维度去重、论点重排、deadline 与 Provider 统计（见 core/news_pipeline.py）
+        run = NewsRun(playbook=playbook, deadline=deadline)
+
         def _dedup_by_title(items: List[Dict]) -> List[Dict]:
             seen_titles = set()
             uniq_items = []
@@ -422,29 +445,37 @@ class OpenAIClient:
             logger.warning(f"[search_news_structured] No providers available, falling back to Google News RSS")
             for dim, q, focus in dims:
                 logger.debug(f"[search_news_structured] Fetching Google News RSS for dimension: {dim}")
-                items, err = self._fetch_google_news_rss(q, time_range_days=time_range_days, limit=8)
+                items, err = run.fetch_rss(self._fetch_google_news_rss, dim, q, time_range_days)
                 if err:
                     logger.error(f"[search_news_structured] RSS fetch failed for {dim}: {err}")
                     failed.append({"dimension": dim, "error": err})
                     continue
                 logger.info(f"[search_news_structured] Got {len(items)} RSS items for {dim}")
                 total_rss_items += len(items)
-                structured = self._rss_items_to_structured_news(stock_name, dim, focus, items)
+                structured = self._rss_items_to_structured_news(stock_name, dim, focus, run.take_unseen(items))
                 logger.debug(f"[search_news_structured] Structured {len(structured)} news items for {dim}")
                 all_news.extend(structured)
         else:
             warnings.append("新闻来源=Tavily + Brave Search（union）。")
             logger.info(f"[search_news_structured] Using union search (Tavily + Brave)")
+            # 所有维度的中英文查询一次性批量检索（并发、去重、统一缓存）
+            en_queries = {dim: self._build_english_query(dim, english_aliases) for dim, _, _ in dims}
+            batch = [q for _, q, _ in dims] + [eq for eq in en_queries.values() if eq]
+            logger.debug(f"[search_news_structured] Batch searching {len(batch)} queries")
+            outcomes = sm.search_many(batch, max_results=8, topic="news", depth="basic", deadline=deadline)
+            for outcome in outcomes.values():
+                run.record_outcome(outcome)
+
             for dim, q, focus in dims:
-                logger.debug(f"[search_news_structured] Searching dimension: {dim}, query: {q[:60]}")
-                cn_hits = sm.search(q, max_results=8, topic="news", depth="basic")
+                cn_outcome = outcomes.get(q)
+                cn_hits = cn_outcome.results if cn_outcome else []
                 logger.info(f"[search_news_structured] Got {len(cn_hits)} hits for {dim} (cn)")
 
                 en_hits = []
-                en_query = self._build_english_query(dim, english_aliases)
+                en_query = en_queries.get(dim)
                 if en_query:
-                    logger.debug(f"[search_news_structured] Searching dimension: {dim}, en_query: {en_query[:60]}")
-                    en_hits = sm.search(en_query, max_results=8, topic="news", depth="basic")
+                    en_outcome = outcomes.get(en_query)
+                    en_hits = en_outcome.results if en_outcome else []
                     logger.info(f"[search_news_structured] Got {len(en_hits)} hits for {dim} (en)")
 
                 hits = _merge_hits(cn_hits, en_hits)
@@ -457,13 +488,14 @@ class OpenAIClient:
                         "source": h.provider,
                         "pubDate": h.published or "",
                         "link": h.url,
+                        "snippet": h.snippet,
                     }
                     for h in hits
                     if h.title and h.url
                 ]
                 logger.debug(f"[search_news_structured] Converted {len(rss_like)} hits to rss_like format for {dim}")
                 
-                structured = self._rss_items_to_structured_news(stock_name, dim, focus, rss_like)
+                structured = self._rss_items_to_structured_news(stock_name, dim, focus, run.take_unseen(rss_like))
                 logger.info(f"[search_news_structured] Structured {len(structured)} news items for {dim}")
                 all_news.extend(structured)
 
@@ -482,14 +514,14 @@ class OpenAIClient:
 
                 for dim, q, focus in dims_to_fetch:
                     logger.debug(f"[search_news_structured] RSS fallback for dimension: {dim}")
-                    items, err = self._fetch_google_news_rss(q, time_range_days=time_range_days, limit=8)
+                    items, err = run.fetch_rss(self._fetch_google_news_rss, dim, q, time_range_days)
                     if err:
                         logger.error(f"[search_news_structured] RSS fallback failed for {dim}: {err}")
                         failed.append({"dimension": dim, "error": err})
                         continue
                     logger.info(f"[search_news_structured] RSS fallback got {len(items)} items for {dim}")
                     total_rss_items += len(items)
-                    structured = self._rss_items_to_structured_news(stock_name, dim, focus, items)
+                    structured = self._rss_items_to_structured_news(stock_name, dim, focus, run.take_unseen(items))
                     logger.debug(f"[search_news_structured] RSS fallback structured {len(structured)} items for {dim}")
                     all_news.extend(structured)
 
@@ -502,6 +534,8 @@ class OpenAIClient:
         imp = {"高": 0, "中": 1, "低": 2}
         uniq.sort(key=lambda x: (imp.get(x.get('importance', '低'), 2), x.get('date', '')), reverse=False)
 
+        warnings.extend(run.warnings())
+
         metadata = {
             "_is_metadata": True,
             "total_dimensions": len(dims),
@@ -509,7 +543,10 @@ class OpenAIClient:
             "failed_dimensions": failed,
             "rss_fallback_triggered": rss_fallback_triggered,
             "rss_fallback_reason": rss_fallback_reason,
+            **run.metadata(),
             "total_rss_items": total_rss_items,
+            "provider_health": sm.health.snapshot([p.name for p in sm.providers]),
+            "rate_limits": sm.limits.stats([p.name for p in sm.providers]),
             "search_warnings": [
                 *warnings,
                 f"range={start_date.strftime('%Y-%m-%d')}..{end_date.strftime('%Y-%m-%d')}",
@@ -0,0 +1,103 @@
+"""Thesis-aware re-ranking of search hits (in-process BM25).
+
+Providers return hits in their own relevance order and callers truncate to the
+first few before prompting. `PlaybookRanker` scores candidates against the stock
+playbook's thesis vocabulary (`core_thesis.key_points`, `validation_signals`,
+`invalidation_triggers`, `related_entities`) so truncation keeps the evidence
+that actually bears on the thesis.
+
+Tokens are lowercase Latin/digit words plus CJK character bigrams, so no
+tokenizer is needed for Chinese. IDF is computed over the candidate set being
+ranked. Ties (including hits matching nothing) keep their incoming order.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+PLAYBOOK_FIELDS = ("key_points", "validation_signals", "invalidation_triggers", "related_entities")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*|[぀-ヿ㐀-䶿一-鿿가-힯]+")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "the", "to", "with", "的", "了", "和",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words for Latin text, character bigrams (or the single char) for CJK runs."""
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif run not in _STOPWORDS:
+            tokens.append(run)
+    return tokens
+
+
+def playbook_terms(playbook: Optional[Dict]) -> List[str]:
+    """Thesis phrases from a stock playbook (empty if the playbook has none)."""
+    if not playbook:
+        return []
+    phrases: List[str] = []
+    core = playbook.get("core_thesis") or {}
+    if isinstance(core, dict):
+        phrases.extend(core.get("key_points") or [])
+    for field in PLAYBOOK_FIELDS[1:]:
+        phrases.extend(playbook.get(field) or [])
+    return [p for p in phrases if isinstance(p, str) and p.strip()]
+
+
+class PlaybookRanker:
+    """BM25 scorer with the playbook thesis as the query."""
+
+    def __init__(self, phrases: Iterable[str], *, k1: float = 1.2, b: float = 0.75):
+        self.query = Counter(tok for phrase in phrases for tok in tokenize(phrase))
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def from_playbook(cls, playbook: Optional[Dict]) -> Optional["PlaybookRanker"]:
+        """Ranker for a playbook, or None when it carries no thesis terms."""
+        ranker = cls(playbook_terms(playbook))
+        return ranker if ranker.query else None
+
+    def score_texts(self, texts: Sequence[str]) -> List[float]:
+        docs = [Counter(tokenize(t)) for t in texts]
+        if not docs:
+            return []
+        n = len(docs)
+        avg_len = sum(sum(d.values()) for d in docs) / n or 1.0
+        df = Counter(tok for d in docs for tok in d.keys() & self.query.keys())
+        idf = {tok: math.log(1 + (n - c + 0.5) / (c + 0.5)) for tok, c in df.items()}
+        scores = []
+        for d in docs:
+            length = sum(d.values())
+            norm = self.k1 * (1 - self.b + self.b * length / avg_len)
+            score = 0.0
+            for tok, weight in idf.items():
+                tf = d.get(tok, 0)
+                if tf:
+                    score += weight * self.query[tok] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def rank(self, items: Sequence[T], text_of: Callable[[T], str]) -> List[T]:
+        """Items sorted by descending score; stable, so ties keep incoming order."""
+        scores = self.score_texts([text_of(x) for x in items])
+        order = sorted(range(len(items)), key=lambda i: -scores[i])
+        return [items[i] for i in order]
+
+    def rank_results(self, results: Sequence[T]) -> List[T]:
+        """Rank `SearchResult`-like objects by title + snippet."""
+        return self.rank(results, lambda r: f"{r.title} {r.snippet}")
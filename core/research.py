@@ -4,14 +4,21 @@ import json
 import logging
 import re
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 from .openai_client import OpenAIClient
 from .storage import Storage
-from .retrieval import SearchManager, TavilyProvider, OpenClawWebSearchProvider, format_search_results_for_prompt
+from .rerank import PlaybookRanker
+from .retrieval import (
+    Deadline,
+    SearchManager,
+    configure_rate_limits,
+    format_search_results_for_prompt,
+    get_search_providers,
+)
 
 
 DEEP_RESEARCH_PROMPT = """## 角色定位
@@ -277,31 +284,36 @@ class ResearchEngine:
         self,
         stock_id: str,
         research_plan: Dict,
-        environment_data: Dict
+        environment_data: Dict,
+        deadline: Optional[Deadline] = None,
     ) -> Dict:
-        """执行深度研究"""
-        # 获取相关数据
-        portfolio_playbook = self.storage.get_portfolio_playbook()
-        stock_playbook = self.storage.get_stock_playbook(stock_id)
-        recent_history = self.storage.get_recent_research(stock_id, limit=5)
+        """执行深度研究
+
+        deadline：检索阶段的时间预算（见 _execute_searches）。
+        """
+        # 获取相关数据（一次快照：Playbook、研究历史、反馈上下文、上传文件、用户偏好）
+        bundle = self.storage.get_stock_context_bundle(stock_id, recent_limit=5, context_limit=3, uploads_limit=5)
+        portfolio_playbook = bundle["portfolio_playbook"]
+        stock_playbook = bundle["stock_playbook"]
+        recent_history = bundle["recent_research"]
 
         stock_name = stock_playbook.get("stock_name", stock_id) if stock_playbook else stock_id
 
         # 获取用户偏好
-        user_preferences = self.storage.get_preferences_for_prompt()
+        user_preferences = bundle["preferences_prompt"]
 
         # 获取历史上传文件
-        historical_uploads = self.storage.get_historical_uploads(stock_id, limit=5)
+        historical_uploads = bundle["historical_uploads"]
 
         # 执行搜索
-        search_results = self._execute_searches(research_plan, stock_playbook)
+        search_results = self._execute_searches(research_plan, stock_playbook, deadline=deadline)
 
         # 格式化数据
         portfolio_str = json.dumps(portfolio_playbook, ensure_ascii=False, indent=2) if portfolio_playbook else "（暂无）"
         stock_playbook_str = json.dumps(stock_playbook, ensure_ascii=False, indent=2) if stock_playbook else "（暂无）"
 
         # 获取包含用户反馈的研究上下文
-        research_context = self.storage.get_research_context(stock_id, limit=3)
+        research_context = bundle["research_context"]
 
         history_str = "（暂无）"
         if research_context:
@@ -421,7 +433,7 @@ class ResearchEngine:
             "executed_at": datetime.now().isoformat()
         }
 
-    def _execute_searches(self, research_plan: Dict, playbook: Optional[Dict]) -> str:
+    def _execute_searches(self, research_plan: Dict, playbook: Optional[Dict], deadline: Optional[Deadline] = None) -> str:
         """执行研究计划中的搜索。
 
         目标：更适配本环境、产出可核验证据。
@@ -430,23 +442,22 @@ class ResearchEngine:
         - 优先 Tavily，其次 OpenClaw web_search（union 合并去重）
         - 输出包含 URL + snippet，便于报告引用
         - 结果带缓存/预算，降低 SIGKILL 风险
+        - 有 Playbook 时多取候选，按论点相关性（BM25）重排后再截断
+        - deadline：所有查询共享的时间预算（与 hard_timeout 取先到者），Provider 以剩余时间为超时；
+          超时的查询保留已返回的部分结果并标注
         """
 
         tavily_key = self.storage.get_tavily_api_key()
+        configure_rate_limits(self.storage.get_search_rate_limits())
         sm = SearchManager(
-            providers=[
-                TavilyProvider(api_key=tavily_key) if tavily_key else None,
-                OpenClawWebSearchProvider(),
-            ],
+            providers=get_search_providers(tavily_key),
             cache_ttl_seconds=12 * 3600,
             hard_timeout_seconds=25,
+            caller="execute_searches",
         )
 
-        results: List[str] = []
-
-        def run_query(q: str) -> str:
-            hits = sm.search(q, max_results=5, topic="news", depth="basic")
-            return format_search_results_for_prompt(hits, limit=5)
+        # 先收集所有 (标题, 查询)，再一次性批量检索；query 为 None 的条目只输出标题
+        sections: List[Tuple[str, Optional[str]]] = []
 
         research_modules = research_plan.get("research_modules", [])
         if research_modules:
@@ -455,30 +466,48 @@ class ResearchEngine:
                 search_queries = module.get("search_queries", [])
                 key_questions = module.get("key_questions", [])
 
-                results.append(f"\n## 📊 研究模块: {module_name}\n")
+                sections.append((f"\n## 📊 研究模块: {module_name}\n", None))
 
                 for query in (search_queries or [])[:3]:
-                    results.append(f"### 🔍 搜索: {query}\n{run_query(query)}\n")
+                    sections.append((f"### 🔍 搜索: {query}", query))
 
                 if not search_queries and key_questions:
                     for q in key_questions[:2]:
-                        results.append(f"### 🔍 问题: {q}\n{run_query(q)}\n")
+                        sections.append((f"### 🔍 问题: {q}", q))
 
-        if not results:
+        if not sections:
             hypotheses = research_plan.get("hypothesis_to_test", [])
             for h in hypotheses[:2]:
                 how_to_verify = (h.get("how_to_verify", "") or "").strip()
                 if how_to_verify:
-                    results.append(f"### 🔍 验证假设: {h.get('hypothesis', '')}\n{run_query(how_to_verify)}\n")
+                    sections.append((f"### 🔍 验证假设: {h.get('hypothesis', '')}", how_to_verify))
 
-        if not results:
+        if not sections:
             objective = (research_plan.get("research_objective", "") or "").strip()
             if objective:
-                results.append(f"### 🔍 研究目标: {objective}\n{run_query(objective)}\n")
+                sections.append((f"### 🔍 研究目标: {objective}", objective))
 
             questions = research_plan.get("core_questions", [])
             for q in questions[:3]:
-                results.append(f"### 🔍 {q}\n{run_query(q)}\n")
+                sections.append((f"### 🔍 {q}", q))
+
+        ranker = PlaybookRanker.from_playbook(playbook)
+        pool = 8 if ranker else 5
+
+        queries = [q for _, q in sections if q]
+        outcomes = (
+            sm.search_many(queries, max_results=pool, topic="news", depth="basic", deadline=deadline) if queries else {}
+        )
+
+        results: List[str] = []
+        for title, query in sections:
+            if query is None:
+                results.append(title)
+                continue
+            outcome = outcomes.get(query)
+            hits = outcome.results if outcome else []
+            note = f"\n（检索超时：{', '.join(outcome.timed_out)}，结果可能不完整）" if outcome and outcome.timed_out else ""
+            results.append(f"{title}\n{format_search_results_for_prompt(hits, limit=5, ranker=ranker)}{note}\n")
 
         return "\n".join(results) if results else "（未执行搜索）"
 
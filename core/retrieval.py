@@ -16,16 +16,31 @@ import hashlib
 import json
 import logging
 import os
+import sqlite3
+import tempfile
+import threading
 import time
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Sequence
 
+from .cassette import CassetteMiss, ReplayedTimeout, get_cassette, record_or_replay
+from .metrics import COUNT_BUCKETS, MetricsRegistry
+from .rerank import PlaybookRanker
+from .urlnorm import canonicalize_url, normalize_query, url_dedup_key
+
 logger = logging.getLogger(__name__)
 
 CACHE_DIR = Path(os.getenv("INVEST_ASSISTANT_CACHE_DIR", os.path.expanduser("~/.investment-assistant/cache")))
 SEARCH_CACHE_DIR = CACHE_DIR / "search"
+SEARCH_CACHE_DB = "search_cache.sqlite3"
+SUPPORTED_SEARCH_CACHE_BACKENDS = ("file", "sqlite")
+# Hard TTL for stale-while-revalidate: entries past cache_ttl_seconds (soft) but
+# younger than this may be served stale while a background refresh runs.
+SEARCH_STALE_TTL_SECONDS = int(os.getenv("IA_SEARCH_STALE_TTL_SECONDS", str(72 * 3600)))
 
 
 @dataclass
@@ -38,8 +53,770 @@ class SearchResult:
     score: Optional[float] = None
 
 
+class Deadline:
+    """Absolute time budget shared by every retrieval call of one operation.
+
+    Created once by the caller (e.g. `collect_news`) and passed down; each provider
+    call gets `timeout()` (the remaining time) as its own network timeout, and
+    work that would start after expiry is skipped and reported as timed out.
+    """
+
+    # Floor for per-call network timeouts so a nearly spent budget still yields a valid value.
+    MIN_TIMEOUT = 0.05
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def within(cls, deadline: Optional["Deadline"], seconds: float) -> "Deadline":
+        """`seconds` from now, but never later than `deadline`."""
+        own = cls(seconds)
+        return deadline if deadline is not None and deadline.expires_at < own.expires_at else own
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Remaining time as a network timeout, optionally capped by the call's usual timeout."""
+        remaining = self.remaining()
+        if cap is not None:
+            remaining = min(remaining, cap)
+        return max(self.MIN_TIMEOUT, remaining)
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s)"
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a retrieval step would start after its deadline."""
+
+
+@dataclass
+class SearchOutcome:
+    """Merged results plus which providers contributed, timed out or failed."""
+
+    results: List[SearchResult]
+    contributors: List[str] = field(default_factory=list)
+    timed_out: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    from_cache: bool = False
+    stale: bool = False  # served past the soft TTL; a background refresh was scheduled
+    skipped: List[str] = field(default_factory=list)  # circuit breaker open
+
+
+@dataclass
+class CacheEntry:
+    results: List[SearchResult]
+    ts: Optional[float] = None  # write time (epoch seconds); None = legacy entry without timestamp
+    # Union entries: registered names of the providers that contributed (None = not recorded)
+    contributors: Optional[List[str]] = None
+
+
+class SearchCache:
+    """Storage backend for SearchManager cache entries (keyed by `SearchManager._cache_key`).
+
+    Backends only store and evict; TTL checks against `CacheEntry.ts` live in SearchManager.
+    """
+
+    def location(self) -> str:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, CacheEntry]:
+        out: Dict[str, CacheEntry] = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                out[key] = entry
+        return out
+
+    def set(self, key: str, results: List[SearchResult], contributors: Optional[List[str]] = None) -> None:
+        raise NotImplementedError
+
+
+class FileSearchCache(SearchCache):
+    """One pretty-printed JSON file per key (the original cache layout)."""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self._directory = Path(directory) if directory else None
+
+    @property
+    def directory(self) -> Path:
+        # Resolved per call so SEARCH_CACHE_DIR can be redirected (tests, env).
+        return self._directory or SEARCH_CACHE_DIR
+
+    def location(self) -> str:
+        return str(self.directory)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        p = self.directory / f"{key}.json"
+        try:
+            obj = json.loads(p.read_text("utf-8"))
+            ts = obj.get("ts")
+            return CacheEntry(
+                results=[SearchResult(**it) for it in (obj.get("results") or [])],
+                ts=float(ts) if ts else None,
+                contributors=obj.get("contributors"),
+            )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"[FileSearchCache.get] Unreadable cache file {p.name}: {e}")
+            return None
+
+    def set(self, key: str, results: List[SearchResult], contributors: Optional[List[str]] = None) -> None:
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "ts": time.time(),
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "results": [r.__dict__ for r in results],
+        }
+        if contributors is not None:
+            payload["contributors"] = list(contributors)
+        # Write to a temp file and rename so concurrent writers/readers never see a partial file.
+        fd, tmp = tempfile.mkstemp(dir=str(directory), prefix=f".{key[:16]}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, directory / f"{key}.json")
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+
+class SQLiteSearchCache(SearchCache):
+    """All cache entries in one SQLite file with age expiry and LRU eviction.
+
+    - `ts` (write time) and `accessed` (last read) are indexed. Reads don't write:
+      access times are buffered in memory and applied with the next write
+      (`set`) or maintenance pass, so readers never take the WAL write lock.
+    - Every `maintenance_every` writes: drop entries older than `max_age_seconds`,
+      then evict least-recently-used entries beyond `max_entries` / `max_bytes`,
+      then reclaim freed pages (incremental vacuum).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS search_cache (
+        key TEXT PRIMARY KEY,
+        ts REAL NOT NULL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL,
+        payload TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_search_cache_ts ON search_cache(ts);
+    CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed);
+    """
+
+    # SQLite's default limit on bound parameters is 999 on older builds.
+    _BATCH = 500
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        *,
+        max_entries: int = 5000,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age_seconds: int = 7 * 24 * 3600,
+        maintenance_every: int = 100,
+    ):
+        self._path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.maintenance_every = max(1, maintenance_every)
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}  # key -> last read time, not yet written
+        self._pending_lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path or (SEARCH_CACHE_DIR / SEARCH_CACHE_DB)
+
+    def location(self) -> str:
+        return str(self.path)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread and database path."""
+        path = self.path
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get(path)
+        if conn is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), timeout=30)
+            # auto_vacuum must be set before the first table is created to take effect.
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.executescript(self.SCHEMA)
+            conns[path] = conn
+        return conn
+
+    def close(self) -> None:
+        """Flush buffered access times and close this thread's connections."""
+        if self._pending_access and getattr(self._local, "conns", None):
+            with self._conn() as conn:
+                self._flush_access(conn)
+        for conn in (getattr(self._local, "conns", None) or {}).values():
+            conn.close()
+        self._local.conns = {}
+
+    @staticmethod
+    def _decode(payload: str, ts: Optional[float] = None) -> CacheEntry:
+        obj = json.loads(payload)
+        if isinstance(obj, list):  # entry written before contributors were stored
+            return CacheEntry(results=[SearchResult(**it) for it in obj], ts=ts)
+        return CacheEntry(
+            results=[SearchResult(**it) for it in obj["results"]],
+            ts=ts,
+            contributors=obj.get("contributors"),
+        )
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, CacheEntry]:
+        keys = list(dict.fromkeys(keys))
+        out: Dict[str, CacheEntry] = {}
+        if not keys:
+            return out
+        conn = self._conn()
+        now = time.time()
+        for i in range(0, len(keys), self._BATCH):
+            chunk = keys[i:i + self._BATCH]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT key, ts, payload FROM search_cache WHERE key IN ({marks})", chunk).fetchall()
+            for key, ts, payload in rows:
+                try:
+                    out[key] = self._decode(payload, ts)
+                except Exception as e:
+                    logger.debug(f"[SQLiteSearchCache.get_many] Undecodable entry {key[:12]}: {e}")
+            with self._pending_lock:
+                for row in rows:
+                    self._pending_access[row[0]] = now
+        return out
+
+    def _flush_access(self, conn: sqlite3.Connection) -> None:
+        """Write buffered access times (caller holds a write transaction on `conn`)."""
+        with self._pending_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if pending:
+            conn.executemany(
+                "UPDATE search_cache SET accessed = MAX(accessed, ?) WHERE key = ?",
+                [(ts, key) for key, ts in pending.items()],
+            )
+
+    def set(self, key: str, results: List[SearchResult], contributors: Optional[List[str]] = None) -> None:
+        obj: Any = [r.__dict__ for r in results]
+        if contributors is not None:
+            obj = {"results": obj, "contributors": list(contributors)}
+        payload = json.dumps(obj, ensure_ascii=False)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            self._flush_access(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, ts, accessed, size, payload) VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(payload.encode("utf-8")), payload),
+            )
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.maintenance_every == 0
+        if due:
+            self.maintain()
+
+    def maintain(self) -> int:
+        """Expire old entries, enforce the entry/byte caps, reclaim space. Returns rows removed."""
+        conn = self._conn()
+        removed = 0
+        with conn:
+            self._flush_access(conn)  # LRU order must reflect recent reads
+            removed += conn.execute(
+                "DELETE FROM search_cache WHERE ts < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache").fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM search_cache ORDER BY accessed"):
+                    if count <= self.max_entries and total <= self.max_bytes:
+                        break
+                    victims.append(key)
+                    count -= 1
+                    total -= size
+                for i in range(0, len(victims), self._BATCH):
+                    chunk = victims[i:i + self._BATCH]
+                    removed += conn.execute(
+                        f"DELETE FROM search_cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).rowcount
+        if removed:
+            # The pragma frees one page per step and sqlite3's execute() (even with fetchall)
+            # stops after the first; executescript steps it to completion.
+            conn.executescript("PRAGMA incremental_vacuum;")
+            logger.info(f"[SQLiteSearchCache.maintain] Removed {removed} cache entries")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache"
+        ).fetchone()
+        return {"entries": count, "bytes": total, "path": str(self.path)}
+
+
+class MemoryCacheTier:
+    """Process-wide LRU of cache entries above the disk cache, bounded by entries and bytes.
+
+    Keys are (disk cache location, cache key), so managers pointed at different
+    cache directories never see each other's entries. Entries keep the disk
+    timestamp; freshness is still decided by SearchManager.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (entry, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _estimate_size(results: List[SearchResult]) -> int:
+        # Rough payload size: text fields dominate; 64 bytes covers object overhead per result.
+        return sum(
+            64 + len(r.title or "") + len(r.url or "") + len(r.snippet or "") + len(r.provider or "") + len(r.published or "")
+            for r in results
+        )
+
+    def get(self, location: str, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            item = self._entries.get((location, key))
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((location, key))
+            self.hits += 1
+            entry = item[0]
+        return CacheEntry(results=list(entry.results), ts=entry.ts, contributors=entry.contributors)
+
+    def put(self, location: str, key: str, entry: CacheEntry) -> None:
+        size = self._estimate_size(entry.results)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        stored = CacheEntry(results=list(entry.results), ts=entry.ts, contributors=entry.contributors)
+        with self._lock:
+            old = self._entries.pop((location, key), None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[(location, key)] = (stored, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+MEMORY_CACHE = MemoryCacheTier()
+
+
+def reset_memory_cache() -> None:
+    """Drop every in-memory cache entry (tests, or after changing cache settings)."""
+    MEMORY_CACHE.clear()
+
+
+def create_search_cache(backend: Optional[str] = None) -> SearchCache:
+    """Create the search cache: override > env(IA_SEARCH_CACHE_BACKEND) > sqlite.
+
+    While a cassette is active (see core.cassette) the cache is a fresh per-run
+    SQLite file, so a recorded run and its replay make the same provider calls.
+    """
+    cassette = get_cassette()
+    if cassette is not None:
+        return SQLiteSearchCache(Path(cassette.scratch_dir()) / "search_cache.sqlite3")
+    for candidate in (backend, os.getenv("IA_SEARCH_CACHE_BACKEND")):
+        name = (candidate or "").strip().lower()
+        if name in SUPPORTED_SEARCH_CACHE_BACKENDS:
+            return FileSearchCache() if name == "file" else SQLiteSearchCache()
+    return SQLiteSearchCache()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller (leader) runs the function; callers arriving while it runs
+    wait and receive the same result or exception.
+    """
+
+    class _Call:
+        __slots__ = ("event", "result", "error")
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, "SingleFlight._Call"] = {}
+        self.coalesced = 0
+
+    def do(self, key: Any, fn) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+# Provider calls keyed by (cache location, per-provider cache key), shared by every SearchManager.
+PROVIDER_FLIGHTS = SingleFlight()
+
+class ProviderHealth:
+    """Rolling outcome window and circuit-breaker state for one provider."""
+
+    def __init__(self, window: int):
+        self.samples: deque = deque(maxlen=window)  # (ok, latency_seconds)
+        self.consecutive_failures = 0
+        self.state = "closed"  # closed | open | half_open
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    def median_latency(self) -> Optional[float]:
+        latencies = sorted(lat for ok, lat in self.samples if ok)
+        return latencies[len(latencies) // 2] if latencies else None
+
+
+class HealthTracker:
+    """Process-wide provider health with a circuit breaker.
+
+    - Opens after `FAILURE_THRESHOLD` consecutive failures, or an error rate of at
+      least `ERROR_RATE_THRESHOLD` over `MIN_SAMPLES`+ calls in the rolling window.
+    - While open the provider is skipped; after `COOLDOWN_SECONDS` it is half-open
+      and one batch is let through as a probe: success closes, failure re-opens.
+    """
+
+    WINDOW = 20
+    FAILURE_THRESHOLD = 3
+    ERROR_RATE_THRESHOLD = 0.5
+    MIN_SAMPLES = 5
+    COOLDOWN_SECONDS = 60.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers: Dict[str, ProviderHealth] = {}
+
+    def _get(self, name: str) -> ProviderHealth:
+        health = self._providers.get(name)
+        if health is None:
+            health = self._providers[name] = ProviderHealth(self.WINDOW)
+        return health
+
+    def record(self, name: str, ok: bool, latency: float) -> None:
+        with self._lock:
+            h = self._get(name)
+            h.samples.append((ok, latency))
+            if ok:
+                h.consecutive_failures = 0
+                if h.state != "closed":
+                    logger.info(f"[HealthTracker.record] Circuit closed for {name}")
+                    h.state = "closed"
+                    h.probe_started = None
+                    h.samples.clear()
+                    h.samples.append((ok, latency))
+                return
+            h.consecutive_failures += 1
+            tripped = h.consecutive_failures >= self.FAILURE_THRESHOLD or (
+                len(h.samples) >= self.MIN_SAMPLES and h.error_rate() >= self.ERROR_RATE_THRESHOLD
+            )
+            if h.state == "half_open" or (h.state == "closed" and tripped):
+                logger.warning(
+                    f"[HealthTracker.record] Circuit open for {name} "
+                    f"(consecutive_failures={h.consecutive_failures}, error_rate={h.error_rate():.2f})"
+                )
+                h.state = "open"
+                h.opened_at = time.monotonic()
+                h.probe_started = None
+
+    def allow(self, name: str) -> bool:
+        """Whether calls to `name` may go out now (moves open -> half_open after the cool-down)."""
+        with self._lock:
+            h = self._get(name)
+            now = time.monotonic()
+            if h.state == "closed":
+                return True
+            if h.state == "open":
+                if now - h.opened_at < self.COOLDOWN_SECONDS:
+                    return False
+                h.state = "half_open"
+            # half_open: a single probe at a time; an abandoned probe expires after a cool-down
+            if h.probe_started is not None and now - h.probe_started < self.COOLDOWN_SECONDS:
+                return False
+            h.probe_started = now
+            return True
+
+    def latency(self, name: str) -> Optional[float]:
+        with self._lock:
+            health = self._providers.get(name)
+            return health.median_latency() if health else None
+
+    def snapshot(self, names: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out = {}
+            for name in (names if names is not None else list(self._providers)):
+                h = self._get(name)
+                p50 = h.median_latency()
+                out[name] = {
+                    "state": h.state,
+                    "samples": len(h.samples),
+                    "error_rate": round(h.error_rate(), 3),
+                    "consecutive_failures": h.consecutive_failures,
+                    "p50_latency_ms": round(p50 * 1000) if p50 is not None else None,
+                }
+            return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._providers.clear()
+
+
+PROVIDER_HEALTH = HealthTracker()
+
+# Applied per provider name unless overridden by config.json `search_rate_limits`.
+DEFAULT_SEARCH_RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    "tavily": {"rate_per_second": 5, "burst": 5, "max_in_flight": 4},
+    "openclaw_web_search": {"rate_per_second": 2, "burst": 4, "max_in_flight": 2},
+}
+# RateLimiter settings accepted from config.json; anything else is dropped with a warning.
+RATE_LIMIT_KEYS = ("rate_per_second", "burst", "max_in_flight")
+
+
+class RateLimiter:
+    """Token bucket plus a max-in-flight cap for one provider; callers block until allowed
+    (or, given a timeout, until it runs out).
+
+    `rate_per_second` <= 0 disables the bucket, `max_in_flight` <= 0 disables the cap.
+    """
+
+    def __init__(self, rate_per_second: float = 0, burst: float = 1, max_in_flight: int = 0):
+        self.rate_per_second = float(rate_per_second or 0)
+        self.burst = max(1.0, float(burst or 1))
+        self.max_in_flight = int(max_in_flight or 0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight > 0 else None
+        self.in_flight = 0
+        self.acquired = 0
+        self.waited = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _take_token(self, until: Optional[float]) -> bool:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) / self.rate_per_second
+            if until is not None and now + delay > until:
+                return False  # the next token comes too late: don't sleep for it
+            time.sleep(delay)
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Block until a slot and a token are available; returns seconds waited.
+
+        With `timeout`, raises DeadlineExceeded instead of waiting longer than that
+        (immediately when the next token is known to arrive too late).
+        """
+        start = time.monotonic()
+        until = None if timeout is None else start + max(0.0, timeout)
+        if self._slots is not None and not self._slots.acquire(timeout=None if until is None else max(0.0, until - start)):
+            self._reject()
+            raise DeadlineExceeded(f"no free slot within {timeout:.2f}s")
+        if self.rate_per_second > 0 and not self._take_token(until):
+            if self._slots is not None:
+                self._slots.release()
+            self._reject()
+            raise DeadlineExceeded(f"no rate-limit token within {timeout:.2f}s")
+        waited = time.monotonic() - start
+        with self._lock:
+            self.in_flight += 1
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            if waited >= 0.001:
+                self.waited += 1
+        return waited
+
+    def _reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate_per_second": self.rate_per_second,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "rejected": self.rejected,
+                "total_wait_ms": round(self.total_wait * 1000, 1),
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+            }
+
+
+class RateLimitRegistry:
+    """Process-wide RateLimiter per provider name, configured from `search_rate_limits`."""
+
+    def __init__(self, defaults: Optional[Dict[str, Dict[str, float]]] = None):
+        self._lock = threading.Lock()
+        self._defaults = dict(defaults or {})
+        self._settings: Dict[str, Dict[str, float]] = dict(self._defaults)
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    @staticmethod
+    def _validated(name: str, override: Dict[str, Any]) -> Dict[str, float]:
+        """Keep known RateLimiter settings with non-negative numeric values."""
+        valid: Dict[str, float] = {}
+        for key, value in override.items():
+            if key not in RATE_LIMIT_KEYS:
+                logger.warning(f"[RateLimitRegistry.configure] Ignoring unknown rate limit setting {name}.{key}")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                logger.warning(f"[RateLimitRegistry.configure] Ignoring invalid rate limit {name}.{key}={value!r}")
+            else:
+                valid[key] = value
+        return valid
+
+    def configure(self, limits: Optional[Dict[str, Dict[str, float]]]) -> None:
+        """Merge per-provider overrides onto the defaults; limiters are rebuilt only if settings change.
+
+        Unknown keys and non-numeric values are dropped (logged), so a config typo
+        cannot break provider calls.
+        """
+        settings = {name: dict(v) for name, v in self._defaults.items()}
+        for name, override in (limits if isinstance(limits, dict) else {}).items():
+            if isinstance(override, dict):
+                settings[name] = {**settings.get(name, {}), **self._validated(name, override)}
+            else:
+                logger.warning(f"[RateLimitRegistry.configure] Ignoring rate limits for {name}: not an object")
+        with self._lock:
+            if settings == self._settings:
+                return
+            for name in set(settings) | set(self._settings):
+                if settings.get(name) != self._settings.get(name):
+                    self._limiters.pop(name, None)
+            self._settings = settings
+        logger.info(f"[RateLimitRegistry.configure] Search rate limits: {settings}")
+
+    def limiter(self, name: str) -> Optional[RateLimiter]:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                settings = self._settings.get(name)
+                if not settings:
+                    return None
+                limiter = self._limiters[name] = RateLimiter(**settings)
+            return limiter
+
+    def stats(self, names: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {name: lim.stats() for name, lim in limiters.items() if names is None or name in names}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._settings = {name: dict(v) for name, v in self._defaults.items()}
+            self._limiters.clear()
+
+
+PROVIDER_LIMITS = RateLimitRegistry(DEFAULT_SEARCH_RATE_LIMITS)
+
+
+def configure_rate_limits(limits: Optional[Dict[str, Dict[str, float]]]) -> None:
+    """Apply config.json `search_rate_limits` (e.g. {"tavily": {"rate_per_second": 2}})."""
+    PROVIDER_LIMITS.configure(limits)
+
+
+_REFRESH_LOCK = threading.Lock()
+_REFRESHING: set = set()  # (cache location, union key) with a background refresh in flight
+_REFRESH_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _refresh_executor() -> ThreadPoolExecutor:
+    global _REFRESH_EXECUTOR
+    with _REFRESH_LOCK:
+        if _REFRESH_EXECUTOR is None:
+            _REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search-refresh")
+        return _REFRESH_EXECUTOR
+
+
 class SearchProvider:
     name: str = "base"
+    # True when `search` accepts `timeout=` (seconds); SearchManager then passes the
+    # remaining deadline budget so a slow call cannot outlive the caller's budget.
+    supports_timeout: bool = False
 
     def is_available(self) -> bool:
         return True
@@ -48,8 +825,13 @@ class SearchProvider:
         raise NotImplementedError
 
 
+# path -> ((mtime_ns, size), (http_base, token))
+_GATEWAY_CONFIG_CACHE: Dict[str, tuple] = {}
+
+
 class TavilyProvider(SearchProvider):
     name = "tavily"
+    supports_timeout = True
 
     def __init__(self, api_key: Optional[str] = None):
         from .tavily_search import TavilySearch
@@ -67,7 +849,15 @@ class TavilyProvider(SearchProvider):
         logger.debug(f"[TavilyProvider.is_available] {available} (api_key={bool(self._api_key)}, tav_client={self._tav is not None})")
         return available
 
-    def search(self, query: str, *, max_results: int = 5, topic: str = "news", depth: str = "basic") -> List[SearchResult]:
+    def search(
+        self,
+        query: str,
+        *,
+        max_results: int = 5,
+        topic: str = "news",
+        depth: str = "basic",
+        timeout: Optional[float] = None,
+    ) -> List[SearchResult]:
         logger.info(f"[TavilyProvider.search] query={query[:60]}, max_results={max_results}, topic={topic}, depth={depth}")
         try:
             resp = self._tav.search(
@@ -77,6 +867,7 @@ class TavilyProvider(SearchProvider):
                 depth=depth,
                 include_answer=False,
                 include_raw_content=False,
+                timeout=timeout,
             )
             logger.debug(f"[TavilyProvider.search] Tavily API response: {json.dumps(resp, ensure_ascii=False)[:200]}")
             results = self._tav.normalize_results(resp)
@@ -118,10 +909,34 @@ class OpenClawWebSearchProvider(SearchProvider):
     """
 
     name = "openclaw_web_search"
+    supports_timeout = True
+
+    # Gateway request timeout when no deadline applies (seconds).
+    REQUEST_TIMEOUT = 25
 
-    def __init__(self, *, config_path: Optional[str] = None, session_key: str = "main"):
+    # Keep-alive pool size; matches the per-provider concurrency SearchManager may use.
+    POOL_MAXSIZE = 16
+
+    def __init__(self, *, config_path: Optional[str] = None, session_key: str = "main", session: Any = None):
         self.session_key = session_key
         self._gateway_http_base, self._token = self._load_gateway_config(config_path=config_path)
+        self._session = session
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        """One keep-alive `requests.Session` per provider instance (shared via ProviderRegistry)."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.POOL_MAXSIZE)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
 
     def is_available(self) -> bool:
         available = bool(self._gateway_http_base and self._token)
@@ -137,8 +952,15 @@ class OpenClawWebSearchProvider(SearchProvider):
             return OpenClawWebSearchProvider._ws_to_http(env_url), env_token
 
         path = Path(config_path or os.path.expanduser("~/.openclaw/openclaw.json"))
-        if not path.exists():
+        try:
+            st = path.stat()
+        except OSError:
             return "", ""
+        # Parsed once per (path, mtime, size); constructing providers no longer re-reads the file.
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = _GATEWAY_CONFIG_CACHE.get(str(path))
+        if cached and cached[0] == signature:
+            return cached[1]
 
         try:
             data = json.loads(path.read_text("utf-8"))
@@ -154,6 +976,7 @@ class OpenClawWebSearchProvider(SearchProvider):
 
         token = (((gw.get("auth") or {}).get("token")) or "").strip()
         base = f"http://{host}:{port}"
+        _GATEWAY_CONFIG_CACHE[str(path)] = (signature, (base, token))
         return base, token
 
     @staticmethod
@@ -168,9 +991,7 @@ class OpenClawWebSearchProvider(SearchProvider):
         # best effort
         return "http://" + u
 
-    def _invoke_tool(self, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        import requests
-
+    def _invoke_tool(self, tool: str, args: Dict[str, Any], *, timeout: Optional[float] = None) -> Dict[str, Any]:
         url = f"{self._gateway_http_base}/tools/invoke"
         logger.debug(f"[OpenClawWebSearchProvider._invoke_tool] Invoking {tool} on {url} with args: {args}")
         headers = {
@@ -183,7 +1004,7 @@ class OpenClawWebSearchProvider(SearchProvider):
             "sessionKey": self.session_key,
         }
         try:
-            r = requests.post(url, headers=headers, json=payload, timeout=25)
+            r = self._get_session().post(url, headers=headers, json=payload, timeout=timeout or self.REQUEST_TIMEOUT)
             r.raise_for_status()
             obj = r.json()
             if not obj.get("ok", False):
@@ -214,7 +1035,15 @@ class OpenClawWebSearchProvider(SearchProvider):
             logger.error(f"[OpenClawWebSearchProvider._invoke_tool] Request failed: {type(e).__name__}: {e}", exc_info=True)
             raise
 
-    def search(self, query: str, *, max_results: int = 5, topic: str = "news", depth: str = "basic") -> List[SearchResult]:
+    def search(
+        self,
+        query: str,
+        *,
+        max_results: int = 5,
+        topic: str = "news",
+        depth: str = "basic",
+        timeout: Optional[float] = None,
+    ) -> List[SearchResult]:
         # topic/depth kept for API compatibility; OpenClaw web_search doesn't expose them.
         logger.info(f"[OpenClawWebSearchProvider.search] query={query[:60]}, max_results={max_results}")
         try:
@@ -225,6 +1054,7 @@ class OpenClawWebSearchProvider(SearchProvider):
                     "count": max(1, min(int(max_results), 10)),
                     "country": "ALL",
                 },
+                timeout=timeout,
             )
             logger.debug(f"[OpenClawWebSearchProvider.search] Tool result: {json.dumps(res, ensure_ascii=False)[:200]}")
             items = res.get("results") or []
@@ -255,6 +1085,144 @@ class OpenClawWebSearchProvider(SearchProvider):
             raise
 
 
+class ReplayProvider(SearchProvider):
+    """Stand-in for a recorded provider while replaying a cassette (no keys, no network).
+
+    SearchManager serves its calls from the cassette; reaching `search` means the
+    call was made outside the cassette.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def search(self, query: str, *, max_results: int = 5, topic: str = "news", depth: str = "basic") -> List[SearchResult]:
+        raise CassetteMiss(f"{self.name}: replay provider called outside a cassette")
+
+
+class ProviderRegistry:
+    """Builds providers once per configuration and hands out shared instances.
+
+    - TavilyProvider per API key (one TavilyClient each).
+    - OpenClawWebSearchProvider per (config path, gateway URL, token), each with its
+      own keep-alive session; a changed gateway config yields a new instance.
+    Only available providers are returned, in priority order (Tavily first).
+    While replaying a cassette, the recorded providers are returned instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tavily: Dict[str, TavilyProvider] = {}
+        self._openclaw: Dict[tuple, OpenClawWebSearchProvider] = {}
+
+    def tavily(self, api_key: Optional[str]) -> Optional[TavilyProvider]:
+        if not api_key:
+            return None
+        with self._lock:
+            provider = self._tavily.get(api_key)
+            if provider is None:
+                provider = TavilyProvider(api_key=api_key)
+                if not provider.is_available():
+                    return None  # don't pin a failed init; retry on the next call
+                self._tavily[api_key] = provider
+            return provider
+
+    def openclaw(self, config_path: Optional[str] = None) -> Optional[OpenClawWebSearchProvider]:
+        base, token = OpenClawWebSearchProvider._load_gateway_config(config_path=config_path)
+        if not (base and token):
+            return None
+        key = (config_path, base, token)
+        with self._lock:
+            provider = self._openclaw.get(key)
+            if provider is None:
+                provider = self._openclaw[key] = OpenClawWebSearchProvider(config_path=config_path)
+            return provider
+
+    def get_providers(self, tavily_api_key: Optional[str] = None, *, openclaw_config_path: Optional[str] = None) -> List[SearchProvider]:
+        cassette = get_cassette()
+        if cassette is not None and cassette.mode == "replay":
+            return [ReplayProvider(name) for name in cassette.routes("search")]
+        providers: List[SearchProvider] = []
+        for build in (lambda: self.tavily(tavily_api_key), lambda: self.openclaw(openclaw_config_path)):
+            try:
+                provider = build()
+            except Exception as e:
+                logger.error(f"[ProviderRegistry.get_providers] Provider init failed: {type(e).__name__}: {e}")
+                continue
+            if provider is not None:
+                providers.append(provider)
+        return providers
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tavily.clear()
+            self._openclaw.clear()
+
+
+PROVIDER_REGISTRY = ProviderRegistry()
+
+
+def get_search_providers(tavily_api_key: Optional[str] = None) -> List[SearchProvider]:
+    """Shared, available providers for the given Tavily key (see ProviderRegistry)."""
+    return PROVIDER_REGISTRY.get_providers(tavily_api_key)
+
+
+# Process-wide retrieval metrics; every SearchManager records here unless given its own registry.
+# Series (labels: caller = the SearchManager's `caller`):
+# - search_provider_calls{caller, provider, outcome=ok|error|timeout}   live provider calls
+# - search_provider_latency_seconds{caller, provider}                  histogram, live calls
+# - search_provider_results{caller, provider}                          histogram, results per call
+# - search_cache_lookups{caller, scope=union|provider, tier=memory|disk, outcome=hit|miss}
+# - search_stale_served{caller}                                         stale union entries returned
+# - search_union_returned / _contributed / _exclusive{caller, provider}  per live merge: raw results,
+#   URLs that made it into the merged list, URLs no other provider returned for the same query
+SEARCH_METRICS = MetricsRegistry()
+
+
+def provider_yield_summary(metrics: Optional[MetricsRegistry] = None, caller: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-provider cost vs. yield, for one caller or all of them.
+
+    Answers "is the second provider worth its latency": call counts, error / timeout
+    counts, latency p50 / p95, and how many unique URLs it added to union merges.
+    """
+    metrics = metrics if metrics is not None else SEARCH_METRICS
+    where = {"caller": caller} if caller else {}
+    summary: Dict[str, Dict[str, Any]] = {}
+    for provider in metrics.label_values("provider"):
+        latency = metrics.histogram("search_provider_latency_seconds", provider=provider, **where)
+        summary[provider] = {
+            "calls": metrics.counter("search_provider_calls", provider=provider, **where),
+            "errors": metrics.counter("search_provider_calls", provider=provider, outcome="error", **where),
+            "timeouts": metrics.counter("search_provider_calls", provider=provider, outcome="timeout", **where),
+            "latency_p50": latency.quantile(0.5) if latency else None,
+            "latency_p95": latency.quantile(0.95) if latency else None,
+            "results": metrics.counter("search_union_returned", provider=provider, **where),
+            "contributed": metrics.counter("search_union_contributed", provider=provider, **where),
+            "exclusive": metrics.counter("search_union_exclusive", provider=provider, **where),
+        }
+    return summary
+
+
+class _ProviderCall:
+    """One submitted (query, provider) call.
+
+    `started` is set once the call is past the rate limiter and talking to the provider.
+    Its health outcome is recorded exactly once, by whichever side claims it first: the
+    worker when the call returns, or the batch when it abandons the call at the deadline.
+    """
+
+    __slots__ = ("started", "_claimed", "_lock")
+
+    def __init__(self):
+        self.started = threading.Event()
+        self._claimed = False
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        with self._lock:
+            first, self._claimed = not self._claimed, True
+            return first
+
+
 class SearchManager:
     def __init__(
         self,
@@ -262,117 +1230,503 @@ class SearchManager:
         *,
         cache_ttl_seconds: int = 12 * 3600,
         hard_timeout_seconds: int = 25,
+        max_workers: Optional[int] = None,
+        per_provider_concurrency: int = 4,
+        cache: Optional[SearchCache] = None,
+        memory_cache: Optional[MemoryCacheTier] = None,
+        stale_ttl_seconds: Optional[int] = None,
+        health: Optional[HealthTracker] = None,
+        latency_ordering: bool = False,
+        limits: Optional[RateLimitRegistry] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        caller: str = "default",
     ):
-        self.providers: List[SearchProvider] = list(providers) if providers is not None else [
-            TavilyProvider() if os.getenv("TAVILY_API_KEY") else None,
-            OpenClawWebSearchProvider(),
-        ]
+        self.providers: List[SearchProvider] = (
+            list(providers) if providers is not None else get_search_providers(os.getenv("TAVILY_API_KEY"))
+        )
         self.providers = [p for p in self.providers if p is not None]
+        cassette = get_cassette()
+        if cassette is not None:
+            # Replay rebuilds providers from the cassette; keep their priority order.
+            cassette.set_routes("search", [p.name for p in self.providers])
         self.cache_ttl_seconds = cache_ttl_seconds
+        # None disables stale-while-revalidate (expired entries are misses, as before).
+        self.stale_ttl_seconds = stale_ttl_seconds
         self.hard_timeout_seconds = hard_timeout_seconds
+        self.health: HealthTracker = health if health is not None else PROVIDER_HEALTH
+        # When True, faster providers (rolling median latency) are queried and merged first.
+        self.latency_ordering = latency_ordering
+        self.limits: RateLimitRegistry = limits if limits is not None else PROVIDER_LIMITS
+        self.max_workers = max_workers
+        self.per_provider_concurrency = max(1, per_provider_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.cache: SearchCache = cache if cache is not None else create_search_cache()
+        self.memory_cache: MemoryCacheTier = memory_cache if memory_cache is not None else MEMORY_CACHE
+        # Metrics are labelled with the calling feature (e.g. collect_news, execute_searches).
+        self.metrics: MetricsRegistry = metrics if metrics is not None else SEARCH_METRICS
+        self.caller = caller
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Workers of a timed-out provider keep running until its own HTTP timeout;
+        # the pool is shared per manager so they don't pile up across calls.
+        if self._executor is None:
+            workers = self.max_workers or max(4, len(self.providers) * self.per_provider_concurrency)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        return self._executor
 
     def _cache_key(self, query: str, provider: str, max_results: int, topic: str, depth: str) -> str:
-        raw = json.dumps({"q": query, "p": provider, "n": max_results, "topic": topic, "depth": depth}, sort_keys=True)
+        # Queries differing only in case / width / whitespace share an entry.
+        raw = json.dumps(
+            {"q": normalize_query(query), "p": provider, "n": max_results, "topic": topic, "depth": depth},
+            sort_keys=True,
+        )
         return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-    def _cache_path(self, key: str) -> Path:
-        SEARCH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        return SEARCH_CACHE_DIR / f"{key}.json"
+    def _is_fresh(self, entry: CacheEntry) -> bool:
+        return not entry.ts or (time.time() - entry.ts) <= self.cache_ttl_seconds
+
+    def _is_servable_stale(self, entry: CacheEntry) -> bool:
+        return bool(self.stale_ttl_seconds) and (time.time() - entry.ts) <= self.stale_ttl_seconds
 
     def _read_cache(self, key: str) -> Optional[List[SearchResult]]:
-        p = self._cache_path(key)
-        if not p.exists():
-            return None
+        return self._read_cache_many([key]).get(key)
+
+    def _read_cache_many(self, keys: Sequence[str]) -> Dict[str, List[SearchResult]]:
+        return {k: e.results for k, e in self._lookup_cache_many(keys).items() if self._is_fresh(e)}
+
+    def _count_lookups(self, scope: str, tier: str, hits: int, misses: int) -> None:
+        for outcome, n in (("hit", hits), ("miss", misses)):
+            if n:
+                self.metrics.inc("search_cache_lookups", n, caller=self.caller, scope=scope, tier=tier, outcome=outcome)
+
+    def _lookup_cache_many(self, keys: Sequence[str], scope: str = "provider") -> Dict[str, CacheEntry]:
+        """Memory tier first, then one bulk disk lookup for the rest (promoted into memory).
+
+        Returns entries regardless of age; callers decide fresh / stale / expired.
+        Per-tier hits (fresh entries) and misses are counted under `scope`.
+        """
+        location = self.cache.location()
+        entries: Dict[str, CacheEntry] = {}
+        disk_keys = []
+        for key in keys:
+            entry = self.memory_cache.get(location, key)
+            if entry is not None and self._is_fresh(entry):
+                entries[key] = entry
+            else:
+                disk_keys.append(key)
+        if disk_keys:
+            try:
+                found = self.cache.get_many(disk_keys)
+            except Exception as e:
+                logger.warning(f"[SearchManager._read_cache_many] Cache read failed: {type(e).__name__}: {e}")
+                found = {}
+            for key, entry in found.items():
+                self.memory_cache.put(location, key, entry)
+                entries[key] = entry
+            disk_hits = sum(1 for k in disk_keys if k in found and self._is_fresh(found[k]))
+            self._count_lookups(scope, "disk", disk_hits, len(disk_keys) - disk_hits)
+        self._count_lookups(scope, "memory", len(keys) - len(disk_keys), len(disk_keys))
+        return entries
+
+    def _write_cache(self, key: str, results: List[SearchResult], contributors: Optional[List[str]] = None) -> None:
+        entry = CacheEntry(results=results, ts=time.time(), contributors=contributors)
+        self.memory_cache.put(self.cache.location(), key, entry)
         try:
-            obj = json.loads(p.read_text("utf-8"))
-            ts = obj.get("ts")
-            if ts and (time.time() - float(ts)) > self.cache_ttl_seconds:
-                return None
-            items = obj.get("results") or []
-            out: List[SearchResult] = []
-            for it in items:
-                out.append(SearchResult(**it))
-            return out
-        except Exception:
-            return None
+            self.cache.set(key, results, contributors)
+        except Exception as e:
+            logger.warning(f"[SearchManager._write_cache] Cache write failed: {type(e).__name__}: {e}")
 
-    def _write_cache(self, key: str, results: List[SearchResult]) -> None:
-        p = self._cache_path(key)
-        payload = {
-            "ts": time.time(),
-            "saved_at": datetime.now(timezone.utc).isoformat(),
-            "results": [r.__dict__ for r in results],
-        }
-        p.write_text(json.dumps(payload, ensure_ascii=False, indent=2), "utf-8")
+    def _query_provider(
+        self,
+        provider: SearchProvider,
+        query: str,
+        max_results: int,
+        topic: str,
+        depth: str,
+        use_cache: bool = True,
+        call: Optional[_ProviderCall] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[SearchResult]:
+        """Per-provider cache lookup, then a live call (runs on the worker pool).
 
-    def search(self, query: str, *, max_results: int = 5, topic: str = "news", depth: str = "basic") -> List[SearchResult]:
+        Concurrent identical lookups anywhere in the process share one execution.
+        `call` tracks whether the live call started and who records its health outcome.
+        """
+        ck = self._cache_key(query, provider.name, max_results, topic, depth)
+        return PROVIDER_FLIGHTS.do(
+            (self.cache.location(), ck),
+            lambda: self._query_provider_once(provider, ck, query, max_results, topic, depth, use_cache, call, deadline),
+        )
+
+    def _query_provider_once(
+        self,
+        provider: SearchProvider,
+        ck: str,
+        query: str,
+        max_results: int,
+        topic: str,
+        depth: str,
+        use_cache: bool,
+        call: Optional[_ProviderCall] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[SearchResult]:
+        cached = self._read_cache(ck) if use_cache else None
+        if cached is not None:
+            logger.debug(f"[SearchManager._query_provider] Cache hit ({provider.name}), {len(cached)} results")
+            return cached
+        limiter = self.limits.limiter(provider.name)
+        if limiter is not None:
+            try:
+                waited = limiter.acquire(timeout=deadline.remaining() if deadline is not None else None)
+            except DeadlineExceeded as e:
+                raise DeadlineExceeded(f"{provider.name}: {e}") from None
+            if waited >= 0.001:
+                logger.debug(f"[SearchManager._query_provider] Rate limit wait for {provider.name}: {waited * 1000:.0f}ms")
+        try:
+            # Budget spent while queued (pool / rate limiter): don't start a call nobody will wait for.
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"{provider.name}: deadline passed before the call started")
+            kwargs: Dict[str, Any] = {"max_results": max_results, "topic": topic, "depth": depth}
+            if deadline is not None and provider.supports_timeout:
+                kwargs["timeout"] = deadline.timeout()
+            if call is None:
+                call = _ProviderCall()  # direct call: no batch to abandon it
+            call.started.set()
+            call_start = time.monotonic()
+            labels = {"caller": self.caller, "provider": provider.name}
+
+            def live() -> List[SearchResult]:
+                try:
+                    return provider.search(query, **kwargs)
+                except Exception as e:
+                    # the network timeout was the deadline: record it as a timeout, not a failure
+                    if deadline is not None and deadline.expired and not isinstance(e, DeadlineExceeded):
+                        raise DeadlineExceeded(f"{provider.name}: {type(e).__name__}: {e}") from e
+                    raise
+
+            try:
+                res = record_or_replay(
+                    "search",
+                    provider.name,
+                    {"query": query, "max_results": max_results, "topic": topic, "depth": depth},
+                    live,
+                    encode=lambda hits: [asdict(r) for r in hits],
+                    decode=lambda hits: [SearchResult(**r) for r in hits],
+                )
+            except Exception as e:
+                elapsed = time.monotonic() - call_start
+                if call.claim():
+                    self.health.record(provider.name, False, elapsed)
+                # replay fails at once, before the deadline: treat a recorded deadline timeout as the live call did
+                replayed_timeout = isinstance(e, ReplayedTimeout) and e.error_type == DeadlineExceeded.__name__
+                timed_out = replayed_timeout or isinstance(e, DeadlineExceeded) or (deadline is not None and deadline.expired)
+                self.metrics.inc("search_provider_calls", outcome="timeout" if timed_out else "error", **labels)
+                self.metrics.observe("search_provider_latency_seconds", elapsed, **labels)
+                if replayed_timeout:
+                    raise DeadlineExceeded(f"{provider.name}: {e}") from None
+                raise
+            elapsed = time.monotonic() - call_start
+            if call.claim():
+                self.health.record(provider.name, True, elapsed)
+            self.metrics.inc("search_provider_calls", outcome="ok", **labels)
+            self.metrics.observe("search_provider_latency_seconds", elapsed, **labels)
+            self.metrics.observe("search_provider_results", len(res), buckets=COUNT_BUCKETS, **labels)
+        finally:
+            if limiter is not None:
+                limiter.release()
+        # Canonicalize at ingestion so cache entries, merges and callers all see the same URL.
+        res = [replace(r, url=canonicalize_url(r.url)) if r.url else r for r in res]
+        logger.info(f"[SearchManager._query_provider] Provider {provider.name} returned {len(res)} results (raw)")
+        if res:
+            self._write_cache(ck, res)
+        return res
+
+    def search(
+        self,
+        query: str,
+        *,
+        max_results: int = 5,
+        topic: str = "news",
+        depth: str = "basic",
+        deadline: Optional[Deadline] = None,
+    ) -> List[SearchResult]:
         """Search using all available providers and merge results.
 
         Peter requirement: use Tavily + Brave together (union) to improve recall.
+        See `search_detailed` for the strategy and provider bookkeeping.
+        """
+        return self.search_detailed(query, max_results=max_results, topic=topic, depth=depth, deadline=deadline).results
+
+    def search_detailed(
+        self,
+        query: str,
+        *,
+        max_results: int = 5,
+        topic: str = "news",
+        depth: str = "basic",
+        deadline: Optional[Deadline] = None,
+    ) -> SearchOutcome:
+        """Search all available providers concurrently and merge deterministically.
+
+        Single-query form of `search_many`.
+        """
+        outcomes = self.search_many([query], max_results=max_results, topic=topic, depth=depth, deadline=deadline)
+        return outcomes.get(query) or SearchOutcome(results=[])
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        *,
+        max_results: int = 5,
+        topic: str = "news",
+        depth: str = "basic",
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, SearchOutcome]:
+        """Search a batch of queries and return outcomes keyed by query.
 
         Strategy:
-        - For each provider: try cache; else call provider.
-        - Merge by URL, keep first-seen order (provider order), cap to max_results.
-        - Cache the merged results under a stable key (provider="union").
+        - Identical queries are searched once; empty queries are dropped.
+        - The union cache is checked for every query up front; hits return immediately.
+        - With `stale_ttl_seconds` set, entries past the soft TTL but within the hard TTL
+          are returned marked `stale` and refreshed in the background (one refresh per key
+          per process).
+        - Misses fan out as (query, provider) tasks on the pool, at most
+          `per_provider_concurrency` in flight per provider (per-provider cache first).
+        - Tasks still queued or running at `hard_timeout_seconds` (for the whole batch)
+          or at the caller's `deadline`, whichever comes first, are ignored and reported
+          as timed out. Providers with `supports_timeout` get the remaining budget as
+          their own network timeout, so abandoned calls don't keep running for long.
+        - Per query, merge by canonical URL (`url_dedup_key`) in provider order (not
+          completion order), cap to max_results.
+        - Providers whose circuit breaker is open are skipped (see HealthTracker); with
+          `latency_ordering`, faster providers are queried and merged first.
+        - Cache each merged result under a stable key (provider="union"), unless it is
+          partial (a provider timed out, failed or was skipped).
         """
 
         start = time.time()
-        logger.info(f"[SearchManager.search] Starting search with {len(self.providers)} provider(s), query: {query[:80]}")
+        unique = list(dict.fromkeys(q for q in queries if q))
+        logger.info(
+            f"[SearchManager.search_many] {len(unique)} unique query(s) ({len(queries)} requested), "
+            f"{len(self.providers)} provider(s)"
+        )
+
+        outcomes: Dict[str, SearchOutcome] = {}
+        misses: List[str] = []
+        union_keys = {q: self._cache_key(q, "union", max_results, topic, depth) for q in unique}
+        cached = self._lookup_cache_many(list(union_keys.values()), scope="union")
+        for query in unique:
+            entry = cached.get(union_keys[query])
+            if entry is not None and self._is_fresh(entry):
+                logger.info(f"[SearchManager.search_many] Cache hit (union), {len(entry.results)} results for: {query[:80]}")
+                stale = False
+            elif entry is not None and self._is_servable_stale(entry):
+                logger.info(f"[SearchManager.search_many] Stale cache hit (union), refreshing in background: {query[:80]}")
+                self._schedule_refresh(query, union_keys[query], max_results, topic, depth)
+                self.metrics.inc("search_stale_served", caller=self.caller)
+                stale = True
+            else:
+                misses.append(query)
+                continue
+            outcomes[query] = SearchOutcome(
+                results=entry.results,
+                # names recorded by the live merge; older entries only have the results' labels
+                contributors=(
+                    list(entry.contributors) if entry.contributors is not None
+                    else list(dict.fromkeys(r.provider for r in entry.results))
+                ),
+                from_cache=True,
+                stale=stale,
+            )
+        if misses:
+            batch_deadline = Deadline.within(deadline, self.hard_timeout_seconds)
+            outcomes.update(self._search_live(misses, union_keys, max_results, topic, depth, start, deadline=batch_deadline))
+        return outcomes
 
-        union_key = self._cache_key(query, "union", max_results, topic, depth)
-        cached_union = self._read_cache(union_key)
-        if cached_union is not None:
-            logger.info(f"[SearchManager.search] Cache hit (union), returning {len(cached_union)} results")
-            return cached_union
+    def _schedule_refresh(self, query: str, union_key: str, max_results: int, topic: str, depth: str) -> None:
+        token = (self.cache.location(), union_key)
+        with _REFRESH_LOCK:
+            if token in _REFRESHING:
+                return
+            _REFRESHING.add(token)
 
-        merged: List[SearchResult] = []
-        seen_urls = set()
+        def refresh():
+            try:
+                self._search_live([query], {query: union_key}, max_results, topic, depth, time.time(), use_cache=False)
+            except Exception as e:
+                logger.warning(f"[SearchManager._schedule_refresh] Background refresh failed: {type(e).__name__}: {e}")
+            finally:
+                with _REFRESH_LOCK:
+                    _REFRESHING.discard(token)
+
+        try:
+            _refresh_executor().submit(refresh)
+        except RuntimeError:  # interpreter shutting down
+            with _REFRESH_LOCK:
+                _REFRESHING.discard(token)
+
+    def _search_live(
+        self,
+        misses: List[str],
+        union_keys: Dict[str, str],
+        max_results: int,
+        topic: str,
+        depth: str,
+        start: float,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, SearchOutcome]:
+        """Fan the given queries out to providers and merge; writes the union cache.
+
+        use_cache=False skips per-provider cache reads (background refresh).
+        """
+        if deadline is None:
+            deadline = Deadline(self.hard_timeout_seconds)
+        outcomes: Dict[str, SearchOutcome] = {}
 
+        available = []
+        skipped = []
         for provider in self.providers:
-            elapsed = time.time() - start
-            if elapsed > self.hard_timeout_seconds:
-                logger.warning(f"[SearchManager.search] Hard timeout ({elapsed:.1f}s > {self.hard_timeout_seconds}s), stopping")
-                break
             if not provider.is_available():
-                logger.debug(f"[SearchManager.search] Provider {provider.name} not available")
-                continue
-
-            logger.debug(f"[SearchManager.search] Querying provider: {provider.name}")
-            ck = self._cache_key(query, provider.name, max_results, topic, depth)
-            cached = self._read_cache(ck)
-            res: List[SearchResult]
-            if cached is not None:
-                logger.debug(f"[SearchManager.search] Cache hit ({provider.name}), {len(cached)} results")
-                res = cached
+                logger.debug(f"[SearchManager._search_live] Provider {provider.name} not available")
+            elif not self.health.allow(provider.name):
+                logger.info(f"[SearchManager._search_live] Circuit open, skipping provider {provider.name}")
+                skipped.append(provider.name)
             else:
+                available.append(provider)
+        if self.latency_ordering:
+            # Stable sort: providers without latency data keep their configured position at the end.
+            latencies = {p.name: self.health.latency(p.name) for p in available}
+            available.sort(key=lambda p: (latencies[p.name] is None, latencies[p.name] or 0.0))
+
+        queued: Dict[str, deque] = {p.name: deque(misses) for p in available}
+        in_flight: Dict[str, int] = {p.name: 0 for p in available}
+        running: Dict[Future, tuple] = {}
+        raw: Dict[tuple, List[SearchResult]] = {}
+        failed: Dict[str, List[str]] = {}
+        timed_out: Dict[str, List[str]] = {}
+        executor = self._get_executor()
+
+        def submit_next(provider: SearchProvider) -> None:
+            pending = queued[provider.name]
+            while pending and in_flight[provider.name] < self.per_provider_concurrency and not deadline.expired:
+                query = pending.popleft()
+                call = _ProviderCall()
+                fut = executor.submit(
+                    self._query_provider, provider, query, max_results, topic, depth, use_cache, call, deadline
+                )
+                running[fut] = (query, provider, call)
+                in_flight[provider.name] += 1
+
+        for provider in available:
+            submit_next(provider)
+
+        while running:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(running), timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                query, provider, _ = running.pop(fut)
+                in_flight[provider.name] -= 1
                 try:
-                    res = provider.search(query, max_results=max_results, topic=topic, depth=depth)
-                    logger.info(f"[SearchManager.search] Provider {provider.name} returned {len(res)} results (raw)")
-                    if res:
-                        self._write_cache(ck, res)
+                    raw[(query, provider.name)] = fut.result()
                 except Exception as exc:
-                    logger.error(f"[SearchManager.search] Provider {provider.name} failed: {type(exc).__name__}: {exc}")
-                    continue
+                    if isinstance(exc, DeadlineExceeded) or deadline.expired:
+                        # the call ran out of budget (its network timeout was the deadline)
+                        timed_out.setdefault(query, []).append(provider.name)
+                        submit_next(provider)
+                        continue
+                    failed.setdefault(query, []).append(provider.name)
+                    logger.error(f"[SearchManager._search_live] Provider {provider.name} failed: {type(exc).__name__}: {exc}")
+                submit_next(provider)
 
-            for r in res:
-                u = (r.url or "").strip()
-                if not u or u in seen_urls:
-                    continue
-                seen_urls.add(u)
-                merged.append(r)
-                if len(merged) >= max_results:
-                    break
-            logger.debug(f"[SearchManager.search] After {provider.name}: merged={len(merged)} results")
-            if len(merged) >= max_results:
-                break
+        for fut, (query, provider, call) in running.items():
+            if call.started.is_set() and call.claim():
+                # A provider call still in flight at the deadline counts as one failure (it cost the
+                # full budget); calls queued on the rate limiter or a shared flight do not. The
+                # worker skips its own record when it finishes later.
+                self.health.record(provider.name, False, time.time() - start)
+            fut.cancel()
+            timed_out.setdefault(query, []).append(provider.name)
+        for name, pending in queued.items():
+            for query in pending:
+                timed_out.setdefault(query, []).append(name)
+        if timed_out:
+            logger.warning(
+                f"[SearchManager._search_live] Deadline reached ({time.time() - start:.1f}s), "
+                f"ignoring {sum(len(v) for v in timed_out.values())} provider call(s)"
+            )
 
-        logger.info(f"[SearchManager.search] Final result: {len(merged)} merged results from {len(self.providers)} provider(s)")
-        self._write_cache(union_key, merged)
-        return merged
+        for query in misses:
+            outcome = SearchOutcome(
+                results=[],
+                # keep provider order so the report is deterministic too
+                timed_out=[p.name for p in available if p.name in timed_out.get(query, [])],
+                failed=[p.name for p in available if p.name in failed.get(query, [])],
+                skipped=list(skipped),
+            )
+            seen_urls = set()
+            contributed_by: Dict[str, int] = {}
+            for provider in available:
+                contributed = 0
+                for r in raw.get((query, provider.name), []):
+                    if len(outcome.results) >= max_results:
+                        break
+                    u = url_dedup_key(r.url or "")
+                    if not u or u in seen_urls:
+                        continue
+                    seen_urls.add(u)
+                    outcome.results.append(r)
+                    contributed += 1
+                contributed_by[provider.name] = contributed
+                if contributed:
+                    outcome.contributors.append(provider.name)
+            self._record_merge_yield(query, available, raw, contributed_by)
+            if not (outcome.timed_out or outcome.failed or outcome.skipped):
+                self._write_cache(union_keys[query], outcome.results, outcome.contributors)
+            outcomes[query] = outcome
 
+        logger.info(
+            f"[SearchManager._search_live] {len(misses)} live query(s), "
+            f"{sum(len(outcomes[q].results) for q in misses)} merged results in {time.time() - start:.2f}s"
+        )
+        return outcomes
 
-def format_search_results_for_prompt(results: List[SearchResult], *, limit: int = 8) -> str:
-    """Compact representation for LLM prompt; citation-friendly."""
+    def _record_merge_yield(
+        self,
+        query: str,
+        available: Sequence[SearchProvider],
+        raw: Dict[tuple, List[SearchResult]],
+        contributed_by: Dict[str, int],
+    ) -> None:
+        """Per provider that answered `query`: raw results, URLs kept in the merge, URLs no other provider had."""
+        urls = {
+            p.name: {url_dedup_key(r.url or "") for r in raw[(query, p.name)]} - {""}
+            for p in available
+            if (query, p.name) in raw
+        }
+        for name, own in urls.items():
+            others = set().union(*(u for n, u in urls.items() if n != name))
+            labels = {"caller": self.caller, "provider": name}
+            self.metrics.inc("search_union_returned", len(raw[(query, name)]), **labels)
+            self.metrics.inc("search_union_contributed", contributed_by.get(name, 0), **labels)
+            self.metrics.inc("search_union_exclusive", len(own - others), **labels)
+
+
+def format_search_results_for_prompt(
+    results: List[SearchResult],
+    *,
+    limit: int = 8,
+    ranker: Optional[PlaybookRanker] = None,
+) -> str:
+    """Compact representation for LLM prompt; citation-friendly.
+
+    With a `ranker`, results are re-ranked against the playbook thesis before
+    truncating to `limit`.
+    """
+    if ranker is not None:
+        results = ranker.rank_results(results)
     lines: List[str] = []
     for i, r in enumerate(results[:limit], start=1):
         lines.append(
@@ -0,0 +1,525 @@
+"""SQLite 存储后端
+
+与 `Storage`（JSON 文件树）保持相同的公开方法，研究历史、Playbook 与用户偏好
+存放在 `~/.investment-assistant/storage.db`（WAL 模式）。配置（config.json）、
+上传文件与日志仍走文件系统。
+
+研究记录按 stock_id / date / is_milestone 建索引，追加、打标里程碑、写反馈都只
+触及单行，不再整体重写 history.json。
+"""
+
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, List
+
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS stock_playbooks (
+    stock_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS research_records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    stock_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    date TEXT NOT NULL DEFAULT '',
+    is_milestone INTEGER NOT NULL DEFAULT 0,
+    has_feedback INTEGER NOT NULL DEFAULT 0,
+    has_uploads INTEGER NOT NULL DEFAULT 0,
+    recommendation TEXT,
+    data TEXT NOT NULL,
+    full_report TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_research_stock_date ON research_records(stock_id, date);
+CREATE INDEX IF NOT EXISTS idx_research_stock_milestone ON research_records(stock_id, is_milestone);
+CREATE INDEX IF NOT EXISTS idx_research_stock_id ON research_records(stock_id, id);
+CREATE TABLE IF NOT EXISTS interactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+PORTFOLIO_DOC = "portfolio_playbook"
+PREFERENCES_DOC = "user_preferences"
+
+
+class SQLiteStorage(Storage):
+    """SQLite 存储（与 Storage 接口一致）"""
+
+    def __init__(self, base_dir: Optional[str] = None, db_path: Optional[str] = None,
+                 auto_migrate: bool = True):
+        super().__init__(base_dir)
+        self.db_path = Path(db_path) if db_path else self.base_dir / "storage.db"
+        self._local = threading.local()
+
+        conn = self._conn()
+        with conn:
+            conn.executescript(SCHEMA)
+        # 以 meta 中的完成标记为准：导入失败时整体回滚、不写标记，下次启动重试
+        if auto_migrate and not self._migrated_from_json():
+            stats = self.migrate_from_json()
+            if any(stats.values()):
+                logger.info(f"[SQLiteStorage] Migrated JSON tree into {self.db_path}: {stats}")
+
+    def _migrated_from_json(self) -> bool:
+        row = self._conn().execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json_at'").fetchone()
+        return row is not None
+
+    # ==================== 连接 ====================
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程一个连接（sqlite3 连接不可跨线程共享）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _get_document(self, name: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def _put_document(self, name: str, data: Dict):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (name, data, updated_at) VALUES (?, ?, ?)",
+                (name, json.dumps(data, ensure_ascii=False), datetime.now().isoformat()),
+            )
+
+    # ==================== 总体 Playbook ====================
+
+    def get_portfolio_playbook(self) -> Optional[Dict]:
+        """获取总体 Playbook"""
+        return self._get_document(PORTFOLIO_DOC)
+
+    def save_portfolio_playbook(self, playbook: Dict):
+        """保存总体 Playbook"""
+        playbook["updated_at"] = datetime.now().isoformat()
+        if "created_at" not in playbook:
+            playbook["created_at"] = playbook["updated_at"]
+        self._put_document(PORTFOLIO_DOC, playbook)
+
+    def has_portfolio_playbook(self) -> bool:
+        """检查是否已有总体 Playbook"""
+        row = self._conn().execute("SELECT 1 FROM documents WHERE name = ?", (PORTFOLIO_DOC,)).fetchone()
+        return row is not None
+
+    # ==================== 个股 Playbook ====================
+
+    def get_stock_playbook(self, stock_id: str) -> Optional[Dict]:
+        """获取个股 Playbook"""
+        row = self._conn().execute(
+            "SELECT data FROM stock_playbooks WHERE stock_id = ?", (self._stock_key(stock_id),)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def save_stock_playbook(self, stock_id: str, playbook: Dict):
+        """保存个股 Playbook"""
+        playbook["stock_id"] = stock_id
+        playbook["updated_at"] = datetime.now().isoformat()
+        if "created_at" not in playbook:
+            playbook["created_at"] = playbook["updated_at"]
+
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO stock_playbooks (stock_id, data, updated_at) VALUES (?, ?, ?)",
+                (self._stock_key(stock_id), json.dumps(playbook, ensure_ascii=False), playbook["updated_at"]),
+            )
+
+    def list_stocks(self) -> List[Dict]:
+        """列出所有股票"""
+        stocks = []
+        rows = self._conn().execute(
+            "SELECT p.stock_id, p.data, r.id AS last_id, r.date AS last_date, r.recommendation AS last_rec "
+            "FROM stock_playbooks p LEFT JOIN research_records r "
+            "ON r.seq = (SELECT MAX(seq) FROM research_records WHERE stock_id = p.stock_id) "
+            "ORDER BY p.stock_id"
+        )
+        for row in rows:
+            playbook = json.loads(row["data"])
+            stocks.append({
+                "stock_id": row["stock_id"],
+                "stock_name": playbook.get("stock_name", row["stock_id"]),
+                "ticker": playbook.get("ticker", ""),
+                "summary": (playbook.get("core_thesis") or {}).get("summary", ""),
+                "updated_at": playbook.get("updated_at", ""),
+                "last_research_id": row["last_id"],
+                "last_research_date": row["last_date"],
+                "last_recommendation": row["last_rec"],
+            })
+        return stocks
+
+    def delete_stock(self, stock_id: str) -> bool:
+        """删除股票（数据库记录 + 上传文件目录）"""
+        key = self._stock_key(stock_id)
+        conn = self._conn()
+        with conn:
+            deleted = conn.execute("DELETE FROM stock_playbooks WHERE stock_id = ?", (key,)).rowcount
+            deleted += conn.execute("DELETE FROM research_records WHERE stock_id = ?", (key,)).rowcount
+        stock_dir = self.base_dir / "stocks" / key
+        if stock_dir.exists():
+            shutil.rmtree(stock_dir)
+            return True
+        return deleted > 0
+
+    # ==================== 研究历史 ====================
+
+    @staticmethod
+    def _row_to_record(row: sqlite3.Row, include_report: bool = True) -> Dict:
+        record = json.loads(row["data"])
+        if include_report and row["full_report"] is not None:
+            record["full_report"] = row["full_report"]
+        return record
+
+    @staticmethod
+    def _record_columns(record: Dict) -> Dict:
+        """提取索引列"""
+        result = record.get("research_result") or {}
+        env_input = record.get("environment_input") or {}
+        body = {k: v for k, v in record.items() if k != "full_report"}
+        return {
+            "id": record.get("id", ""),
+            "date": record.get("date", ""),
+            "is_milestone": 1 if record.get("is_milestone") else 0,
+            "has_feedback": 1 if record.get("user_feedback") else 0,
+            "has_uploads": 1 if env_input.get("user_uploaded") else 0,
+            "recommendation": result.get("recommendation") if isinstance(result, dict) else None,
+            "data": json.dumps(body, ensure_ascii=False),
+            "full_report": record.get("full_report"),
+        }
+
+    def _insert_record(self, conn: sqlite3.Connection, stock_key: str, record: Dict):
+        cols = self._record_columns(record)
+        conn.execute(
+            "INSERT INTO research_records "
+            "(stock_id, id, date, is_milestone, has_feedback, has_uploads, recommendation, data, full_report) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (stock_key, cols["id"], cols["date"], cols["is_milestone"], cols["has_feedback"],
+             cols["has_uploads"], cols["recommendation"], cols["data"], cols["full_report"]),
+        )
+
+    def _query_records(self, stock_id: str, where: str = "", params: tuple = (),
+                       limit: Optional[int] = None, include_report: bool = True) -> List[Dict]:
+        """按插入顺序倒序（最新在前）查询研究记录"""
+        columns = "data, full_report" if include_report else "data"
+        sql = f"SELECT {columns} FROM research_records WHERE stock_id = ?"
+        if where:
+            sql += f" AND ({where})"
+        sql += " ORDER BY seq DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self._conn().execute(sql, (self._stock_key(stock_id), *params)).fetchall()
+        return [self._row_to_record(r, include_report) for r in rows]
+
+    INDEX_COLUMNS = (
+        "seq, id, date, is_milestone, recommendation, has_feedback, has_uploads, "
+        "full_report IS NOT NULL AS has_report"
+    )
+
+    @staticmethod
+    def _row_to_index_entry(r: sqlite3.Row) -> Dict:
+        return {
+            "seq": r["seq"],
+            "id": r["id"],
+            "date": r["date"],
+            "is_milestone": bool(r["is_milestone"]),
+            "recommendation": r["recommendation"],
+            "has_feedback": bool(r["has_feedback"]),
+            "has_uploads": bool(r["has_uploads"]),
+            "has_report": bool(r["has_report"]),
+        }
+
+    def get_research_index(self, stock_id: str) -> List[Dict]:
+        """获取研究历史索引条目（不读取记录正文，最新在前）"""
+        rows = self._conn().execute(
+            f"SELECT {self.INDEX_COLUMNS} FROM research_records WHERE stock_id = ? ORDER BY seq DESC",
+            (self._stock_key(stock_id),),
+        ).fetchall()
+        return [self._row_to_index_entry(r) for r in rows]
+
+    def query_research_history(self, stock_id: str, before_id: Optional[str] = None, limit: int = 20,
+                               fields: str = "record", milestone_only: bool = False,
+                               recommendation: Optional[str] = None, date_from: Optional[str] = None,
+                               date_to: Optional[str] = None) -> Dict:
+        """按索引分页、过滤研究历史（SQL 实现，语义与 Storage 一致）"""
+        if fields not in self.HISTORY_FIELDS:
+            raise ValueError(f"不支持的 fields: {fields}")
+        key = self._stock_key(stock_id)
+        where = ["stock_id = ?"]
+        params: List = [key]
+        if before_id:
+            where.append(
+                "seq < COALESCE((SELECT MAX(seq) FROM research_records WHERE stock_id = ? AND id = ?), 0)"
+            )
+            params += [key, before_id]
+        if milestone_only:
+            where.append("is_milestone = 1")
+        if recommendation:
+            where.append("recommendation = ?")
+            params.append(recommendation)
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("substr(date, 1, ?) <= ?")
+            params += [len(date_to), date_to]
+
+        columns = self.INDEX_COLUMNS
+        if fields != "summary":
+            columns += ", data, full_report" if fields == "full" else ", data"
+        rows = self._conn().execute(
+            f"SELECT {columns} FROM research_records WHERE {' AND '.join(where)} ORDER BY seq DESC LIMIT ?",
+            (*params, int(limit) + 1),
+        ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if fields == "summary":
+            records = [
+                {k: v for k, v in self._row_to_index_entry(r).items() if k in self.HISTORY_SUMMARY_FIELDS}
+                for r in rows
+            ]
+        else:
+            records = [self._row_to_record(r, include_report=(fields == "full")) for r in rows]
+        return {
+            "stock_id": stock_id,
+            "records": records,
+            "next_cursor": rows[-1]["id"] if has_more and rows else None,
+        }
+
+    def get_research_report(self, stock_id: str, record_id: str) -> Optional[str]:
+        """按需读取单条记录的 full_report"""
+        row = self._conn().execute(
+            "SELECT full_report FROM research_records WHERE stock_id = ? AND id = ? ORDER BY seq DESC LIMIT 1",
+            (self._stock_key(stock_id), record_id),
+        ).fetchone()
+        return row["full_report"] if row else None
+
+    def get_research_history(self, stock_id: str, include_reports: bool = True) -> Dict:
+        """获取研究历史"""
+        return {"stock_id": stock_id, "records": self._query_records(stock_id, include_report=include_reports)}
+
+    def add_research_record(self, stock_id: str, record: Dict):
+        """添加研究记录"""
+        record["id"] = f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        record["date"] = datetime.now().isoformat()
+
+        conn = self._conn()
+        with conn:
+            self._insert_record(conn, self._stock_key(stock_id), record)
+
+    def get_recent_research(self, stock_id: str, limit: int = 3, include_report: bool = False) -> List[Dict]:
+        """获取最近的研究记录（包含里程碑记录）；默认不加载 full_report"""
+        regular = self._query_records(stock_id, "is_milestone = 0", limit=limit, include_report=include_report)
+        milestones = self._query_records(stock_id, "is_milestone = 1", include_report=include_report)
+        return self._select_recent(regular + milestones, limit)
+
+    def _update_record(self, stock_id: str, record_id: str, mutate) -> Optional[Dict]:
+        """在事务内读取-修改-写回最新一条匹配 record_id 的记录"""
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT seq, data FROM research_records WHERE stock_id = ? AND id = ? ORDER BY seq DESC LIMIT 1",
+                (self._stock_key(stock_id), record_id),
+            ).fetchone()
+            if row is None:
+                return None
+            record = json.loads(row["data"])
+            mutate(record)
+            cols = self._record_columns(record)
+            conn.execute(
+                "UPDATE research_records SET is_milestone = ?, has_feedback = ?, has_uploads = ?, "
+                "recommendation = ?, data = ? WHERE seq = ?",
+                (cols["is_milestone"], cols["has_feedback"], cols["has_uploads"],
+                 cols["recommendation"], cols["data"], row["seq"]),
+            )
+            return record
+
+    def toggle_milestone(self, stock_id: str, record_id: str) -> bool:
+        """切换研究记录的里程碑状态"""
+        def mutate(record: Dict):
+            record["is_milestone"] = not record.get("is_milestone", False)
+            record["milestone_updated_at"] = datetime.now().isoformat()
+
+        record = self._update_record(stock_id, record_id, mutate)
+        return bool(record and record["is_milestone"])
+
+    def get_milestone_records(self, stock_id: str) -> List[Dict]:
+        """获取所有里程碑记录"""
+        return self._query_records(stock_id, "is_milestone = 1")
+
+    def update_research_feedback(self, stock_id: str, record_id: str, feedback: Dict) -> bool:
+        """更新研究记录的用户反馈"""
+        def mutate(record: Dict):
+            record["user_feedback"] = self._normalize_feedback(feedback)
+
+        return self._update_record(stock_id, record_id, mutate) is not None
+
+    def get_latest_research_with_feedback(self, stock_id: str) -> Optional[Dict]:
+        """获取最近一次有用户反馈的研究记录"""
+        records = self._query_records(stock_id, "has_feedback = 1", limit=1)
+        return records[0] if records else None
+
+    def get_research_context(self, stock_id: str, limit: int = 3) -> List[Dict]:
+        """获取用于研究上下文的历史记录（包含反馈、历史Environment和里程碑）"""
+        candidates = self._query_records(
+            stock_id, "is_milestone = 1 OR has_feedback = 1 OR has_uploads = 1", include_report=False
+        )
+        return self._build_research_context(candidates, limit)
+
+    def get_historical_uploads(self, stock_id: str, limit: int = 5) -> List[Dict]:
+        """获取历史上传的文件（用于研究上下文）"""
+        records = self._query_records(stock_id, "has_uploads = 1", limit=limit, include_report=False)
+        return self._collect_uploads(records, limit)
+
+    # ==================== 股票上下文快照 ====================
+
+    def _context_bundle_signature(self, stock_id: str) -> Optional[tuple]:
+        """数据库查询本身走索引，不做内存快照"""
+        return None
+
+    def _build_context_bundle(self, stock_id: str, recent_limit: int,
+                              context_limit: int, uploads_limit: int) -> Dict:
+        return {
+            "stock_id": stock_id,
+            "portfolio_playbook": self.get_portfolio_playbook(),
+            "stock_playbook": self.get_stock_playbook(stock_id),
+            "recent_research": self.get_recent_research(stock_id, recent_limit),
+            "research_context": self.get_research_context(stock_id, context_limit),
+            "historical_uploads": self.get_historical_uploads(stock_id, uploads_limit),
+            "preferences_prompt": self.get_preferences_for_prompt(),
+        }
+
+    # ==================== 用户偏好学习系统 ====================
+
+    def get_user_preferences(self) -> Dict:
+        """获取用户偏好"""
+        return self._get_document(PREFERENCES_DOC) or self._default_preferences()
+
+    def save_user_preferences(self, prefs: Dict) -> bool:
+        """保存用户偏好（交互日志单独存表）；内容未变化时不写入"""
+        prefs.pop("interaction_log", None)
+        if not self._preferences_changed(prefs):
+            return False
+        prefs["updated_at"] = datetime.now().isoformat()
+        self._put_document(PREFERENCES_DOC, prefs)
+        return True
+
+    def log_interaction(self, interaction: Dict):
+        """记录用户交互（用于偏好提取）"""
+        interaction["timestamp"] = datetime.now().isoformat()
+        interaction["id"] = f"int_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO interactions (data) VALUES (?)", (json.dumps(interaction, ensure_ascii=False),))
+            # 只保留最近100条交互记录
+            conn.execute(
+                "DELETE FROM interactions WHERE seq <= (SELECT MAX(seq) FROM interactions) - ?",
+                (self.MAX_INTERACTIONS,),
+            )
+
+    def get_recent_interactions(self, limit: int = 20) -> List[Dict]:
+        """获取最近的交互记录"""
+        rows = self._conn().execute(
+            "SELECT data FROM interactions ORDER BY seq DESC LIMIT ?", (int(limit),)
+        ).fetchall()
+        return [json.loads(r["data"]) for r in rows]
+
+    # ==================== 迁移 ====================
+
+    def migrate_from_json(self) -> Dict[str, int]:
+        """一次性把 JSON 文件树导入数据库（已存在的股票记录会被覆盖）
+
+        只读取 JSON 文件树：旧版 history.json / interaction_log 原样读取，不做格式转换。
+        """
+        json_storage = Storage(str(self.base_dir))
+        stats = {"stocks": 0, "records": 0, "portfolio": 0, "preferences": 0, "interactions": 0}
+        conn = self._conn()
+
+        with conn:
+            portfolio = json_storage.get_portfolio_playbook()
+            if portfolio is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents (name, data, updated_at) VALUES (?, ?, ?)",
+                    (PORTFOLIO_DOC, json.dumps(portfolio, ensure_ascii=False), portfolio.get("updated_at")),
+                )
+                stats["portfolio"] = 1
+
+            if json_storage._get_preferences_path().exists():
+                prefs = json_storage.get_user_preferences()
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents (name, data, updated_at) VALUES (?, ?, ?)",
+                    (PREFERENCES_DOC, json.dumps(prefs, ensure_ascii=False), prefs.get("updated_at")),
+                )
+                stats["preferences"] = 1
+
+            interactions = json_storage._export_interactions()
+            if interactions:
+                conn.execute("DELETE FROM interactions")
+                # 日志最新在前，按时间正序插入
+                for item in reversed(interactions):
+                    conn.execute("INSERT INTO interactions (data) VALUES (?)", (json.dumps(item, ensure_ascii=False),))
+                stats["interactions"] = len(interactions)
+
+            stocks_dir = self.base_dir / "stocks"
+            for stock_dir in sorted(p for p in stocks_dir.iterdir() if p.is_dir()):
+                key = stock_dir.name
+                playbook_path = stock_dir / "playbook.json"
+                if playbook_path.exists():
+                    playbook = json.loads(playbook_path.read_text("utf-8"))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO stock_playbooks (stock_id, data, updated_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(playbook, ensure_ascii=False), playbook.get("updated_at")),
+                    )
+                    stats["stocks"] += 1
+                records = json_storage._export_research_records(key)
+                if records:
+                    conn.execute("DELETE FROM research_records WHERE stock_id = ?", (key,))
+                    # 历史记录最新在前；按时间正序插入以保持 seq 顺序
+                    for record in reversed(records):
+                        self._insert_record(conn, key, record)
+                    stats["records"] += len(records)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json_at', ?)",
+                (datetime.now().isoformat(),),
+            )
+
+        return stats
+
+
+def migrate_json_to_sqlite(base_dir: Optional[str] = None, db_path: Optional[str] = None) -> Dict[str, int]:
+    """把现有 JSON 文件树迁移到 SQLite（可重复执行）"""
+    storage = SQLiteStorage(base_dir, db_path=db_path, auto_migrate=False)
+    return storage.migrate_from_json()
@@ -1,16 +1,33 @@
 """数据存储模块"""
 
+import gzip
 import json
 import os
-from datetime import datetime
+import pickle
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 import shutil
 
+try:
+    import fcntl
+except ImportError:  # Windows：退化为进程内线程锁
+    fcntl = None
+
 
 class Storage:
     """本地 JSON 文件存储"""
 
+    # 读缓存上限（LRU）：条目数与 pickle 后的总字节数
+    READ_CACHE_MAX_ENTRIES = 512
+    READ_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    BUNDLE_CACHE_MAX_ENTRIES = 64  # 股票上下文快照（LRU）
+
     def __init__(self, base_dir: Optional[str] = None):
         self.base_dir = Path(base_dir or os.path.expanduser("~/.investment-assistant"))
         self.base_dir.mkdir(parents=True, exist_ok=True)
@@ -23,19 +40,182 @@ class Storage:
         self.config_path = self.base_dir / "config.json"
         self.portfolio_playbook_path = self.base_dir / "portfolio_playbook.json"
 
+        # 读缓存（LRU）：path -> ((mtime_ns, size, inode), pickled object)
+        self._read_cache: "OrderedDict[str, Tuple[Tuple[int, int, int], bytes]]" = OrderedDict()
+        self._read_cache_bytes = 0
+        self._read_cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_evictions = 0
+
+        # 写锁：name -> RLock（进程内）+ .locks/{name}.lock 上的 flock（跨进程）
+        self._locks: Dict[str, threading.RLock] = {}
+        self._lock_files: Dict[str, Tuple[Any, int]] = {}
+        self._locks_guard = threading.Lock()
+
+        # 股票上下文快照（LRU）：(stock_key, limits) -> (文件签名, pickled bundle)
+        self._bundle_cache: "OrderedDict[Tuple, Tuple[Tuple, bytes]]" = OrderedDict()
+
+        # 交互日志行数缓存：(文件大小, 行数)，避免每次追加都数行
+        self._interaction_lines: Optional[Tuple[int, int]] = None
+
+    # ==================== 读缓存 ====================
+
+    @staticmethod
+    def _stat_signature(st: os.stat_result) -> Tuple[int, int, int]:
+        """文件版本签名：写入都是临时文件 + os.replace，同一时钟刻度内等长的替换靠 inode 区分"""
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read_json(self, path: Path, default: Any = None) -> Any:
+        """读取 JSON 文件；(mtime, size, inode) 未变时直接返回缓存的解析结果
+
+        缓存以 pickle 形式保存，每次返回独立副本，调用方可以放心修改。
+        签名取自已打开文件的 fstat，与读到的内容一致。
+        """
+        key = str(path)
+        try:
+            f = open(key, "r", encoding="utf-8")
+        except FileNotFoundError:
+            with self._read_cache_lock:
+                self._pop_cached(key)
+            return default
+
+        with f:
+            signature = self._stat_signature(os.fstat(f.fileno()))
+            with self._read_cache_lock:
+                cached = self._read_cache.get(key)
+                if cached and cached[0] == signature:
+                    self._read_cache.move_to_end(key)
+                    self._cache_hits += 1
+                    return pickle.loads(cached[1])
+                self._cache_misses += 1
+            data = json.load(f)
+        blob = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        with self._read_cache_lock:
+            self._pop_cached(key)
+            if len(blob) <= self.READ_CACHE_MAX_BYTES:
+                self._read_cache[key] = (signature, blob)
+                self._read_cache_bytes += len(blob)
+                while (len(self._read_cache) > self.READ_CACHE_MAX_ENTRIES
+                       or self._read_cache_bytes > self.READ_CACHE_MAX_BYTES):
+                    _, (_, old) = self._read_cache.popitem(last=False)
+                    self._read_cache_bytes -= len(old)
+                    self._cache_evictions += 1
+        return data
+
+    def _pop_cached(self, key: str):
+        """移除一条读缓存（须持 _read_cache_lock）"""
+        cached = self._read_cache.pop(key, None)
+        if cached is not None:
+            self._read_cache_bytes -= len(cached[1])
+
+    def _write_json(self, path: Path, data: Any, indent: Optional[int] = 2):
+        """原子写入 JSON 文件（临时文件 + rename）并使对应缓存失效"""
+        self._atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8"))
+
+    def _atomic_write_bytes(self, path: Path, data: bytes):
+        """写临时文件后 os.replace 到目标路径，并使对应缓存失效"""
+        path = Path(path)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            self._invalidate_cache(path)
+
+    def _invalidate_cache(self, path: Optional[Path] = None, *, tree: bool = False):
+        """使单个文件（tree=True 时为目录下全部文件，path 为空时为全部）缓存失效"""
+        with self._read_cache_lock:
+            if path is None:
+                self._read_cache.clear()
+                self._read_cache_bytes = 0
+            elif tree:
+                prefix = os.path.join(str(path), "")
+                for key in [k for k in self._read_cache if k.startswith(prefix)]:
+                    self._pop_cached(key)
+            else:
+                self._pop_cached(str(path))
+
+    def cache_stats(self) -> Dict[str, int]:
+        """读缓存命中统计"""
+        with self._read_cache_lock:
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "entries": len(self._read_cache),
+                "bytes": self._read_cache_bytes,
+                "evictions": self._cache_evictions,
+            }
+
+    # ==================== 写锁 ====================
+    #
+    # 每个读-改-写周期持有一把命名锁：每只股票一把（stock:<key>），
+    # 另有 manifest / preferences / config。同一进程内用 RLock 串行化线程（可重入），
+    # 跨进程用 base_dir/.locks/ 下锁文件的 fcntl.flock。
+    # 锁顺序：manifest -> stock；持有股票锁时不要刷新 manifest。
+
+    @contextmanager
+    def _locked(self, name: str):
+        """持有命名写锁（可重入）"""
+        with self._locks_guard:
+            lock = self._locks.setdefault(name, threading.RLock())
+        with lock:
+            held = self._lock_files.get(name)
+            if held is None:
+                handle = self._acquire_file_lock(name)
+                self._lock_files[name] = (handle, 1)
+            else:
+                self._lock_files[name] = (held[0], held[1] + 1)
+            try:
+                yield
+            finally:
+                handle, depth = self._lock_files[name]
+                if depth == 1:
+                    del self._lock_files[name]
+                    self._release_file_lock(handle)
+                else:
+                    self._lock_files[name] = (handle, depth - 1)
+
+    def _acquire_file_lock(self, name: str):
+        if fcntl is None:
+            return None
+        lock_dir = self.base_dir / ".locks"
+        lock_dir.mkdir(exist_ok=True)
+        handle = open(lock_dir / f"{name.replace(':', '_')}.lock", "a")
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        return handle
+
+    @staticmethod
+    def _release_file_lock(handle):
+        if handle is None:
+            return
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+    def _stock_lock(self, stock_id: str):
+        """单只股票的写锁；不同股票可并行写入"""
+        return self._locked(f"stock:{self._stock_key(stock_id)}")
+
     # ==================== 配置 ====================
 
     def get_config(self) -> Dict:
         """获取配置"""
-        if self.config_path.exists():
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {}
+        return self._read_json(self.config_path, {})
 
     def save_config(self, config: Dict):
         """保存配置"""
-        with open(self.config_path, "w", encoding="utf-8") as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        self._write_json(self.config_path, config)
 
     def get_openai_api_key(self) -> Optional[str]:
         """获取 OpenAI API Key"""
@@ -58,21 +238,24 @@ class Storage:
 
     def set_openai_api_key(self, api_key: str):
         """设置 OpenAI API Key"""
-        config = self.get_config()
-        config["openai_api_key"] = api_key
-        self.save_config(config)
+        with self._locked("config"):
+            config = self.get_config()
+            config["openai_api_key"] = api_key
+            self.save_config(config)
 
     def set_gemini_api_key(self, api_key: str):
         """设置 Gemini API Key"""
-        config = self.get_config()
-        config["gemini_api_key"] = api_key
-        self.save_config(config)
+        with self._locked("config"):
+            config = self.get_config()
+            config["gemini_api_key"] = api_key
+            self.save_config(config)
 
     def set_tavily_api_key(self, api_key: str):
         """设置 Tavily API Key"""
-        config = self.get_config()
-        config["tavily_api_key"] = api_key
-        self.save_config(config)
+        with self._locked("config"):
+            config = self.get_config()
+            config["tavily_api_key"] = api_key
+            self.save_config(config)
 
     def set_api_key(self, api_key: str):
         """兼容旧接口：写入 openai_api_key"""
@@ -85,12 +268,13 @@ class Storage:
 
     def set_llm_provider(self, provider: Optional[str]):
         """设置 LLM 提供商配置"""
-        config = self.get_config()
-        if provider:
-            config["llm_provider"] = provider
-        else:
-            config.pop("llm_provider", None)
-        self.save_config(config)
+        with self._locked("config"):
+            config = self.get_config()
+            if provider:
+                config["llm_provider"] = provider
+            else:
+                config.pop("llm_provider", None)
+            self.save_config(config)
 
     def get_llm_model(self) -> Optional[str]:
         """获取 LLM 模型配置（兼容旧字段）"""
@@ -99,12 +283,13 @@ class Storage:
 
     def set_llm_model(self, model: Optional[str]):
         """设置 LLM 模型配置（兼容旧字段）"""
-        config = self.get_config()
-        if model:
-            config["llm_model"] = model
-        else:
-            config.pop("llm_model", None)
-        self.save_config(config)
+        with self._locked("config"):
+            config = self.get_config()
+            if model:
+                config["llm_model"] = model
+            else:
+                config.pop("llm_model", None)
+            self.save_config(config)
 
     def get_llm_model_pro(self) -> Optional[str]:
         """获取 LLM Pro 模型配置"""
@@ -113,12 +298,13 @@ class Storage:
 
     def set_llm_model_pro(self, model: Optional[str]):
         """设置 LLM Pro 模型配置"""
-        config = self.get_config()
-        if model:
-            config["llm_model_pro"] = model
-        else:
-            config.pop("llm_model_pro", None)
-        self.save_config(config)
+        with self._locked("config"):
+            config = self.get_config()
+            if model:
+                config["llm_model_pro"] = model
+            else:
+                config.pop("llm_model_pro", None)
+            self.save_config(config)
 
     def get_llm_model_flash(self) -> Optional[str]:
         """获取 LLM Flash 模型配置"""
@@ -127,21 +313,59 @@ class Storage:
 
     def set_llm_model_flash(self, model: Optional[str]):
         """设置 LLM Flash 模型配置"""
+        with self._locked("config"):
+            config = self.get_config()
+            if model:
+                config["llm_model_flash"] = model
+            else:
+                config.pop("llm_model_flash", None)
+            self.save_config(config)
+
+    def get_storage_backend(self) -> Optional[str]:
+        """获取存储后端配置（json / sqlite）"""
         config = self.get_config()
-        if model:
-            config["llm_model_flash"] = model
-        else:
-            config.pop("llm_model_flash", None)
-        self.save_config(config)
+        return config.get("storage_backend")
+
+    def set_storage_backend(self, backend: Optional[str]):
+        """设置存储后端配置"""
+        with self._locked("config"):
+            config = self.get_config()
+            if backend:
+                config["storage_backend"] = backend
+            else:
+                config.pop("storage_backend", None)
+            self.save_config(config)
+
+    def get_search_rate_limits(self) -> Dict:
+        """获取检索 Provider 限流配置（按 Provider 名：rate_per_second / burst / max_in_flight）"""
+        config = self.get_config()
+        limits = config.get("search_rate_limits")
+        return limits if isinstance(limits, dict) else {}
+
+    def set_search_rate_limits(self, limits: Optional[Dict]):
+        """设置检索 Provider 限流配置"""
+        with self._locked("config"):
+            config = self.get_config()
+            if limits:
+                config["search_rate_limits"] = limits
+            else:
+                config.pop("search_rate_limits", None)
+            self.save_config(config)
+
+    def set_auth_config(self, enabled: bool, password_hash: Optional[str] = None):
+        """设置访问认证（password_hash 为空时保留原密码）"""
+        with self._locked("config"):
+            config = self.get_config()
+            if password_hash:
+                config["auth_password_hash"] = password_hash
+            config["auth_enabled"] = enabled
+            self.save_config(config)
 
     # ==================== 总体 Playbook ====================
 
     def get_portfolio_playbook(self) -> Optional[Dict]:
         """获取总体 Playbook"""
-        if self.portfolio_playbook_path.exists():
-            with open(self.portfolio_playbook_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return None
+        return self._read_json(self.portfolio_playbook_path)
 
     def save_portfolio_playbook(self, playbook: Dict):
         """保存总体 Playbook"""
@@ -149,8 +373,7 @@ class Storage:
         if "created_at" not in playbook:
             playbook["created_at"] = playbook["updated_at"]
 
-        with open(self.portfolio_playbook_path, "w", encoding="utf-8") as f:
-            json.dump(playbook, f, ensure_ascii=False, indent=2)
+        self._write_json(self.portfolio_playbook_path, playbook)
 
     def has_portfolio_playbook(self) -> bool:
         """检查是否已有总体 Playbook"""
@@ -158,20 +381,24 @@ class Storage:
 
     # ==================== 个股 Playbook ====================
 
+    @staticmethod
+    def _stock_key(stock_id: str) -> str:
+        """股票 ID 归一化（目录名 / 数据库主键）"""
+        return stock_id.lower().replace(" ", "_")
+
     def _get_stock_dir(self, stock_id: str) -> Path:
-        """获取股票目录"""
-        stock_dir = self.base_dir / "stocks" / stock_id.lower().replace(" ", "_")
+        """获取股票目录路径（只解析路径，不创建目录；读路径使用）"""
+        return self.base_dir / "stocks" / self._stock_key(stock_id)
+
+    def _ensure_stock_dir(self, stock_id: str) -> Path:
+        """获取股票目录并确保其存在（写路径使用）"""
+        stock_dir = self._get_stock_dir(stock_id)
         stock_dir.mkdir(parents=True, exist_ok=True)
-        (stock_dir / "uploads").mkdir(exist_ok=True)
         return stock_dir
 
     def get_stock_playbook(self, stock_id: str) -> Optional[Dict]:
         """获取个股 Playbook"""
-        playbook_path = self._get_stock_dir(stock_id) / "playbook.json"
-        if playbook_path.exists():
-            with open(playbook_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return None
+        return self._read_json(self._get_stock_dir(stock_id) / "playbook.json")
 
     def save_stock_playbook(self, stock_id: str, playbook: Dict):
         """保存个股 Playbook"""
@@ -180,65 +407,559 @@ class Storage:
         if "created_at" not in playbook:
             playbook["created_at"] = playbook["updated_at"]
 
-        playbook_path = self._get_stock_dir(stock_id) / "playbook.json"
-        with open(playbook_path, "w", encoding="utf-8") as f:
-            json.dump(playbook, f, ensure_ascii=False, indent=2)
+        with self._stock_lock(stock_id):
+            self._write_json(self._ensure_stock_dir(stock_id) / "playbook.json", playbook)
+        self._drop_context_bundles(stock_id)
+        self._refresh_manifest_entry(stock_id)
 
     def list_stocks(self) -> List[Dict]:
-        """列出所有股票"""
-        stocks = []
-        stocks_dir = self.base_dir / "stocks"
-        if stocks_dir.exists():
-            for stock_dir in stocks_dir.iterdir():
-                if stock_dir.is_dir():
-                    playbook = self.get_stock_playbook(stock_dir.name)
-                    if playbook:
-                        stocks.append({
-                            "stock_id": stock_dir.name,
-                            "stock_name": playbook.get("stock_name", stock_dir.name),
-                            "ticker": playbook.get("ticker", ""),
-                            "summary": playbook.get("core_thesis", {}).get("summary", ""),
-                            "updated_at": playbook.get("updated_at", "")
-                        })
-        return stocks
+        """列出所有股票（由 manifest 提供，一次文件读取）"""
+        return list(self._load_manifest()["stocks"].values())
 
     def delete_stock(self, stock_id: str) -> bool:
         """删除股票"""
         stock_dir = self._get_stock_dir(stock_id)
-        if stock_dir.exists():
+        with self._stock_lock(stock_id):
+            if not stock_dir.exists():
+                return False
             shutil.rmtree(stock_dir)
-            return True
-        return False
+            self._invalidate_cache(stock_dir, tree=True)
+            self._drop_context_bundles(stock_id)
+        self._refresh_manifest_entry(stock_id)
+        return True
+
+    # ==================== 股票 Manifest ====================
+    #
+    # stocks_manifest.json 汇总每只股票的列表字段与最近研究信息，
+    # 在 Playbook / 研究历史写入时增量更新；stocks/ 目录的 mtime 与记录不一致
+    # （目录被外部增删）或文件缺失时整体重建。
+
+    MANIFEST_VERSION = 1
+
+    def _manifest_path(self) -> Path:
+        return self.base_dir / "stocks_manifest.json"
+
+    def _stocks_dir_mtime(self) -> int:
+        return (self.base_dir / "stocks").stat().st_mtime_ns
+
+    def _manifest_entry(self, stock_key: str) -> Optional[Dict]:
+        """由 Playbook 与研究索引头部生成单只股票的 manifest 条目"""
+        playbook = self.get_stock_playbook(stock_key)
+        if not playbook:
+            return None
+        entries = self.get_research_index(stock_key)
+        last = entries[0] if entries else {}
+        return {
+            "stock_id": stock_key,
+            "stock_name": playbook.get("stock_name", stock_key),
+            "ticker": playbook.get("ticker", ""),
+            "summary": (playbook.get("core_thesis") or {}).get("summary", ""),
+            "updated_at": playbook.get("updated_at", ""),
+            "last_research_id": last.get("id"),
+            "last_research_date": last.get("date"),
+            "last_recommendation": last.get("recommendation"),
+        }
+
+    def _load_manifest(self) -> Dict:
+        """读取 manifest；缺失或过期时重建"""
+        manifest = self._read_json(self._manifest_path())
+        if (
+            manifest
+            and manifest.get("version") == self.MANIFEST_VERSION
+            and manifest.get("stocks_dir_mtime_ns") == self._stocks_dir_mtime()
+        ):
+            return manifest
+        return self.rebuild_manifest()
+
+    def rebuild_manifest(self) -> Dict:
+        """扫描 stocks/ 重建 manifest"""
+        with self._locked("manifest"):
+            stocks = {}
+            stocks_dir = self.base_dir / "stocks"
+            for stock_dir in sorted(p for p in stocks_dir.iterdir() if p.is_dir()):
+                entry = self._manifest_entry(stock_dir.name)
+                if entry:
+                    stocks[stock_dir.name] = entry
+            return self._save_manifest(stocks)
+
+    def _save_manifest(self, stocks: Dict[str, Dict]) -> Dict:
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "stocks_dir_mtime_ns": self._stocks_dir_mtime(),
+            "stocks": stocks,
+        }
+        self._write_json(self._manifest_path(), manifest, indent=None)
+        return manifest
+
+    def _refresh_manifest_entry(self, stock_id: str):
+        """写入后增量更新单只股票的 manifest 条目"""
+        with self._locked("manifest"):
+            self._refresh_manifest_entry_locked(self._stock_key(stock_id))
+
+    def _refresh_manifest_entry_locked(self, key: str):
+        manifest = self._read_json(self._manifest_path())
+        if not manifest or manifest.get("version") != self.MANIFEST_VERSION:
+            self.rebuild_manifest()
+            return
+        stocks = manifest["stocks"]
+        exists = (self.base_dir / "stocks" / key).exists()
+        # 本次创建/删除该股票目录可以解释 stocks/ mtime 的变化；其他变化说明目录被外部改动
+        explained = (key in stocks) != exists
+        if manifest.get("stocks_dir_mtime_ns") != self._stocks_dir_mtime() and not explained:
+            self.rebuild_manifest()
+            return
+        entry = self._manifest_entry(key) if exists else None
+        if entry:
+            stocks[key] = entry
+        else:
+            stocks.pop(key, None)
+        self._save_manifest(stocks)
 
     # ==================== 研究历史 ====================
+    #
+    # 每只股票的研究历史是追加写的分段格式：
+    #   research_log.jsonl      记录正文（不含大字段），每次修改追加一个新版本
+    #   research_reports.jsonl  大字段（full_report / _raw_response），仅在调用方需要时读取；
+    #                           每帧为一行 JSON 头 {seq, id, codec, size, fields} + size 字节正文 + "\n"
+    #   research_index.json     侧边索引（seq → 偏移量、日期、里程碑、建议等），最新在前
+    #   archive/*.jsonl.gz      archive_research_reports() 归档的旧报告（整段 gzip）
+    # 旧版 history.json 在首次访问时自动转换（原文件保留为 history.json.bak）。
+
+    RESEARCH_LOG = "research_log.jsonl"
+    RESEARCH_REPORTS = "research_reports.jsonl"
+    RESEARCH_INDEX = "research_index.json"
+    RESEARCH_ARCHIVE_DIR = "archive"
+    COMPACT_MIN_DEAD_BYTES = 1024 * 1024
+
+    # 存入报告段的大字段；正文按记录选择编码：过小或压缩无收益时不压缩
+    REPORT_FIELDS = ("full_report", "_raw_response")
+    REPORT_CODEC = "zlib"  # zlib / gzip / none
+    REPORT_COMPRESS_MIN_BYTES = 512
+    ARCHIVE_SEGMENT_RECORDS = 256  # 每个归档段的记录数；读取归档报告时解压整段
+
+    @staticmethod
+    def _index_entry(record: Dict, seq: int, offset: int, length: int) -> Dict:
+        """由记录生成索引条目"""
+        result = record.get("research_result") or {}
+        env_input = record.get("environment_input") or {}
+        return {
+            "seq": seq,
+            "id": record.get("id", ""),
+            "offset": offset,
+            "length": length,
+            "report_offset": None,
+            "report_length": None,
+            "report_archive": None,
+            "has_report": False,
+            "date": record.get("date", ""),
+            "is_milestone": bool(record.get("is_milestone")),
+            "recommendation": result.get("recommendation") if isinstance(result, dict) else None,
+            "has_feedback": bool(record.get("user_feedback")),
+            "has_uploads": bool(env_input.get("user_uploaded")),
+        }
 
-    def get_research_history(self, stock_id: str) -> Dict:
+    @staticmethod
+    def _append_line(path: Path, obj: Dict) -> Tuple[int, int]:
+        """追加一行 JSON，返回 (offset, length)"""
+        line = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        return offset, len(line)
+
+    def _encode_report(self, payload: Dict) -> Tuple[str, bytes]:
+        """序列化并按记录选择编码，返回 (codec, body)"""
+        raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if self.REPORT_CODEC == "none" or len(raw) < self.REPORT_COMPRESS_MIN_BYTES:
+            return "none", raw
+        if self.REPORT_CODEC == "gzip":
+            body = gzip.compress(raw, compresslevel=6, mtime=0)
+        else:
+            body = zlib.compress(raw, 6)
+        if len(body) >= len(raw):
+            return "none", raw
+        return self.REPORT_CODEC, body
+
+    @staticmethod
+    def _decode_report_frame(frame: bytes) -> Dict:
+        """解码报告段中的一帧（兼容未压缩的旧版整行 JSON）"""
+        head_end = frame.index(b"\n") if b"\n" in frame else len(frame)
+        header = json.loads(frame[:head_end])
+        if "size" not in header:
+            return {k: header[k] for k in Storage.REPORT_FIELDS if k in header}
+        body = frame[head_end + 1:head_end + 1 + header["size"]]
+        codec = header.get("codec", "none")
+        if codec == "zlib":
+            body = zlib.decompress(body)
+        elif codec == "gzip":
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def _append_report(self, path: Path, seq: int, record_id: str, payload: Dict) -> Tuple[int, int]:
+        """追加一帧报告，返回 (offset, length)"""
+        codec, body = self._encode_report(payload)
+        header = json.dumps({
+            "seq": seq, "id": record_id, "codec": codec, "size": len(body), "fields": sorted(payload),
+        }).encode("utf-8")
+        frame = header + b"\n" + body + b"\n"
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(frame)
+        return offset, len(frame)
+
+    @staticmethod
+    def _iter_report_frames(path: Path):
+        """顺序扫描报告段，产出 (seq, payload 是否含 full_report, offset, length)"""
+        with open(path, "rb") as f:
+            offset = 0
+            while True:
+                head = f.readline()
+                if not head:
+                    break
+                length = len(head)
+                try:
+                    header = json.loads(head)
+                except ValueError:
+                    offset += length
+                    continue
+                if "size" in header:
+                    f.seek(header["size"] + 1, os.SEEK_CUR)
+                    length += header["size"] + 1
+                    has_report = "full_report" in header.get("fields", [])
+                else:
+                    has_report = header.get("full_report") is not None
+                yield header.get("seq"), has_report, offset, length
+                offset += length
+
+    def _load_research_index(self, stock_id: str) -> Dict:
+        """读取侧边索引；索引缺失、损坏或落后于日志时（持锁）重建"""
+        stock_dir = self._get_stock_dir(stock_id)
+        index = self._read_valid_research_index(stock_id, stock_dir)
+        if index is not None:
+            return index
+        with self._stock_lock(stock_id):
+            # 等锁期间其他写入者可能已更新索引
+            index = self._read_valid_research_index(stock_id, stock_dir)
+            if index is not None:
+                return index
+            if (stock_dir / "history.json").exists() and not (stock_dir / self.RESEARCH_LOG).exists():
+                return self._convert_legacy_history(stock_id, stock_dir)
+            return self._rebuild_research_index(stock_id, stock_dir)
+
+    def _read_valid_research_index(self, stock_id: str, stock_dir: Path) -> Optional[Dict]:
+        """索引与日志一致时返回索引，否则返回 None"""
+        log_path = stock_dir / self.RESEARCH_LOG
+        if (stock_dir / "history.json").exists() and not log_path.exists():
+            return None
+        log_size = log_path.stat().st_size if log_path.exists() else 0
+        try:
+            index = self._read_json(stock_dir / self.RESEARCH_INDEX)
+            if index and index.get("log_size") == log_size:
+                return index
+        except (OSError, ValueError):
+            pass
+        if not log_size:
+            return {"stock_id": stock_id, "next_seq": 1, "log_size": 0, "dead_bytes": 0, "entries": []}
+        return None
+
+    def _save_research_index(self, stock_dir: Path, index: Dict):
+        log_path = stock_dir / self.RESEARCH_LOG
+        reports_path = stock_dir / self.RESEARCH_REPORTS
+        log_st = log_path.stat() if log_path.exists() else None
+        index["log_size"] = log_st.st_size if log_st else 0
+        # 读者据此确认打开的文件与索引对应（见 _load_records）
+        index["log_ino"] = log_st.st_ino if log_st else None
+        index["reports_ino"] = reports_path.stat().st_ino if reports_path.exists() else None
+        self._write_json(stock_dir / self.RESEARCH_INDEX, index, indent=None)
+
+    def _rebuild_research_index(self, stock_id: str, stock_dir: Path) -> Dict:
+        """扫描日志重建索引并保存"""
+        index = self._scan_research_log(stock_id, stock_dir)
+        self._save_research_index(stock_dir, index)
+        return index
+
+    def _scan_research_log(self, stock_id: str, stock_dir: Path) -> Dict:
+        """扫描日志生成索引，不写盘（同一 seq 以最后一个版本为准）"""
+        latest: Dict[int, Dict] = {}
+        dead_bytes = 0
+        with open(stock_dir / self.RESEARCH_LOG, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    dead_bytes += len(line)
+                    offset += len(line)
+                    continue
+                seq = record.pop("_seq", 0)
+                if seq in latest:
+                    dead_bytes += latest[seq]["length"]
+                latest[seq] = self._index_entry(record, seq, offset, len(line))
+                offset += len(line)
+
+        archive_dir = stock_dir / self.RESEARCH_ARCHIVE_DIR
+        if archive_dir.exists():
+            for archive_path in sorted(archive_dir.glob("*.jsonl.gz")):
+                for seq, payload in self._read_archive(archive_path).items():
+                    if seq in latest:
+                        latest[seq]["report_archive"] = archive_path.name
+                        latest[seq]["has_report"] = payload.get("full_report") is not None
+
+        reports_path = stock_dir / self.RESEARCH_REPORTS
+        if reports_path.exists():
+            for seq, has_report, offset, length in self._iter_report_frames(reports_path):
+                if seq in latest:
+                    latest[seq]["report_offset"] = offset
+                    latest[seq]["report_length"] = length
+                    latest[seq]["report_archive"] = None
+                    latest[seq]["has_report"] = has_report
+
+        entries = sorted(latest.values(), key=lambda e: e["seq"], reverse=True)
+        index = {
+            "stock_id": stock_id,
+            "next_seq": (entries[0]["seq"] + 1) if entries else 1,
+            "dead_bytes": dead_bytes,
+            "entries": entries,
+        }
+        return index
+
+    def _convert_legacy_history(self, stock_id: str, stock_dir: Path) -> Dict:
+        """把旧版 history.json 转成追加写格式"""
+        legacy_path = stock_dir / "history.json"
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            records = json.load(f).get("records", [])
+
+        index = {"stock_id": stock_id, "next_seq": 1, "dead_bytes": 0, "entries": []}
+        # history.json 最新在前；按时间正序追加
+        for record in reversed(records):
+            self._append_research_record(stock_dir, index, dict(record))
+        self._save_research_index(stock_dir, index)
+        legacy_path.replace(stock_dir / "history.json.bak")
+        return index
+
+    def _append_research_record(self, stock_dir: Path, index: Dict, record: Dict,
+                                seq: Optional[int] = None) -> Dict:
+        """追加一条记录（正文 + 报告），并插入索引头部"""
+        if seq is None:
+            seq = index["next_seq"]
+            index["next_seq"] = seq + 1
+        payload = {}
+        for field in self.REPORT_FIELDS:
+            value = record.pop(field, None)
+            if value is not None:
+                payload[field] = value
+
+        offset, length = self._append_line(stock_dir / self.RESEARCH_LOG, {**record, "_seq": seq})
+        entry = self._index_entry(record, seq, offset, length)
+        if payload:
+            entry["report_offset"], entry["report_length"] = self._append_report(
+                stock_dir / self.RESEARCH_REPORTS, seq, entry["id"], payload
+            )
+            entry["has_report"] = "full_report" in payload
+        index["entries"].insert(0, entry)
+        return entry
+
+    # 读取不持锁：索引记录日志 / 报告段的 inode，compact_research_log 替换文件后 inode 改变。
+    # 读者打开文件后核对 inode，不一致说明索引已过时，重新读取索引再试。
+    READ_RETRIES = 3
+
+    def _load_records(self, stock_id: str, entries: List[Dict], include_report: bool = False) -> List[Dict]:
+        """按索引条目读取记录正文（按需附带 full_report 等大字段）
+
+        调用方的条目可能来自压缩 / 归档之前的索引：按 seq 换成当前索引中的条目后读取，
+        并核对打开的文件正是该索引描述的版本（见 READ_RETRIES）。
+        """
+        if not entries:
+            return []
+        stock_dir = self._get_stock_dir(stock_id)
+        for _ in range(self.READ_RETRIES):
+            index = self._load_research_index(stock_id)
+            records = self._read_indexed(stock_dir, index, entries, include_report)
+            if records is not None:
+                return records
+        # 压缩接连发生时退回到持锁读取
+        with self._stock_lock(stock_id):
+            index = self._load_research_index(stock_id)
+            return self._read_indexed(stock_dir, index, entries, include_report, verify=False)
+
+    def _read_indexed(self, stock_dir: Path, index: Dict, entries: List[Dict], include_report: bool,
+                      verify: bool = True) -> Optional[List[Dict]]:
+        """按 index 解析 entries 并读取；文件已不是 index 描述的版本时返回 None"""
+        current = {e["seq"]: e for e in index["entries"]}
+        entries = [current.get(entry["seq"], entry) for entry in entries]
+        needs_reports = include_report and any(e.get("report_offset") is not None for e in entries)
+        with ExitStack() as stack:
+            try:
+                log_file = stack.enter_context(open(stock_dir / self.RESEARCH_LOG, "rb"))
+                reports_file = (
+                    stack.enter_context(open(stock_dir / self.RESEARCH_REPORTS, "rb")) if needs_reports else None
+                )
+            except FileNotFoundError:
+                if verify:
+                    return None
+                raise
+            if verify and not (
+                self._same_file(log_file, index.get("log_ino"))
+                and (reports_file is None or self._same_file(reports_file, index.get("reports_ino")))
+            ):
+                return None
+            return self._read_entries(stock_dir, log_file, entries, include_report, reports_file)
+
+    @staticmethod
+    def _same_file(handle, ino: Optional[int]) -> bool:
+        # 旧版索引不含 inode：无法核对，按一致处理
+        return ino is None or os.fstat(handle.fileno()).st_ino == ino
+
+    def _read_entries(self, stock_dir: Path, log_file, entries: List[Dict], include_report: bool,
+                      reports_file=None) -> List[Dict]:
+        """从已打开的日志读取条目对应的记录（按需附带大字段）"""
+        records = []
+        for entry in entries:
+            log_file.seek(entry["offset"])
+            record = json.loads(log_file.read(entry["length"]))
+            record.pop("_seq", None)
+            records.append(record)
+        if include_report:
+            archives: Dict[str, Dict[int, Dict]] = {}  # 同一次读取中每个归档段只解压一次
+            for record, entry in zip(records, entries):
+                record.update(self._read_report(stock_dir, entry, archives, reports_file))
+        return records
+
+    def _export_research_records(self, stock_id: str) -> List[Dict]:
+        """只读导出全部研究记录（最新在前，含大字段），供迁移到其他后端
+
+        不转换旧版 history.json、不重建或保存索引、不加锁。
+        """
+        stock_dir = self._get_stock_dir(stock_id)
+        log_path = stock_dir / self.RESEARCH_LOG
+        if not log_path.exists():
+            legacy = self._read_json(stock_dir / "history.json") or {}
+            return legacy.get("records", [])
+        index = self._read_valid_research_index(stock_id, stock_dir) or self._scan_research_log(stock_id, stock_dir)
+        with open(log_path, "rb") as log_file:
+            return self._read_entries(stock_dir, log_file, index["entries"], include_report=True)
+
+    def _read_report(self, stock_dir: Path, entry: Dict,
+                     archives: Optional[Dict[str, Dict[int, Dict]]] = None, reports_file=None) -> Dict:
+        """读取单条记录的大字段（报告段或归档段；可传入已打开的报告段）"""
+        archive_name = entry.get("report_archive")
+        if archive_name:
+            archives = {} if archives is None else archives
+            if archive_name not in archives:
+                archives[archive_name] = self._read_archive(stock_dir / self.RESEARCH_ARCHIVE_DIR / archive_name)
+            return dict(archives[archive_name].get(entry["seq"], {}))
+        if entry.get("report_offset") is None:
+            return {}
+        if reports_file is not None:
+            reports_file.seek(entry["report_offset"])
+            return self._decode_report_frame(reports_file.read(entry["report_length"]))
+        with open(stock_dir / self.RESEARCH_REPORTS, "rb") as f:
+            f.seek(entry["report_offset"])
+            return self._decode_report_frame(f.read(entry["report_length"]))
+
+    @staticmethod
+    def _read_archive(path: Path) -> Dict[int, Dict]:
+        """解压整个归档段：seq -> 大字段"""
+        payloads = {}
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                item = json.loads(line)
+                payloads[item.pop("seq")] = item
+        return payloads
+
+    def get_research_index(self, stock_id: str) -> List[Dict]:
+        """获取研究历史索引条目（不读取记录正文，最新在前）"""
+        return self._load_research_index(stock_id)["entries"]
+
+    def get_research_report(self, stock_id: str, record_id: str) -> Optional[str]:
+        """按需读取单条记录的 full_report"""
+        for entry in self.get_research_index(stock_id):
+            if entry["id"] == record_id:
+                return self._load_records(stock_id, [entry], include_report=True)[0].get("full_report")
+        return None
+
+    def get_research_history(self, stock_id: str, include_reports: bool = True) -> Dict:
         """获取研究历史"""
-        history_path = self._get_stock_dir(stock_id) / "history.json"
-        if history_path.exists():
-            with open(history_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {"stock_id": stock_id, "records": []}
+        entries = self.get_research_index(stock_id)
+        return {"stock_id": stock_id, "records": self._load_records(stock_id, entries, include_reports)}
+
+    # 分页查询的字段投影：summary 只返回索引字段，record 为不含报告的正文，full 附带 full_report
+    HISTORY_FIELDS = ("summary", "record", "full")
+    HISTORY_SUMMARY_FIELDS = ("id", "date", "is_milestone", "recommendation", "has_feedback", "has_uploads", "has_report")
+
+    def query_research_history(self, stock_id: str, before_id: Optional[str] = None, limit: int = 20,
+                               fields: str = "record", milestone_only: bool = False,
+                               recommendation: Optional[str] = None, date_from: Optional[str] = None,
+                               date_to: Optional[str] = None) -> Dict:
+        """按索引分页、过滤研究历史（最新在前）
+
+        before_id 为上一页返回的 next_cursor；date_from / date_to 为 ISO 日期前缀（含边界）。
+        返回 {"stock_id", "records", "next_cursor"}，没有更多记录时 next_cursor 为 None。
+        """
+        if fields not in self.HISTORY_FIELDS:
+            raise ValueError(f"不支持的 fields: {fields}")
+        entries = self.get_research_index(stock_id)
+
+        start = 0
+        if before_id:
+            start = next((i + 1 for i, e in enumerate(entries) if e["id"] == before_id), len(entries))
+
+        page: List[Dict] = []
+        has_more = False
+        for entry in entries[start:]:
+            if not self._history_entry_matches(entry, milestone_only, recommendation, date_from, date_to):
+                continue
+            if len(page) >= limit:
+                has_more = True
+                break
+            page.append(entry)
+
+        if fields == "summary":
+            records = [{k: entry.get(k) for k in self.HISTORY_SUMMARY_FIELDS} for entry in page]
+        else:
+            records = self._load_records(stock_id, page, include_report=(fields == "full"))
+        return {
+            "stock_id": stock_id,
+            "records": records,
+            "next_cursor": page[-1]["id"] if has_more and page else None,
+        }
 
-    def add_research_record(self, stock_id: str, record: Dict):
-        """添加研究记录"""
-        history = self.get_research_history(stock_id)
+    @staticmethod
+    def _history_entry_matches(entry: Dict, milestone_only: bool, recommendation: Optional[str],
+                               date_from: Optional[str], date_to: Optional[str]) -> bool:
+        if milestone_only and not entry.get("is_milestone"):
+            return False
+        if recommendation and entry.get("recommendation") != recommendation:
+            return False
+        date = entry.get("date") or ""
+        if date_from and date < date_from:
+            return False
+        if date_to and date[:len(date_to)] > date_to:
+            return False
+        return True
 
+    def add_research_record(self, stock_id: str, record: Dict):
+        """添加研究记录（追加写，不重写已有记录）"""
         # 生成 ID
         record["id"] = f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         record["date"] = datetime.now().isoformat()
 
-        history["records"].insert(0, record)  # 新记录放在最前面
-
-        history_path = self._get_stock_dir(stock_id) / "history.json"
-        with open(history_path, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-
-    def get_recent_research(self, stock_id: str, limit: int = 3) -> List[Dict]:
-        """获取最近的研究记录（包含里程碑记录）"""
-        history = self.get_research_history(stock_id)
-        records = history.get("records", [])
-
+        with self._stock_lock(stock_id):
+            stock_dir = self._ensure_stock_dir(stock_id)
+            index = self._load_research_index(stock_id)
+            self._append_research_record(stock_dir, index, dict(record))  # 新记录放在索引最前面
+            self._save_research_index(stock_dir, index)
+        self._drop_context_bundles(stock_id)
+        self._refresh_manifest_entry(stock_id)
+
+    def get_recent_research(self, stock_id: str, limit: int = 3, include_report: bool = False) -> List[Dict]:
+        """获取最近的研究记录（包含里程碑记录）；默认不加载 full_report"""
+        entries = self._select_recent(self.get_research_index(stock_id), limit)
+        return self._load_records(stock_id, entries, include_report)
+
+    @staticmethod
+    def _select_recent(records: List[Dict], limit: int) -> List[Dict]:
+        """从（最新在前的）记录中选出最近 limit 条普通记录 + 全部里程碑"""
         # 分离里程碑和普通记录
         milestones = [r for r in records if r.get("is_milestone")]
         regular = [r for r in records if not r.get("is_milestone")]
@@ -257,67 +978,167 @@ class Storage:
 
         return recent
 
-    def toggle_milestone(self, stock_id: str, record_id: str) -> bool:
-        """切换研究记录的里程碑状态"""
-        history = self.get_research_history(stock_id)
+    def _update_research_record(self, stock_id: str, record_id: str, mutate) -> Optional[Dict]:
+        """修改最新一条匹配 record_id 的记录：追加新版本并更新索引"""
+        with self._stock_lock(stock_id):
+            stock_dir = self._get_stock_dir(stock_id)
+            index = self._load_research_index(stock_id)
+
+            for i, entry in enumerate(index["entries"]):
+                if entry["id"] != record_id:
+                    continue
+                record = self._load_records(stock_id, [entry])[0]
+                mutate(record)
+
+                offset, length = self._append_line(
+                    stock_dir / self.RESEARCH_LOG, {**record, "_seq": entry["seq"]}
+                )
+                new_entry = self._index_entry(record, entry["seq"], offset, length)
+                for key in ("report_offset", "report_length", "report_archive", "has_report"):
+                    new_entry[key] = entry.get(key, new_entry[key])
+                index["entries"][i] = new_entry
+                index["dead_bytes"] = index.get("dead_bytes", 0) + entry["length"]
+                self._save_research_index(stock_dir, index)
+                self._drop_context_bundles(stock_id)
+                if index["dead_bytes"] > max(self.COMPACT_MIN_DEAD_BYTES, index["log_size"] // 2):
+                    self.compact_research_log(stock_id)
+                return record
 
-        for record in history.get("records", []):
-            if record.get("id") == record_id:
-                record["is_milestone"] = not record.get("is_milestone", False)
-                record["milestone_updated_at"] = datetime.now().isoformat()
+            return None
+
+    def compact_research_log(self, stock_id: str):
+        """重写日志与报告文件，丢弃被新版本覆盖的旧行"""
+        with self._stock_lock(stock_id):
+            stock_dir = self._get_stock_dir(stock_id)
+            if not (stock_dir / self.RESEARCH_LOG).exists():
+                return
+            index = self._load_research_index(stock_id)
+            entries = index["entries"]
+            records = self._load_records(stock_id, entries)
+
+            compacted = {"stock_id": stock_id, "next_seq": index["next_seq"], "dead_bytes": 0, "entries": []}
+            tmp_dir = stock_dir / ".compact"
+            tmp_dir.mkdir(exist_ok=True)
+            for entry, record in reversed(list(zip(entries, records))):
+                if entry.get("report_archive"):
+                    # 已归档的报告留在归档段，只重写记录正文
+                    new_entry = self._append_research_record(tmp_dir, compacted, record, seq=entry["seq"])
+                    new_entry["report_archive"] = entry["report_archive"]
+                    new_entry["has_report"] = entry["has_report"]
+                else:
+                    record.update(self._read_report(stock_dir, entry))
+                    self._append_research_record(tmp_dir, compacted, record, seq=entry["seq"])
+            for name in (self.RESEARCH_LOG, self.RESEARCH_REPORTS):
+                src = tmp_dir / name
+                if src.exists():
+                    src.replace(stock_dir / name)
+                else:
+                    (stock_dir / name).unlink(missing_ok=True)
+            tmp_dir.rmdir()
+            self._save_research_index(stock_dir, compacted)
+
+    def archive_research_reports(self, stock_id: str, older_than_days: int = 180) -> int:
+        """把早于 older_than_days 天的报告归档为 gzip 段，返回归档条数"""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        with self._stock_lock(stock_id):
+            stock_dir = self._get_stock_dir(stock_id)
+            if not (stock_dir / self.RESEARCH_LOG).exists():
+                return 0
+            index = self._load_research_index(stock_id)
+            targets = [
+                e for e in index["entries"]
+                if e.get("report_offset") is not None and e.get("date", "") < cutoff
+            ]
+            if not targets:
+                return 0
+
+            archive_dir = stock_dir / self.RESEARCH_ARCHIVE_DIR
+            archive_dir.mkdir(exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            targets.reverse()  # 按 seq 正序分段
+            for start in range(0, len(targets), self.ARCHIVE_SEGMENT_RECORDS):
+                segment = targets[start:start + self.ARCHIVE_SEGMENT_RECORDS]
+                lines = []
+                for entry in segment:
+                    payload = self._read_report(stock_dir, entry)
+                    line = json.dumps({"seq": entry["seq"], **payload}, ensure_ascii=False) + "\n"
+                    lines.append(line.encode("utf-8"))
+                name = f"reports_{stamp}_{segment[0]['seq']}-{segment[-1]['seq']}.jsonl.gz"
+                data = gzip.compress(b"".join(lines), compresslevel=9, mtime=0)
+                self._atomic_write_bytes(archive_dir / name, data)
+                for entry in segment:
+                    entry["report_archive"] = name
+                    entry["report_offset"] = entry["report_length"] = None
+            self._save_research_index(stock_dir, index)
+            # 重写报告段，丢弃已归档的帧
+            self.compact_research_log(stock_id)
+            return len(targets)
 
-                history_path = self._get_stock_dir(stock_id) / "history.json"
-                with open(history_path, "w", encoding="utf-8") as f:
-                    json.dump(history, f, ensure_ascii=False, indent=2)
-                return record["is_milestone"]
+    def toggle_milestone(self, stock_id: str, record_id: str) -> bool:
+        """切换研究记录的里程碑状态"""
+        def mutate(record: Dict):
+            record["is_milestone"] = not record.get("is_milestone", False)
+            record["milestone_updated_at"] = datetime.now().isoformat()
 
-        return False
+        record = self._update_research_record(stock_id, record_id, mutate)
+        return bool(record and record["is_milestone"])
 
     def get_milestone_records(self, stock_id: str) -> List[Dict]:
         """获取所有里程碑记录"""
-        history = self.get_research_history(stock_id)
-        return [r for r in history.get("records", []) if r.get("is_milestone")]
+        entries = [e for e in self.get_research_index(stock_id) if e["is_milestone"]]
+        return self._load_records(stock_id, entries, include_report=True)
 
     def update_research_feedback(self, stock_id: str, record_id: str, feedback: Dict) -> bool:
         """更新研究记录的用户反馈"""
-        history = self.get_research_history(stock_id)
-
-        for record in history.get("records", []):
-            if record.get("id") == record_id:
-                record["user_feedback"] = {
-                    "research_valuable": feedback.get("research_valuable", True),
-                    "direction_correct": feedback.get("direction_correct", ""),
-                    "continue_research": feedback.get("continue_research", False),
-                    "next_direction": feedback.get("next_direction", ""),
-                    "decision": feedback.get("decision", "持有"),
-                    "tracking_metrics": feedback.get("tracking_metrics", []),
-                    "notes": feedback.get("notes", ""),
-                    "follow_up_conversation": feedback.get("follow_up_conversation", []),
-                    "feedback_date": datetime.now().isoformat()
-                }
-
-                history_path = self._get_stock_dir(stock_id) / "history.json"
-                with open(history_path, "w", encoding="utf-8") as f:
-                    json.dump(history, f, ensure_ascii=False, indent=2)
-                return True
+        def mutate(record: Dict):
+            record["user_feedback"] = self._normalize_feedback(feedback)
 
-        return False
+        return self._update_research_record(stock_id, record_id, mutate) is not None
+
+    @staticmethod
+    def _normalize_feedback(feedback: Dict) -> Dict:
+        """规范化用户反馈字段"""
+        return {
+            "research_valuable": feedback.get("research_valuable", True),
+            "direction_correct": feedback.get("direction_correct", ""),
+            "continue_research": feedback.get("continue_research", False),
+            "next_direction": feedback.get("next_direction", ""),
+            "decision": feedback.get("decision", "持有"),
+            "tracking_metrics": feedback.get("tracking_metrics", []),
+            "notes": feedback.get("notes", ""),
+            "follow_up_conversation": feedback.get("follow_up_conversation", []),
+            "feedback_date": datetime.now().isoformat()
+        }
 
     def get_latest_research_with_feedback(self, stock_id: str) -> Optional[Dict]:
         """获取最近一次有用户反馈的研究记录"""
-        history = self.get_research_history(stock_id)
-
-        for record in history.get("records", []):
-            if record.get("user_feedback"):
-                return record
+        for entry in self.get_research_index(stock_id):
+            if entry["has_feedback"]:
+                return self._load_records(stock_id, [entry], include_report=True)[0]
 
         return None
 
+    @staticmethod
+    def _context_entries(entries: List[Dict], limit: int) -> List[Dict]:
+        """挑出研究上下文需要的索引条目：全部里程碑 + 最近 limit 条带反馈/上传的普通记录"""
+        selected = []
+        regular = 0
+        for entry in entries:
+            if entry["is_milestone"]:
+                selected.append(entry)
+            elif (entry["has_feedback"] or entry["has_uploads"]) and regular < limit:
+                selected.append(entry)
+                regular += 1
+        return selected
+
     def get_research_context(self, stock_id: str, limit: int = 3) -> List[Dict]:
         """获取用于研究上下文的历史记录（包含反馈、历史Environment和里程碑）"""
-        history = self.get_research_history(stock_id)
-        records = history.get("records", [])
+        entries = self._context_entries(self.get_research_index(stock_id), limit)
+        return self._build_research_context(self._load_records(stock_id, entries), limit)
 
+    @staticmethod
+    def _build_research_context(records: List[Dict], limit: int) -> List[Dict]:
+        """从（最新在前的）记录中构建研究上下文"""
         # 分离里程碑和普通记录
         milestones = []
         regular_with_context = []
@@ -356,10 +1177,15 @@ class Storage:
 
     def get_historical_uploads(self, stock_id: str, limit: int = 5) -> List[Dict]:
         """获取历史上传的文件（用于研究上下文）"""
-        history = self.get_research_history(stock_id)
+        entries = [e for e in self.get_research_index(stock_id) if e["has_uploads"]][:limit]
+        return self._collect_uploads(self._load_records(stock_id, entries), limit)
+
+    @staticmethod
+    def _collect_uploads(records: List[Dict], limit: int) -> List[Dict]:
+        """从（最新在前的）记录中收集用户上传文件"""
         all_uploads = []
 
-        for record in history.get("records", []):
+        for record in records:
             env_input = record.get("environment_input", {})
             user_uploaded = env_input.get("user_uploaded", [])
 
@@ -373,6 +1199,92 @@ class Storage:
 
         return all_uploads[:limit]
 
+    # ==================== 股票上下文快照 ====================
+    #
+    # assess_impact / execute_research 需要的全部上下文一次取齐：研究索引读一次、
+    # 所需记录在同一次打开日志时读出。结果按 (stock, limits) 缓存在内存中（LRU），
+    # 以相关文件的 (mtime, size, inode) 作签名，任何写入（包括其他进程）都会使其失效；
+    # 本进程写入 / 删除股票时直接丢弃该股票的快照。
+
+    @classmethod
+    def _file_signature(cls, path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return cls._stat_signature(st)
+
+    def _context_bundle_signature(self, stock_id: str) -> Optional[Tuple]:
+        """快照依赖文件的签名；返回 None 表示不缓存"""
+        stock_dir = self._get_stock_dir(stock_id)
+        paths = [
+            self.portfolio_playbook_path,
+            self._get_preferences_path(),
+            stock_dir / "playbook.json",
+            stock_dir / "history.json",
+            stock_dir / self.RESEARCH_INDEX,
+            stock_dir / self.RESEARCH_LOG,
+        ]
+        return tuple(self._file_signature(p) for p in paths)
+
+    def get_stock_context_bundle(self, stock_id: str, recent_limit: int = 3,
+                                 context_limit: int = 3, uploads_limit: int = 5) -> Dict:
+        """一次性获取个股研究所需的全部上下文
+
+        返回 portfolio_playbook / stock_playbook / recent_research / research_context /
+        historical_uploads / preferences_prompt，与分别调用对应方法的结果一致。
+        """
+        key = (self._stock_key(stock_id), recent_limit, context_limit, uploads_limit)
+        signature = self._context_bundle_signature(stock_id)
+        if signature is not None:
+            with self._read_cache_lock:
+                cached = self._bundle_cache.get(key)
+                if cached and cached[0] == signature:
+                    self._bundle_cache.move_to_end(key)
+                    return pickle.loads(cached[1])
+
+        bundle = self._build_context_bundle(stock_id, recent_limit, context_limit, uploads_limit)
+        if signature is not None:
+            blob = pickle.dumps(bundle, pickle.HIGHEST_PROTOCOL)
+            with self._read_cache_lock:
+                self._bundle_cache[key] = (signature, blob)
+                self._bundle_cache.move_to_end(key)
+                while len(self._bundle_cache) > self.BUNDLE_CACHE_MAX_ENTRIES:
+                    self._bundle_cache.popitem(last=False)
+        return bundle
+
+    def _drop_context_bundles(self, stock_id: str):
+        """丢弃某只股票的全部上下文快照"""
+        stock_key = self._stock_key(stock_id)
+        with self._read_cache_lock:
+            for key in [k for k in self._bundle_cache if k[0] == stock_key]:
+                del self._bundle_cache[key]
+
+    def _build_context_bundle(self, stock_id: str, recent_limit: int,
+                              context_limit: int, uploads_limit: int) -> Dict:
+        entries = self.get_research_index(stock_id)
+        recent_entries = self._select_recent(entries, recent_limit)
+        context_entries = self._context_entries(entries, context_limit)
+        upload_entries = [e for e in entries if e["has_uploads"]][:uploads_limit]
+
+        # 三类记录合并后只读一次日志
+        wanted = {e["seq"] for e in recent_entries + context_entries + upload_entries}
+        needed = [e for e in entries if e["seq"] in wanted]
+        by_seq = dict(zip((e["seq"] for e in needed), self._load_records(stock_id, needed)))
+
+        def pick(selected: List[Dict]) -> List[Dict]:
+            return [by_seq[e["seq"]] for e in selected]
+
+        return {
+            "stock_id": stock_id,
+            "portfolio_playbook": self.get_portfolio_playbook(),
+            "stock_playbook": self.get_stock_playbook(stock_id),
+            "recent_research": pick(recent_entries),
+            "research_context": self._build_research_context(pick(context_entries), context_limit),
+            "historical_uploads": self._collect_uploads(pick(upload_entries), uploads_limit),
+            "preferences_prompt": self.get_preferences_for_prompt(),
+        }
+
     # ==================== 文件上传 ====================
 
     def save_uploaded_file(self, stock_id: str, source_path: str) -> str:
@@ -381,7 +1293,8 @@ class Storage:
         if not source.exists():
             raise FileNotFoundError(f"文件不存在: {source_path}")
 
-        uploads_dir = self._get_stock_dir(stock_id) / "uploads"
+        uploads_dir = self._ensure_stock_dir(stock_id) / "uploads"
+        uploads_dir.mkdir(exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         dest = uploads_dir / f"{timestamp}_{source.name}"
 
@@ -395,11 +1308,16 @@ class Storage:
         return self.base_dir / "user_preferences.json"
 
     def get_user_preferences(self) -> Dict:
-        """获取用户偏好"""
-        path = self._get_preferences_path()
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+        """获取用户偏好（不含交互日志，见 get_recent_interactions）"""
+        prefs = self._read_json(self._get_preferences_path())
+        if prefs is None:
+            return self._default_preferences()
+        prefs.pop("interaction_log", None)  # 旧格式，尚未迁移到 interactions.jsonl
+        return prefs
+
+    @staticmethod
+    def _default_preferences() -> Dict:
+        """空偏好结构"""
         return {
             "preferences": [],
             "preference_summary": {
@@ -408,65 +1326,79 @@ class Storage:
                 "research_focus": [],
                 "disliked_patterns": [],
                 "custom_rules": []
-            },
-            "interaction_log": []
+            }
         }
 
-    def save_user_preferences(self, prefs: Dict):
-        """保存用户偏好"""
+    def _preferences_changed(self, prefs: Dict) -> bool:
+        """与已保存的偏好比较（忽略 updated_at）"""
+        def strip(p: Dict) -> Dict:
+            return {k: v for k, v in p.items() if k not in ("updated_at", "interaction_log")}
+        return strip(self.get_user_preferences()) != strip(prefs)
+
+    def save_user_preferences(self, prefs: Dict) -> bool:
+        """保存用户偏好；内容未变化时不重写文件，返回是否写入"""
+        # 先迁移旧版 interaction_log，否则重写偏好文件会把交互历史一并丢掉
+        self._migrate_interaction_log()
+        prefs.pop("interaction_log", None)
+        if not self._preferences_changed(prefs):
+            return False
         prefs["updated_at"] = datetime.now().isoformat()
-        with open(self._get_preferences_path(), "w", encoding="utf-8") as f:
-            json.dump(prefs, f, ensure_ascii=False, indent=2)
+        self._write_json(self._get_preferences_path(), prefs)
+        return True
 
     def add_preference(self, preference: Dict) -> str:
         """添加一条偏好记录"""
-        prefs = self.get_user_preferences()
+        with self._locked("preferences"):
+            prefs = self.get_user_preferences()
 
-        # 生成 ID
-        pref_id = f"pref_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(prefs['preferences'])}"
-        preference["id"] = pref_id
-        preference["created_at"] = datetime.now().isoformat()
-        preference["updated_at"] = preference["created_at"]
-        preference["active"] = True  # 是否启用
+            # 生成 ID
+            pref_id = f"pref_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(prefs['preferences'])}"
+            preference["id"] = pref_id
+            preference["created_at"] = datetime.now().isoformat()
+            preference["updated_at"] = preference["created_at"]
+            preference["active"] = True  # 是否启用
 
-        prefs["preferences"].insert(0, preference)
-        self.save_user_preferences(prefs)
-        return pref_id
+            prefs["preferences"].insert(0, preference)
+            self.save_user_preferences(prefs)
+            return pref_id
 
     def update_preference(self, pref_id: str, updates: Dict) -> bool:
         """更新偏好"""
-        prefs = self.get_user_preferences()
+        with self._locked("preferences"):
+            prefs = self.get_user_preferences()
 
-        for pref in prefs["preferences"]:
-            if pref["id"] == pref_id:
-                pref.update(updates)
-                pref["updated_at"] = datetime.now().isoformat()
-                self.save_user_preferences(prefs)
-                return True
-        return False
+            for pref in prefs["preferences"]:
+                if pref["id"] == pref_id:
+                    pref.update(updates)
+                    pref["updated_at"] = datetime.now().isoformat()
+                    self.save_user_preferences(prefs)
+                    return True
+            return False
 
     def delete_preference(self, pref_id: str) -> bool:
         """删除偏好"""
-        prefs = self.get_user_preferences()
-        original_len = len(prefs["preferences"])
-        prefs["preferences"] = [p for p in prefs["preferences"] if p["id"] != pref_id]
+        with self._locked("preferences"):
+            prefs = self.get_user_preferences()
+            original_len = len(prefs["preferences"])
+            prefs["preferences"] = [p for p in prefs["preferences"] if p["id"] != pref_id]
 
-        if len(prefs["preferences"]) < original_len:
-            self.save_user_preferences(prefs)
-            return True
-        return False
+            if len(prefs["preferences"]) < original_len:
+                self.save_user_preferences(prefs)
+                return True
+            return False
 
     def toggle_preference(self, pref_id: str) -> bool:
         """切换偏好的启用状态"""
-        prefs = self.get_user_preferences()
+        with self._locked("preferences"):
+            prefs = self.get_user_preferences()
 
-        for pref in prefs["preferences"]:
-            if pref["id"] == pref_id:
-                pref["active"] = not pref.get("active", True)
-                pref["updated_at"] = datetime.now().isoformat()
-                self.save_user_preferences(prefs)
-                return True
-        return False
+            for pref in prefs["preferences"]:
+                if pref["id"] == pref_id:
+                    pref["active"] = not pref.get("active", True)
+                    pref["updated_at"] = datetime.now().isoformat()
+                    self.save_user_preferences(prefs)
+                    return True
+            return False
 
     def get_active_preferences(self) -> List[Dict]:
         """获取所有启用的偏好"""
@@ -475,28 +1407,10 @@ class Storage:
 
     def update_preference_summary(self, summary: Dict):
         """更新偏好总结"""
-        prefs = self.get_user_preferences()
-        prefs["preference_summary"].update(summary)
-        self.save_user_preferences(prefs)
-
-    def log_interaction(self, interaction: Dict):
-        """记录用户交互（用于偏好提取）"""
-        prefs = self.get_user_preferences()
-
-        interaction["timestamp"] = datetime.now().isoformat()
-        interaction["id"] = f"int_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-        prefs["interaction_log"].insert(0, interaction)
-
-        # 只保留最近100条交互记录
-        prefs["interaction_log"] = prefs["interaction_log"][:100]
-
-        self.save_user_preferences(prefs)
-
-    def get_recent_interactions(self, limit: int = 20) -> List[Dict]:
-        """获取最近的交互记录"""
-        prefs = self.get_user_preferences()
-        return prefs.get("interaction_log", [])[:limit]
+        with self._locked("preferences"):
+            prefs = self.get_user_preferences()
+            prefs["preference_summary"].update(summary)
+            self.save_user_preferences(prefs)
 
     def get_preferences_for_prompt(self) -> str:
         """获取用于 prompt 的偏好描述"""
@@ -529,6 +1443,104 @@ class Storage:
 
         return "\n".join(lines) if len(lines) > 1 else "（暂无用户偏好记录）"
 
+    # ==================== 交互日志 ====================
+    #
+    # interactions.jsonl 按时间正序逐行追加（O(1)）；超过 2 × MAX_INTERACTIONS 行时
+    # 截断为最近 MAX_INTERACTIONS 行（摊还 O(1)）。读取时只从文件尾部倒读所需行数。
+    # 旧版 user_preferences.json 中的 interaction_log 在首次访问时迁移过来。
+
+    INTERACTIONS_LOG = "interactions.jsonl"
+    MAX_INTERACTIONS = 100
+
+    def _interactions_path(self) -> Path:
+        return self.base_dir / self.INTERACTIONS_LOG
+
+    def log_interaction(self, interaction: Dict):
+        """记录用户交互（用于偏好提取）"""
+        interaction["timestamp"] = datetime.now().isoformat()
+        interaction["id"] = f"int_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        path = self._interactions_path()
+        self._migrate_interaction_log()  # 在持有 interactions 锁之前（锁顺序：preferences → interactions）
+        with self._locked("interactions"):
+            size = path.stat().st_size if path.exists() else 0
+            lines = self._count_interaction_lines(path, size) + 1
+            self._append_line(path, interaction)
+            if lines > 2 * self.MAX_INTERACTIONS:
+                tail = self._tail_lines(path, self.MAX_INTERACTIONS)
+                self._atomic_write_bytes(path, b"".join(tail))
+                lines = len(tail)
+            self._interaction_lines = (path.stat().st_size, lines)
+
+    def _count_interaction_lines(self, path: Path, size: int) -> int:
+        cached = self._interaction_lines
+        if cached and cached[0] == size:
+            return cached[1]
+        if not size:
+            return 0
+        with open(path, "rb") as f:
+            return f.read().count(b"\n")
+
+    @staticmethod
+    def _tail_lines(path: Path, count: int, block_size: int = 8192) -> List[bytes]:
+        """从文件尾部倒读最后 count 行（含换行符）"""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            while pos > 0 and data.count(b"\n") <= count:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = data.splitlines(keepends=True)
+        return lines[-count:] if count else []
+
+    def _migrate_interaction_log(self):
+        """把旧版 user_preferences.json 中的 interaction_log 迁移到 interactions.jsonl"""
+        path = self._interactions_path()
+        if path.exists():
+            return
+        prefs_path = self._get_preferences_path()
+        prefs = self._read_json(prefs_path)
+        if not prefs or "interaction_log" not in prefs:
+            return
+        # 锁顺序固定为 preferences → interactions（偏好写入路径已持有 preferences 锁）
+        with self._locked("preferences"), self._locked("interactions"):
+            if path.exists():
+                return
+            prefs = self._read_json(prefs_path) or {}
+            legacy = prefs.pop("interaction_log", None) or []
+            # 旧日志最新在前；按时间正序写入
+            lines = [
+                (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+                for item in reversed(legacy[:self.MAX_INTERACTIONS])
+            ]
+            self._atomic_write_bytes(path, b"".join(lines))
+            self._write_json(prefs_path, prefs)
+
+    def _export_interactions(self) -> List[Dict]:
+        """只读导出交互记录（最新在前），旧版 interaction_log 不做迁移"""
+        if self._interactions_path().exists():
+            return self.get_recent_interactions(self.MAX_INTERACTIONS)
+        prefs = self._read_json(self._get_preferences_path()) or {}
+        return (prefs.get("interaction_log") or [])[:self.MAX_INTERACTIONS]
+
+    def get_recent_interactions(self, limit: int = 20) -> List[Dict]:
+        """获取最近的交互记录（最新在前）"""
+        self._migrate_interaction_log()
+        path = self._interactions_path()
+        limit = min(limit, self.MAX_INTERACTIONS)
+        if limit <= 0 or not path.exists():
+            return []
+        interactions = []
+        for line in reversed(self._tail_lines(path, limit)):
+            try:
+                interactions.append(json.loads(line))
+            except ValueError:
+                continue
+        return interactions
+
     # ==================== 日志 ====================
 
     def log(self, message: str, level: str = "INFO"):
@@ -537,3 +1549,24 @@ class Storage:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         with open(log_file, "a", encoding="utf-8") as f:
             f.write(f"[{timestamp}] [{level}] {message}\n")
+
+
+SUPPORTED_STORAGE_BACKENDS = ("json", "sqlite")
+
+
+def resolve_storage_backend(storage: Storage, override: Optional[str] = None) -> str:
+    """解析存储后端：override > env(IA_STORAGE_BACKEND) > config > json"""
+    for candidate in (override, os.getenv("IA_STORAGE_BACKEND"), storage.get_storage_backend()):
+        backend = (candidate or "").strip().lower()
+        if backend in SUPPORTED_STORAGE_BACKENDS:
+            return backend
+    return "json"
+
+
+def create_storage(base_dir: Optional[str] = None, backend: Optional[str] = None) -> Storage:
+    """按配置创建存储实例（JSON 文件树或 SQLite）"""
+    storage = Storage(base_dir)
+    if resolve_storage_backend(storage, backend) == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(base_dir)
+    return storage
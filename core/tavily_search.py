@@ -49,8 +49,12 @@ class TavilySearch:
         exclude_domains: Optional[List[str]] = None,
         include_answer: bool = False,
         include_raw_content: bool = False,
+        timeout: Optional[float] = None,
     ) -> Dict[str, Any]:
-        """Return raw Tavily response (dict)."""
+        """Return raw Tavily response (dict).
+
+        timeout: HTTP timeout in seconds (None = the client's default).
+        """
 
         payload: Dict[str, Any] = {
             "query": query,
@@ -64,6 +68,8 @@ class TavilySearch:
             payload["include_domains"] = include_domains
         if exclude_domains:
             payload["exclude_domains"] = exclude_domains
+        if timeout is not None:
+            payload["timeout"] = timeout
 
         return self._client.search(**payload)
 
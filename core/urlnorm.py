@@ -0,0 +1,181 @@
+"""URL and query normalization for retrieval dedup and cache keys.
+
+- `canonicalize_url`: a still-usable URL with tracking parameters, AMP paths,
+  fragments and redirect wrappers (Google / Google News, AMP cache) removed.
+  Hosts are kept as given (an `amp.` host may not serve the bare path).
+- `url_dedup_key`: a stricter identity for dedup only (scheme, `www.` / mobile
+  host prefixes and trailing slashes ignored); not meant to be opened.
+- `normalize_query`: whitespace / width / case folding for search cache keys.
+"""
+
+from __future__ import annotations
+
+import base64
+import re
+import unicodedata
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+# Known tracking parameters, stripped on every host. Generic names that some sites
+# use for content (`ref`, `from`, `oc`, `cmp`, ...) belong in HOST_TRACKING_PARAMS.
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref_src", "ref_url", "cmpid", "ncid", "ocid",
+    "spm", "scm", "share_token", "share_source", "sharesource", "share_medium",
+    "wt.mc_id", "wt_mc_id", "cid_source", "__twitter_impression", "s_cid", "smid",
+    "guccounter", "guce_referrer", "guce_referrer_sig", "_ga", "_gl",
+    "amp_js_v", "usqp", "referringsource", "utm",
+}
+TRACKING_PREFIXES = ("utm_", "hmsr", "hmpl", "hmcu", "hmkw", "hmci", "pk_", "mtm_", "vero_", "__hs", "_hs")
+
+# Generic-looking parameters that are tracking only on these hosts (and their subdomains).
+HOST_TRACKING_PARAMS = {
+    "theguardian.com": {"cmp", "amp"},
+    "bloomberg.com": {"srnd"},
+    "cnn.com": {"ref"},
+    "news.google.com": {"oc"},
+}
+
+# Host prefixes that serve the same article as the bare / www host.
+MOBILE_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.", "wap.", "3g.", "touch.")
+
+_GOOGLE_REDIRECT_HOSTS = {"www.google.com", "google.com", "news.google.com", "www.google.com.hk"}
+_AMP_PATH_SUFFIXES = ("/amp", "/amp.html", "/amp/")
+_AMP_CACHE_SUFFIX = ".cdn.ampproject.org"
+
+
+def _split(url: str):
+    url = (url or "").strip()
+    if not url:
+        return None
+    if url.startswith("//"):
+        url = "https:" + url
+    elif "://" not in url:
+        host = url.split("/", 1)[0]
+        if "." not in host or any(ch.isspace() for ch in url):
+            return None  # not a bare "host/path" URL
+        url = "https://" + url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    if not parts.netloc:
+        return None
+    return parts
+
+
+def _is_tracking(name: str, host: str = "") -> bool:
+    lowered = name.lower()
+    if lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PREFIXES):
+        return True
+    for domain, params in HOST_TRACKING_PARAMS.items():
+        if (host == domain or host.endswith("." + domain)) and lowered in params:
+            return True
+    return False
+
+
+def _decode_google_news_article(article_id: str) -> Optional[str]:
+    """Best-effort decode of legacy `CBMi...` Google News article ids.
+
+    The id is url-safe base64 of a small protobuf whose first string field is the
+    publisher URL. Newer ids are opaque; those return None.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(article_id + "=" * (-len(article_id) % 4))
+    except (ValueError, TypeError):
+        return None
+    start = raw.find(b"http")
+    if start < 0:
+        return None
+    end = start
+    while end < len(raw) and 0x21 <= raw[end] <= 0x7E:
+        end += 1
+    candidate = raw[start:end].decode("ascii", "ignore")
+    return candidate if _split(candidate) is not None and "." in urlsplit(candidate).netloc else None
+
+
+def _unwrap(parts) -> Tuple[object, bool]:
+    """Follow redirect / cache wrappers. Returns (parts, changed)."""
+    host = parts.netloc.lower()
+    if host in _GOOGLE_REDIRECT_HOSTS:
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        for key in ("url", "q", "u"):
+            target = params.get(key)
+            if target and target.startswith(("http://", "https://")):
+                inner = _split(unquote(target) if "%" in target[:12] else target)
+                if inner is not None:
+                    return inner, True
+        if host == "news.google.com":
+            match = re.search(r"/(?:rss/)?articles/([A-Za-z0-9_-]+)", parts.path)
+            if match:
+                decoded = _decode_google_news_article(match.group(1))
+                if decoded:
+                    return _split(decoded), True
+    if host.endswith(_AMP_CACHE_SUFFIX):
+        # https://<x>.cdn.ampproject.org/c/s/example.com/path -> https://example.com/path
+        match = re.match(r"^/[a-z](?:/s)?/(.+)$", parts.path)
+        if match:
+            secure = "/s/" in parts.path[:5]
+            inner = _split(("https://" if secure else "http://") + match.group(1))
+            if inner is not None:
+                return inner, True
+    return parts, False
+
+
+def _strip_amp_path(path: str) -> str:
+    lowered = path.lower()
+    for suffix in _AMP_PATH_SUFFIXES:
+        if lowered.endswith(suffix) and len(path) > len(suffix):
+            return path[: -len(suffix)] or "/"
+    if lowered.endswith(".amp.html"):
+        return path[: -len(".amp.html")] + ".html"
+    if lowered.startswith("/amp/"):
+        return path[len("/amp"):]
+    return path
+
+
+def canonicalize_url(url: str) -> str:
+    """Return a canonical, still-openable form of `url` (or `url` unchanged if unparseable)."""
+    parts = _split(url)
+    if parts is None:
+        return (url or "").strip()
+    for _ in range(3):  # nested wrappers (google -> amp cache -> publisher)
+        parts, changed = _unwrap(parts)
+        if not changed:
+            break
+
+    scheme = parts.scheme.lower() or "https"
+    host = parts.hostname or ""
+    port = parts.port
+    netloc = host if port is None or (scheme, port) in (("http", 80), ("https", 443)) else f"{host}:{port}"
+
+    path = _strip_amp_path(parts.path or "/")
+    path = re.sub(r"/{2,}", "/", path)
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k, host)]
+    query.sort()
+    return urlunsplit((scheme, netloc, "" if path == "/" else path, urlencode(query, doseq=True), ""))
+
+
+def url_dedup_key(url: str) -> str:
+    """Identity for dedup: canonical URL without scheme and with mobile/www host prefixes removed."""
+    canonical = canonicalize_url(url)
+    parts = _split(canonical)
+    if parts is None:
+        return canonical.lower()
+    host = (parts.netloc or "").lower()
+    for prefix in MOBILE_HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") >= 2:
+            host = host[len(prefix):]
+            break
+    path = parts.path.rstrip("/")
+    return f"{host}{path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def normalize_query(query: str) -> str:
+    """Fold width (NFKC), case and whitespace so equivalent queries share cache keys."""
+    text = unicodedata.normalize("NFKC", query or "")
+    return " ".join(text.lower().split())
+
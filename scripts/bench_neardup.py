@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Benchmark near-duplicate headline clustering on a synthetic syndicated feed.
+
+Generates a few thousand Chinese / English headlines: distinct events, each
+republished by several outlets with typical syndication edits (publisher suffix,
+punctuation, "快讯：" / "BREAKING:" prefixes, small word swaps). Measures:
+- clustering time with MinHash LSH (NearDuplicateIndex) vs brute-force Jaccard
+- pairwise precision / recall against the generated ground truth
+- how many items would still reach the structuring model
+
+Precision is a lower bound: the generator reuses a small clause vocabulary, so
+different events that differ only in the company name ("X names new CFO, sending
+shares to a record high") share most shingles and count as false merges.
+
+Usage:
+    python scripts/bench_neardup.py [--events 1000] [--max-copies 6] [--seed 7]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.neardup import DEFAULT_THRESHOLD, MIN_SHINGLES, NearDuplicateIndex, jaccard, text_numbers, text_shingles
+
+COMPANIES_CN = ["英伟达", "台积电", "贵州茅台", "宁德时代", "比亚迪", "腾讯控股", "阿里巴巴", "美团", "中芯国际", "小米集团"]
+COMPANIES_EN = ["Nvidia", "TSMC", "Apple", "Microsoft", "Tesla", "Alphabet", "Amazon", "Meta", "AMD", "Broadcom"]
+ACTIONS_CN = [
+    "发布{q}财报，营收同比增长{n}%", "宣布斥资{n}亿元回购股份", "{q}出货量同比下滑{n}%", "与{o}达成战略合作",
+    "推出新一代{p}产品", "下调全年业绩指引", "获{o}追加{n}亿元订单", "CEO在业绩会上回应{p}竞争", "拟在{city}新建{p}工厂",
+    "遭{o}起诉专利侵权", "股价盘中大涨{n}%", "完成对{o}的收购", "{p}业务毛利率升至{n}%", "高管团队迎来调整",
+]
+DETAILS_CN = [
+    "净利润创历史新高", "彰显对长期发展的信心", "分析师普遍上调目标价", "市场担忧需求放缓", "共同布局{p}市场",
+    "预计下季度量产", "机构称估值仍有空间", "北向资金连续{n}日净买入", "供应链人士称订单饱满", "监管问询随之而来",
+    "海外收入占比提升至{n}%", "或影响{city}产能规划",
+]
+ACTIONS_EN = [
+    "reports {q} revenue up {n}%", "announces ${n} billion buyback", "cuts full-year guidance", "signs partnership with {o}",
+    "unveils next-generation {p} products", "wins ${n} million order from {o}", "plans new {p} plant in {city}",
+    "faces patent lawsuit from {o}", "shares jump {n}% in early trading", "completes acquisition of {o}",
+    "names new chief financial officer", "expands {p} margins to {n}%",
+]
+DETAILS_EN = [
+    "as {p} demand accelerates", "beating analyst estimates", "amid worries over slowing demand", "citing supply constraints",
+    "sending shares to a record high", "as regulators step up scrutiny", "with overseas sales at {n}% of revenue",
+    "analysts say valuation still attractive", "after a {n}-day rally", "ahead of investor day in {city}",
+]
+PRODUCTS = ["AI芯片", "新能源车", "储能", "云计算", "先进封装", "白酒", "AI chips", "EV", "cloud", "data center"]
+QUARTERS = ["第一季度", "第二季度", "第三季度", "第四季度", "Q1", "Q2", "Q3", "Q4"]
+CITIES = ["上海", "深圳", "合肥", "亚利桑那", "德州", "新加坡", "Arizona", "Texas", "Dresden", "Kumamoto"]
+OUTLETS_CN = ["新浪财经", "东方财富网", "财联社", "证券时报", "第一财经", "澎湃新闻", "界面新闻"]
+OUTLETS_EN = ["Reuters", "Bloomberg", "CNBC", "MarketWatch", "Yahoo Finance", "Barron's", "WSJ"]
+SWAPS_CN = [("宣布", "官宣"), ("同比增长", "同比增"), ("创历史新高", "创新高"), ("达成", "签署"), ("推出", "发布")]
+SWAPS_EN = [("reports", "posts"), ("announces", "unveils"), ("cuts", "lowers"), ("sign", "ink"), ("rules", "regulations")]
+
+
+def _event(rng: random.Random, used: set):
+    """One event headline; (company, action, detail) is unique so distinct events really differ."""
+    while True:
+        cn = rng.random() < 0.6
+        companies = COMPANIES_CN if cn else COMPANIES_EN
+        actions, details = (ACTIONS_CN, DETAILS_CN) if cn else (ACTIONS_EN, DETAILS_EN)
+        c, o = rng.sample(companies, 2)
+        action, detail = rng.choice(actions), rng.choice(details)
+        if (c, action, detail) not in used:
+            used.add((c, action, detail))
+            break
+    slots = lambda: dict(o=o, n=rng.randint(3, 400), q=rng.choice(QUARTERS), p=rng.choice(PRODUCTS), city=rng.choice(CITIES))
+    action, detail = action.format(**slots()), detail.format(**slots())
+    return cn, (f"{c}{action}，{detail}" if cn else f"{c} {action}, {detail}")
+
+
+def _syndicate(rng: random.Random, cn: bool, title: str) -> str:
+    swaps = SWAPS_CN if cn else SWAPS_EN
+    for a, b in swaps:
+        if a in title and rng.random() < 0.3:
+            title = title.replace(a, b, 1)
+    if rng.random() < 0.3:
+        title = title.replace("，", "：" if cn else ",", 1).replace(",", ";", 1)
+    if rng.random() < 0.15:
+        title = ("快讯：" if cn else "BREAKING: ") + title
+    outlet = rng.choice(OUTLETS_CN if cn else OUTLETS_EN)
+    sep = rng.choice([" - ", " | ", "_"]) if cn else rng.choice([" - ", " | "])
+    return f"{title}{sep}{outlet}"
+
+
+def _feed(events: int, max_copies: int, seed: int):
+    rng = random.Random(seed)
+    feed, used = [], set()
+    for event_id in range(events):
+        cn, base = _event(rng, used)
+        for _ in range(rng.randint(1, max_copies)):
+            feed.append((event_id, _syndicate(rng, cn, base)))
+    rng.shuffle(feed)
+    return feed
+
+
+def _brute_force(titles, threshold: float):
+    shingles = [text_shingles(t) for t in titles]
+    numbers = [text_numbers(t) for t in titles]
+    cluster_of, clusters = [], 0
+    for i, s in enumerate(shingles):
+        required = threshold if len(s) >= MIN_SHINGLES else 1.0
+        best, best_sim = None, 0.0
+        for j in range(i):
+            if not (numbers[i] <= numbers[j] or numbers[j] <= numbers[i]):
+                continue
+            sim = jaccard(s, shingles[j])
+            if sim >= required and sim > best_sim:
+                best, best_sim = j, sim
+        if best is None:
+            cluster_of.append(clusters)
+            clusters += 1
+        else:
+            cluster_of.append(cluster_of[best])
+    return cluster_of
+
+
+def _pair_scores(truth, predicted):
+    def pairs(labels):
+        groups = defaultdict(list)
+        for i, label in enumerate(labels):
+            groups[label].append(i)
+        return {(a, b) for g in groups.values() for x, a in enumerate(g) for b in g[x + 1:]}
+
+    t, p = pairs(truth), pairs(predicted)
+    tp = len(t & p)
+    return (tp / len(p) if p else 1.0), (tp / len(t) if t else 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--max-copies", type=int, default=6)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    feed = _feed(args.events, args.max_copies, args.seed)
+    truth = [event for event, _ in feed]
+    titles = [title for _, title in feed]
+    print(f"headlines={len(titles)} events={args.events} threshold={args.threshold}")
+    print(f"{'method':<12} {'time ms':>9} {'us/item':>8} {'clusters':>8} {'precision':>9} {'recall':>7}")
+
+    start = time.perf_counter()
+    index = NearDuplicateIndex(threshold=args.threshold)
+    lsh = [index.add(t) for t in titles]
+    lsh_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    brute = _brute_force(titles, args.threshold)
+    brute_s = time.perf_counter() - start
+
+    for name, labels, elapsed in (("minhash-lsh", lsh, lsh_s), ("brute-force", brute, brute_s)):
+        precision, recall = _pair_scores(truth, labels)
+        print(f"{name:<12} {elapsed * 1e3:>9.0f} {elapsed / len(titles) * 1e6:>8.0f} "
+              f"{len(set(labels)):>8} {precision:>9.3f} {recall:>7.3f}")
+
+    kept = len(set(lsh))
+    print(f"structuring input: {len(titles)} -> {kept} items ({1 - kept / len(titles):.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Benchmark report storage size and read latency on a synthetic history.
+
+Builds a 10k-record history (as a legacy pretty-printed history.json), then
+converts it with each report codec (none / zlib / gzip) and measures:
+- on-disk size of the reports segment vs the legacy history.json
+- conversion time
+- latency of single-report reads, recent-research reads and full-history reads
+- size / read latency after archiving reports older than one year
+
+Usage:
+    python scripts/bench_report_compression.py [--records 10000] [--reads 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.storage import Storage
+
+WORDS = (
+    "营收 毛利率 现金流 估值 市盈率 护城河 管理层 回购 分红 指引 订单 产能 渠道 库存 "
+    "competition margin guidance backlog capex demand supply pricing thesis risk catalyst "
+    "季度 同比 环比 上调 下调 超预期 不及预期 风险 机会 里程碑"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    lines = []
+    while words > 0:
+        n = min(words, rng.randint(8, 20))
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(n)))
+        words -= n
+    return "## 研究报告\n\n" + "\n".join(f"- {line}" for line in lines)
+
+
+def _legacy_history(count: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=5 * 365)
+    step = timedelta(days=5 * 365) / count
+    records = []
+    for i in range(count):
+        date = start + step * i
+        records.append({
+            "id": f"research_{i:06d}",
+            "date": date.isoformat(),
+            "trigger": "user_initiated",
+            "environment_input": {"time_range": "7d", "auto_collected": [], "user_uploaded": []},
+            "research_result": {"recommendation": rng.choice(["买入", "持有", "卖出"]), "reasoning": _text(rng, 30)},
+            "full_report": _text(rng, rng.randint(600, 1200)),
+            "_raw_response": json.dumps({"content": _text(rng, 200)}, ensure_ascii=False),
+            "user_feedback": None,
+        })
+    records.reverse()  # history.json 最新在前
+    return {"stock_id": "bench", "records": records}
+
+
+def _timed(fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def _dir_size(path: Path, pattern: str) -> int:
+    return sum(p.stat().st_size for p in path.glob(pattern))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    history = _legacy_history(args.records)
+    legacy_bytes = json.dumps(history, ensure_ascii=False, indent=2).encode("utf-8")
+    ids = [r["id"] for r in history["records"]]
+    sample = random.Random(1).sample(ids, min(args.reads, len(ids)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "history.json"
+        legacy_path.write_bytes(legacy_bytes)
+        legacy_load, _ = _timed(lambda: json.loads(legacy_path.read_bytes()))
+        print(f"records={args.records} legacy history.json={len(legacy_bytes) / 1e6:.1f} MB "
+              f"(json.load {legacy_load * 1e3:.0f} ms)")
+        print(f"{'codec':<8} {'reports MB':>10} {'log MB':>7} {'convert s':>9} {'report ms':>9} "
+              f"{'recent ms':>9} {'full s':>7}")
+
+        for codec in ("none", "zlib", "gzip"):
+            base = Path(tmp) / codec
+            storage = Storage(base_dir=str(base))
+            storage.REPORT_CODEC = codec
+            stock_dir = storage._ensure_stock_dir("bench")
+            shutil.copy(legacy_path, stock_dir / "history.json")
+
+            convert, _ = _timed(lambda: storage.get_research_index("bench"))
+            report, _ = _timed(lambda: [storage.get_research_report("bench", rid) for rid in sample])
+            recent, _ = _timed(lambda: storage.get_recent_research("bench", limit=5), repeat=20)
+            full, _ = _timed(lambda: storage.get_research_history("bench"))
+            reports_mb = os.path.getsize(stock_dir / storage.RESEARCH_REPORTS) / 1e6
+            log_mb = os.path.getsize(stock_dir / storage.RESEARCH_LOG) / 1e6
+            print(f"{codec:<8} {reports_mb:>10.1f} {log_mb:>7.1f} {convert:>9.2f} "
+                  f"{report / len(sample) * 1e3:>9.3f} {recent * 1e3:>9.2f} {full:>7.2f}")
+
+            if codec == "zlib":
+                archived, _ = _timed(lambda: storage.archive_research_reports("bench", older_than_days=365))
+                archive_mb = _dir_size(stock_dir / storage.RESEARCH_ARCHIVE_DIR, "*.gz") / 1e6
+                reports_after = os.path.getsize(stock_dir / storage.RESEARCH_REPORTS) / 1e6
+                old_id = ids[-1]
+                old_read, _ = _timed(lambda: storage.get_research_report("bench", old_id), repeat=5)
+                new_read, _ = _timed(lambda: storage.get_research_report("bench", ids[0]), repeat=5)
+                print(f"  archive >365d: {archived:.2f} s, archive {archive_mb:.1f} MB + reports {reports_after:.1f} MB; "
+                      f"archived report read {old_read * 1e3:.0f} ms, live report read {new_read * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark stock directory lookups on a synthetic 1,000-stock tree.
+
+Compares the legacy lookup (mkdir of the stock dir and uploads/ on every
+call) with the current read-path resolution that never touches the
+filesystem. Counts mkdir syscalls (via os.mkdir) and wall time for a
+read-heavy workload: playbook + recent research for every stock.
+
+Usage:
+    python scripts/bench_stock_dir_lookup.py [--stocks 1000] [--rounds 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import sys
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.storage import Storage
+
+
+class LegacyLookupStorage(Storage):
+    """旧行为：每次解析股票目录都 mkdir 股票目录与 uploads/"""
+
+    def _get_stock_dir(self, stock_id: str) -> Path:
+        stock_dir = self.base_dir / "stocks" / self._stock_key(stock_id)
+        stock_dir.mkdir(parents=True, exist_ok=True)
+        (stock_dir / "uploads").mkdir(exist_ok=True)
+        return stock_dir
+
+
+def _populate(base_dir: str, count: int) -> list:
+    storage = Storage(base_dir=base_dir)
+    stock_ids = [f"stock_{i:04d}" for i in range(count)]
+    for stock_id in stock_ids:
+        storage.save_stock_playbook(stock_id, {"stock_name": stock_id, "core_thesis": {"summary": "s"}})
+    return stock_ids
+
+
+def _run(storage: Storage, stock_ids: list, rounds: int):
+    calls = {"mkdir": 0}
+    real_mkdir = os.mkdir
+
+    def counting_mkdir(*args, **kwargs):
+        calls["mkdir"] += 1
+        return real_mkdir(*args, **kwargs)
+
+    os.mkdir = counting_mkdir
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for stock_id in stock_ids:
+                storage.get_stock_playbook(stock_id)
+                storage.get_recent_research(stock_id)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.mkdir = real_mkdir
+    return calls["mkdir"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = os.path.join(tmp, "inv")
+        stock_ids = _populate(base_dir, args.stocks)
+        lookups = args.stocks * args.rounds
+
+        print(f"stocks={args.stocks} rounds={args.rounds} lookups={lookups}")
+        print(f"{'variant':<10} {'mkdir calls':>12} {'seconds':>9} {'us/lookup':>10}")
+        for name, cls in (("legacy", LegacyLookupStorage), ("current", Storage)):
+            mkdirs, elapsed = _run(cls(base_dir=base_dir), stock_ids, args.rounds)
+            print(f"{name:<10} {mkdirs:>12} {elapsed:>9.3f} {elapsed / lookups * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
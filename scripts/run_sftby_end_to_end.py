@@ -9,12 +9,20 @@ Pipeline:
 - Save full report to outputs/ and print the output path
 
 This script is designed to run in CI/cron-like environments.
+
+Offline / reproducible runs (see core/cassette.py):
+    IA_CASSETTE_MODE=record IA_CASSETTE_PATH=cassettes/sftby.jsonl python scripts/run_sftby_end_to_end.py
+    IA_CASSETTE_MODE=replay IA_CASSETTE_PATH=cassettes/sftby.jsonl python scripts/run_sftby_end_to_end.py
+Replay needs no network (LLM / search keys may be dummies); IA_CASSETTE_LATENCY=1
+replays the recorded latencies. Stage timings and per-provider search yield are
+printed to stderr.
 """
 
 from __future__ import annotations
 
 import json
 import os
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -23,10 +31,35 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from core.cassette import get_cassette
 from core.llm_factory import create_llm_client
-from core.storage import Storage
+from core.storage import create_storage
 from core.environment import EnvironmentCollector
 from core.research import ResearchEngine
+from core.retrieval import provider_yield_summary
+
+
+class StageTimer:
+    """Wall-clock time per pipeline stage, reported on stderr."""
+
+    def __init__(self):
+        self.stages = []
+        self._start = time.monotonic()
+
+    def mark(self, stage: str) -> None:
+        now = time.monotonic()
+        self.stages.append((stage, now - self._start))
+        self._start = now
+
+    def report(self) -> None:
+        for stage, seconds in self.stages:
+            print(f"[timing] {stage:<16} {seconds:8.2f}s", file=sys.stderr)
+        print(f"[timing] {'total':<16} {sum(s for _, s in self.stages):8.2f}s", file=sys.stderr)
+        for provider, row in provider_yield_summary().items():
+            print(f"[search] {provider:<10} {json.dumps(row, ensure_ascii=False)}", file=sys.stderr)
+        cassette = get_cassette()
+        if cassette is not None:
+            print(f"[cassette] {cassette.mode} {cassette.path}: {dict(cassette.stats)}", file=sys.stderr)
 
 
 def main():
@@ -34,7 +67,8 @@ def main():
     stock_name = os.getenv("IA_STOCK_NAME", "软银")
     time_range_days = int(os.getenv("IA_DAYS", "7"))
 
-    storage = Storage()
+    timer = StageTimer()
+    storage = create_storage()
     try:
         client = create_llm_client(storage, model=os.getenv("IA_MODEL"))
     except Exception as e:
@@ -48,12 +82,14 @@ def main():
         raise SystemExit(f"Playbook not found for stock_id={stock_id}")
 
     auto_collected = env.collect_news(stock_id, stock_name, time_range_days)
+    timer.mark("collect_news")
     assessment = env.assess_impact(
         stock_id,
         f"{time_range_days}d",
         auto_collected,
         user_uploaded=[],
     )
+    timer.mark("assess_impact")
 
     needs = assessment.get("judgment", {}).get("needs_deep_research", True)
     plan = assessment.get("research_plan") or {}
@@ -64,6 +100,7 @@ def main():
         out = out_dir / f"SFTBY_environment_only_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         out.write_text(json.dumps({"assessment": assessment, "auto_collected": auto_collected}, ensure_ascii=False, indent=2), "utf-8")
         print(str(out))
+        timer.report()
         return
 
     result = research.execute_research(
@@ -75,6 +112,7 @@ def main():
             "user_uploaded": [],
         },
     )
+    timer.mark("execute_research")
 
     out_dir = Path(__file__).resolve().parents[1] / "outputs"
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -94,6 +132,7 @@ def main():
 
     out_path.write_text("\n".join(payload), "utf-8")
     print(str(out_path))
+    timer.report()
 
 
 if __name__ == "__main__":
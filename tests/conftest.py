@@ -93,3 +93,26 @@ def sample_portfolio_playbook() -> Dict:
         },
         "watchlist": ["Interest rate decisions", "Big-tech earnings"],
     }
+
+
+# ---------------------------------------------------------------------------
+# Process-wide search cache
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(autouse=True)
+def _reset_search_process_state():
+    """Search cache tier, provider registry, health, rate limits, metrics and cassettes are process-wide; isolate each test."""
+    from core.cassette import set_cassette
+    from core.retrieval import PROVIDER_HEALTH, PROVIDER_LIMITS, PROVIDER_REGISTRY, SEARCH_METRICS, reset_memory_cache
+    reset_memory_cache()
+    SEARCH_METRICS.reset()
+    PROVIDER_REGISTRY.clear()
+    PROVIDER_HEALTH.reset()
+    PROVIDER_LIMITS.reset()
+    yield
+    set_cassette(None)
+    SEARCH_METRICS.reset()
+    reset_memory_cache()
+    PROVIDER_REGISTRY.clear()
+    PROVIDER_HEALTH.reset()
+    PROVIDER_LIMITS.reset()
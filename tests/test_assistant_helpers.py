@@ -10,7 +10,7 @@ import pytest
 
 def _make_assistant():
     """Create an InvestmentAssistant with fully mocked dependencies."""
-    with patch("assistant.Storage") as MockStorage, \
+    with patch("assistant.create_storage") as MockStorage, \
          patch("assistant.create_llm_client") as MockClient, \
          patch("assistant.InterviewManager"), \
          patch("assistant.EnvironmentCollector"), \
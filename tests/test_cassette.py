@@ -0,0 +1,215 @@
+"""Tests for core.cassette (record / replay of external calls)."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from core.cassette import (
+    Cassette,
+    CassetteMiss,
+    ReplayedError,
+    ReplayedTimeout,
+    get_cassette,
+    record_or_replay,
+    use_cassette,
+)
+from core.metrics import MetricsRegistry
+from core.retrieval import (
+    PROVIDER_REGISTRY,
+    Deadline,
+    HealthTracker,
+    ReplayProvider,
+    SearchManager,
+    SearchProvider,
+    SearchResult,
+    SQLiteSearchCache,
+    create_search_cache,
+)
+
+
+class _CountingProvider(SearchProvider):
+    def __init__(self, name, results):
+        self.name = name
+        self.results = results
+        self.calls = 0
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic"):
+        self.calls += 1
+        return self.results
+
+
+class TestCassette:
+    def test_passthrough_without_cassette(self):
+        assert get_cassette() is None
+        assert record_or_replay("chat", "x", {"q": 1}, lambda: "live") == "live"
+
+    def test_record_then_replay_in_order(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        with use_cassette(path, "record") as rec:
+            for answer in ("first", "second"):
+                assert record_or_replay("chat", "m", {"prompt": "same"}, lambda a=answer: a) == answer
+        assert rec.stats["recorded"] == 2
+        lines = [json.loads(x) for x in path.read_text("utf-8").splitlines()]
+        assert [x["response"] for x in lines] == ["first", "second"]
+        assert all(x["latency"] >= 0 for x in lines)
+
+        def offline():
+            raise AssertionError("replay must not call through")
+
+        with use_cassette(path, "replay") as rep:
+            assert record_or_replay("chat", "m", {"prompt": "same"}, offline) == "first"
+            assert record_or_replay("chat", "m", {"prompt": "same"}, offline) == "second"
+            with pytest.raises(CassetteMiss):
+                record_or_replay("chat", "m", {"prompt": "same"}, offline)
+        assert rep.stats["replayed"] == 2 and rep.stats["missed"] == 1
+
+    def test_changed_request_falls_back_to_route_order_unless_strict(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        with use_cassette(path, "record"):
+            record_or_replay("chat", "m", {"prompt": "今天是 2026-01-01"}, lambda: "answer")
+        with use_cassette(path, "replay") as rep:
+            assert record_or_replay("chat", "m", {"prompt": "今天是 2026-01-02"}, lambda: None) == "answer"
+        assert rep.stats["fallback"] == 1
+        with use_cassette(path, "replay", strict=True):
+            with pytest.raises(CassetteMiss):
+                record_or_replay("chat", "m", {"prompt": "今天是 2026-01-02"}, lambda: None)
+            with pytest.raises(CassetteMiss):
+                record_or_replay("chat", "other-model", {"prompt": "今天是 2026-01-01"}, lambda: None)
+
+    def test_recorded_errors_are_replayed(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+
+        def boom():
+            raise TimeoutError("read timed out")
+
+        def bad():
+            raise ValueError("bad key")
+
+        with use_cassette(path, "record"):
+            with pytest.raises(TimeoutError):
+                record_or_replay("search", "tavily", {"query": "q"}, boom)
+            with pytest.raises(ValueError):
+                record_or_replay("search", "tavily", {"query": "q2"}, bad)
+        with use_cassette(path, "replay"):
+            with pytest.raises(ReplayedTimeout, match="TimeoutError: read timed out") as exc:
+                record_or_replay("search", "tavily", {"query": "q"}, boom)
+            assert isinstance(exc.value, TimeoutError)  # classified like the live timeout
+            with pytest.raises(ReplayedError, match="ValueError: bad key") as exc:
+                record_or_replay("search", "tavily", {"query": "q2"}, bad)
+            assert not isinstance(exc.value, TimeoutError)
+
+    def test_replay_sleeps_scaled_latency(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        path.write_text(json.dumps({"kind": "chat", "route": "m", "key": "k", "request": {}, "response": "x",
+                                    "error": None, "latency": 2.0, "seq": 0}) + "\n", "utf-8")
+        with patch("core.cassette.time.sleep") as sleep:
+            with use_cassette(path, "replay", latency_scale=0.5):
+                record_or_replay("chat", "m", {"other": True}, lambda: None)
+        sleep.assert_called_once_with(1.0)
+
+    def test_env_configuration(self, tmp_path):
+        path = tmp_path / "env.jsonl"
+        with patch.dict(os.environ, {"IA_CASSETTE_MODE": "record", "IA_CASSETTE_PATH": str(path)}):
+            cassette = get_cassette()
+            assert isinstance(cassette, Cassette) and cassette.mode == "record"
+            assert get_cassette() is cassette  # one per process, not per call
+        with patch.dict(os.environ, {"IA_CASSETTE_MODE": "", "IA_CASSETTE_PATH": str(path)}):
+            assert get_cassette() is None
+
+
+class TestSearchReplay:
+    def test_search_manager_round_trip_without_providers(self, tmp_path):
+        path = tmp_path / "search.jsonl"
+        hits = [SearchResult("软银出售 T-Mobile 股份", "https://example.com/a?utm_source=x", "snippet", "tavily")]
+        live = _CountingProvider("tavily", hits)
+        with use_cassette(path, "record"):
+            sm = SearchManager(providers=[live])
+            recorded = sm.search("软银 T-Mobile")
+        assert live.calls == 1
+
+        with use_cassette(path, "replay"):
+            providers = PROVIDER_REGISTRY.get_providers(None)
+            assert [type(p) for p in providers] == [ReplayProvider]
+            assert [p.name for p in providers] == ["tavily"]
+            replayed = SearchManager(providers=providers).search("软银 T-Mobile")
+        assert replayed == recorded
+        assert replayed[0].url == "https://example.com/a"
+
+    def test_replay_keeps_configured_provider_order(self, tmp_path):
+        path = tmp_path / "order.jsonl"
+        fast = _CountingProvider("openclaw", [SearchResult("b", "https://example.com/b", "", "openclaw")])
+
+        class _Slow(_CountingProvider):
+            def search(self, query, **kwargs):
+                time.sleep(0.05)
+                return super().search(query, **kwargs)
+
+        slow = _Slow("tavily", [SearchResult("a", "https://example.com/a", "", "tavily")])
+        with use_cassette(path, "record") as rec:
+            SearchManager(providers=[slow, fast]).search("软银")
+            SearchManager(providers=[slow, fast]).search("ARM")
+        completed = [r["route"] for r in map(json.loads, path.read_text("utf-8").splitlines()) if "route" in r]
+        assert completed[0] == "openclaw"  # completion order differs from priority
+        assert rec.routes("search") == ["tavily", "openclaw"]
+
+        with use_cassette(path, "replay"):
+            assert [p.name for p in PROVIDER_REGISTRY.get_providers(None)] == ["tavily", "openclaw"]
+
+    def test_replayed_provider_timeout_counts_as_timeout(self, tmp_path):
+        path = tmp_path / "timeout.jsonl"
+
+        class _TimingOut(_CountingProvider):
+            supports_timeout = True
+
+            def search(self, query, *, timeout=None, **kwargs):
+                time.sleep(timeout)
+                raise TimeoutError("read timed out")
+
+        fast = _CountingProvider("openclaw", [SearchResult("b", "https://example.com/b", "", "openclaw")])
+        with use_cassette(path, "record") as rec:
+            SearchManager(providers=[_TimingOut("tavily", []), fast], health=HealthTracker()).search_detailed(
+                "软银", deadline=Deadline(0.2)
+            )
+            for _ in range(100):  # the abandoned call is recorded once it times out
+                if rec.stats["recorded"] == 2:
+                    break
+                time.sleep(0.01)
+        errors = [r["error"] for r in map(json.loads, path.read_text("utf-8").splitlines()) if r.get("error")]
+        assert [e["type"] for e in errors] == ["DeadlineExceeded"]
+
+        metrics = MetricsRegistry()
+        with use_cassette(path, "replay"):
+            sm = SearchManager(providers=PROVIDER_REGISTRY.get_providers(None), health=HealthTracker(), metrics=metrics)
+            outcome = sm.search_detailed("软银", deadline=Deadline(5))
+        assert outcome.timed_out == ["tavily"] and not outcome.failed
+        assert metrics.counter("search_provider_calls", provider="tavily", outcome="timeout") == 1
+        assert metrics.counter("search_provider_calls", provider="tavily", outcome="error") == 0
+
+    def test_cassette_runs_use_an_isolated_cache(self, tmp_path):
+        with use_cassette(tmp_path / "a.jsonl", "record"):
+            first = create_search_cache()
+            assert isinstance(first, SQLiteSearchCache)
+            assert create_search_cache().location() == first.location()
+        with use_cassette(tmp_path / "a.jsonl", "replay"):
+            assert create_search_cache().location() != first.location()
+
+
+class TestClientReplay:
+    def test_openai_chat_and_rss_replay_offline(self, tmp_path, mock_openai_client):
+        path = tmp_path / "llm.jsonl"
+        items = [{"title": "软银财报", "link": "https://example.com/1", "pubDate": "2026-01-01", "source": "x"}]
+        with use_cassette(path, "record"):
+            assert mock_openai_client.chat("hi") == "mock response"
+            with patch.object(type(mock_openai_client), "_fetch_google_news_rss_live", return_value=(items, None)):
+                assert mock_openai_client._fetch_google_news_rss("软银", 7) == (items, None)
+
+        mock_openai_client.client.chat.completions.create.side_effect = AssertionError("network")
+        with use_cassette(path, "replay"):
+            assert mock_openai_client.chat("hi") == "mock response"
+            with patch.object(type(mock_openai_client), "_fetch_google_news_rss_live", side_effect=AssertionError):
+                assert mock_openai_client._fetch_google_news_rss("软银", 7) == (items, None)
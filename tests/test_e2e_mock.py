@@ -120,6 +120,7 @@ class TestE2EMock:
                 mock_sm = MagicMock()
                 mock_sm.providers = []
                 mock_sm.search.return_value = []
+                mock_sm.search_many.return_value = {}
                 MockSM.return_value = mock_sm
 
                 result = engine.execute_research(
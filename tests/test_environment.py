@@ -48,3 +48,18 @@ class TestCollectNewsReturnType:
         result = ec.collect_news("x", "X", 7)
         assert isinstance(result, dict)
         assert result["news"] == []
+
+    def test_passes_a_deadline_to_search(self, mock_openai_client, tmp_storage):
+        from core.environment import EnvironmentCollector
+        from core.retrieval import Deadline
+        ec = EnvironmentCollector(mock_openai_client, tmp_storage)
+        mock_openai_client.search_news_structured = MagicMock(return_value=[])
+
+        ec.collect_news("x", "X", 7)
+        default = mock_openai_client.search_news_structured.call_args.kwargs["deadline"]
+        assert isinstance(default, Deadline)
+        assert default.seconds == EnvironmentCollector.NEWS_DEADLINE_SECONDS
+
+        mine = Deadline(5)
+        ec.collect_news("x", "X", 7, deadline=mine)
+        assert mock_openai_client.search_news_structured.call_args.kwargs["deadline"] is mine
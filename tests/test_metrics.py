@@ -0,0 +1,105 @@
+"""Tests for core.metrics and the retrieval metrics recorded by SearchManager."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from core.metrics import Histogram, MetricsRegistry
+from core.retrieval import (
+    SEARCH_METRICS,
+    SearchManager,
+    SearchProvider,
+    SearchResult,
+    SQLiteSearchCache,
+    provider_yield_summary,
+    reset_memory_cache,
+)
+
+
+class _Provider(SearchProvider):
+    def __init__(self, name, urls, error=None):
+        self.name = name
+        self.urls = urls
+        self.error = error
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic"):
+        if self.error:
+            raise self.error
+        return [SearchResult(u, u, "", self.name) for u in self.urls]
+
+
+class TestMetricsRegistry:
+    def test_counters_aggregate_over_label_subsets(self):
+        m = MetricsRegistry()
+        m.inc("calls", provider="a", caller="x")
+        m.inc("calls", 2, provider="a", caller="y")
+        m.inc("calls", provider="b", caller="x")
+        assert m.counter("calls") == 4
+        assert m.counter("calls", provider="a") == 3
+        assert m.counter("calls", provider="a", caller="y") == 2
+        assert m.counter("calls", provider="c") == 0
+        assert m.label_values("provider") == ["a", "b"]
+
+    def test_histogram_quantiles_and_merge(self):
+        h = Histogram(buckets=(1, 2, 5))
+        for v in (0.5, 0.7, 1.5, 4.0, 9.0):
+            h.observe(v)
+        assert h.count == 5 and h.min == 0.5 and h.max == 9.0
+        assert h.quantile(0.5) == 2
+        assert h.quantile(1.0) == 9.0  # overflow bucket reports the observed max
+        other = Histogram(buckets=(1, 2, 5))
+        other.observe(0.1)
+        h.merge(other)
+        assert h.count == 6 and h.min == 0.1
+        with pytest.raises(ValueError):
+            h.merge(Histogram(buckets=(1,)))
+
+    def test_snapshot_is_json(self, tmp_path):
+        m = MetricsRegistry()
+        m.inc("calls", provider="tavily")
+        m.observe("latency", 0.2, provider="tavily")
+        snap = json.loads(m.to_json())
+        assert snap["counters"] == [{"name": "calls", "labels": {"provider": "tavily"}, "value": 1}]
+        assert snap["histograms"][0]["count"] == 1 and snap["histograms"][0]["p50"] == 0.2
+        m.dump(str(tmp_path / "m.json"))
+        assert json.loads((tmp_path / "m.json").read_text("utf-8")) == snap
+        m.reset()
+        assert m.snapshot() == {"counters": [], "histograms": []}
+
+
+class TestRetrievalMetrics:
+    def _manager(self, tmp_path, providers, caller):
+        return SearchManager(providers=providers, cache=SQLiteSearchCache(tmp_path / "c.sqlite3"), caller=caller)
+
+    def test_provider_calls_latency_and_merge_yield(self, tmp_path):
+        first = _Provider("tavily", ["https://a.com/1", "https://a.com/2"])
+        second = _Provider("openclaw", ["https://a.com/2?utm_source=x", "https://b.com/3"])
+        sm = self._manager(tmp_path, [first, second], "collect_news")
+        sm.search("软银", max_results=5)
+
+        assert SEARCH_METRICS.counter("search_provider_calls", caller="collect_news", outcome="ok") == 2
+        assert SEARCH_METRICS.histogram("search_provider_latency_seconds", provider="tavily").count == 1
+        assert SEARCH_METRICS.histogram("search_provider_results", provider="openclaw").sum == 2
+        summary = provider_yield_summary(caller="collect_news")
+        assert summary["tavily"]["contributed"] == 2 and summary["tavily"]["exclusive"] == 1
+        assert summary["openclaw"]["contributed"] == 1 and summary["openclaw"]["exclusive"] == 1
+        assert provider_yield_summary(caller="execute_searches")["tavily"]["calls"] == 0
+
+    def test_cache_tiers_and_errors_by_caller(self, tmp_path):
+        ok, bad = _Provider("tavily", ["https://a.com/1"]), _Provider("openclaw", [], error=RuntimeError("down"))
+        sm = self._manager(tmp_path, [ok, bad], "execute_searches")
+        sm.search("q")
+        sm.search("q")  # partial outcome was not union-cached: provider caches are consulted again
+
+        assert SEARCH_METRICS.counter("search_provider_calls", provider="openclaw", outcome="error") == 2
+        assert SEARCH_METRICS.counter("search_provider_calls", provider="tavily") == 1
+        assert SEARCH_METRICS.counter("search_cache_lookups", scope="provider", tier="memory", outcome="hit") == 1
+        assert SEARCH_METRICS.counter("search_cache_lookups", scope="union", outcome="hit") == 0
+
+        fresh = self._manager(tmp_path, [ok], "execute_searches")
+        reset_memory_cache()
+        fresh.search("q")  # provider entry found on disk
+        assert SEARCH_METRICS.counter("search_cache_lookups", scope="provider", tier="disk", outcome="hit") == 1
+        assert SEARCH_METRICS.counter("search_cache_lookups", caller="collect_news") == 0
@@ -0,0 +1,95 @@
+"""Tests for core.neardup (near-duplicate headline clustering)."""
+
+from __future__ import annotations
+
+import pytest
+
+from core.neardup import (
+    MinHasher,
+    NearDuplicateIndex,
+    cluster_near_duplicates,
+    jaccard,
+    text_shingles,
+)
+
+
+SYNDICATED = [
+    ("英伟达发布第四季度财报：营收同比增长265% - 新浪财经", "英伟达第四季度财报发布，营收同比增长265% - 东方财富网"),
+    ("Nvidia quarterly revenue jumps 265% on AI chip demand - Reuters", "Nvidia's quarterly revenue jumps 265% on AI demand | CNBC"),
+    ("台积电宣布在美国追加投资1000亿美元建设先进制程工厂", "台积电宣布在美追加投资1000亿美元，建设先进制程工厂_财联社"),
+]
+
+DISTINCT = [
+    ("英伟达发布第四季度财报：营收同比增长265%", "台积电宣布扩大先进封装产能"),
+    ("Nvidia quarterly revenue jumps 265% on AI chip demand", "Nvidia shares fall after earnings as investors weigh guidance"),
+    ("英伟达股价大涨", "英伟达股价大跌"),  # short: one character apart is not a duplicate
+]
+
+
+class TestShingles:
+    def test_cjk_uses_character_bigrams(self):
+        assert text_shingles("英伟达财报") == {"英伟", "伟达", "达财", "财报"}
+
+    def test_publisher_suffix_and_punctuation_ignored(self):
+        assert text_shingles("英伟达财报超预期！ - 新浪财经") == text_shingles("英伟达财报超预期")
+        assert text_shingles("Nvidia beats estimates | Reuters") == text_shingles("NVIDIA beats estimates.")
+
+    def test_empty(self):
+        assert text_shingles("") == frozenset()
+        assert jaccard(frozenset(), frozenset()) == 0.0
+
+    def test_minhash_estimates_jaccard(self):
+        hasher = MinHasher(num_perm=256)
+        a, b = text_shingles(SYNDICATED[0][0]), text_shingles(SYNDICATED[0][1])
+        sa, sb = hasher.signature(a), hasher.signature(b)
+        estimate = sum(x == y for x, y in zip(sa, sb)) / len(sa)
+        assert abs(estimate - jaccard(a, b)) < 0.15
+
+
+class TestNearDuplicateIndex:
+    @pytest.mark.parametrize("a,b", SYNDICATED)
+    def test_syndicated_copies_cluster(self, a, b):
+        index = NearDuplicateIndex()
+        assert index.add(a) == index.add(b)
+        assert index.sizes == [2]
+
+    @pytest.mark.parametrize("a,b", DISTINCT)
+    def test_distinct_headlines_stay_apart(self, a, b):
+        index = NearDuplicateIndex()
+        assert index.add(a) != index.add(b)
+
+    def test_match_does_not_add(self):
+        index = NearDuplicateIndex()
+        a, b = SYNDICATED[0]
+        assert index.match(a) is None
+        cluster = index.add(a)
+        assert index.match(b) == cluster
+        assert len(index) == 1 and index.sizes == [1]
+
+    def test_bands_must_divide_permutations(self):
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(num_perm=64, bands=10)
+
+
+class TestClusterNearDuplicates:
+    def test_keeps_first_representative_with_cluster_size(self):
+        items = [
+            {"title": SYNDICATED[0][0], "link": "https://a.com/1"},
+            {"title": DISTINCT[0][1], "link": "https://b.com/1"},
+            {"title": SYNDICATED[0][1], "link": "https://c.com/1"},
+        ]
+        reps, dropped = cluster_near_duplicates(items)
+        assert dropped == 1
+        assert [r["link"] for r in reps] == ["https://a.com/1", "https://b.com/1"]
+        assert [r["cluster_size"] for r in reps] == [2, 1]
+        assert "cluster_size" not in items[0]  # input is not mutated
+
+    def test_shared_index_drops_repeats_from_earlier_batches(self):
+        index = NearDuplicateIndex()
+        first, _ = cluster_near_duplicates([{"title": SYNDICATED[1][0]}], index=index)
+        second, dropped = cluster_near_duplicates(
+            [{"title": SYNDICATED[1][1]}, {"title": DISTINCT[1][1]}], index=index
+        )
+        assert len(first) == 1
+        assert dropped == 1
+        assert [r["title"] for r in second] == [DISTINCT[1][1]]
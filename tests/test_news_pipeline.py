@@ -0,0 +1,51 @@
+"""Tests for core.news_pipeline (cross-dimension news selection)."""
+
+from __future__ import annotations
+
+from core.news_pipeline import STRUCTURE_LIMIT, NewsRun
+
+HEADLINES = [
+    "软银集团公布第三季度财报，愿景基金扭亏为盈",
+    "孙正义称将加大人工智能领域投资力度",
+    "ARM 股价创上市以来新高，市值突破千亿美元",
+    "软银出售部分 T-Mobile 股份套现四十亿美元",
+    "愿景基金二期减记多家初创公司估值",
+    "软银与 OpenAI 成立日本合资公司推广企业服务",
+    "穆迪上调软银集团信用评级展望至正面",
+    "软银宣布回购计划，规模达五千亿日元",
+    "软银旗下 PayPay 筹备在美国上市",
+]
+
+
+def _item(title, url):
+    return {"title": title, "link": url, "snippet": ""}
+
+
+def _batch(prefix="a"):
+    return [_item(t, f"https://{prefix}.example.com/{i}") for i, t in enumerate(HEADLINES)]
+
+
+class TestTakeUnseen:
+    def test_truncates_to_structure_limit(self):
+        run = NewsRun()
+        assert len(run.take_unseen(_batch())) == STRUCTURE_LIMIT
+
+    def test_near_duplicate_of_cut_item_can_be_structured_later(self):
+        run = NewsRun()
+        first = run.take_unseen(_batch())
+        assert HEADLINES[-1] not in [x["title"] for x in first]
+
+        later = run.take_unseen([
+            _item(HEADLINES[-1] + " - 新浪财经", "https://b.example.com/cut"),
+            _item(HEADLINES[0] + " - 新浪财经", "https://b.example.com/kept"),
+        ])
+        assert [x["link"] for x in later] == ["https://b.example.com/cut"]
+        assert run.near_duplicates_skipped == 1
+
+    def test_only_structured_urls_are_marked_seen(self):
+        run = NewsRun()
+        run.take_unseen(_batch())
+        cut_url = f"https://a.example.com/{len(HEADLINES) - 1}"
+        later = run.take_unseen([_item(HEADLINES[-1], cut_url + "?utm_source=rss"), _item(HEADLINES[0], "https://a.example.com/0")])
+        assert [x["link"] for x in later] == [cut_url + "?utm_source=rss"]
+        assert run.duplicate_urls_skipped == 1
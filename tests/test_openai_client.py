@@ -119,3 +119,65 @@ class TestRSSFetch:
             assert err is None
             assert len(items) == 1
             assert items[0]["title"] == "Test News Title"
+
+
+# ---------------------------------------------------------------------------
+# Near-duplicate clustering before structuring
+# ---------------------------------------------------------------------------
+
+class TestNearDuplicateNews:
+    def test_syndicated_rss_items_collapse_before_structuring(self, mock_openai_client):
+        items = [
+            {"title": "英伟达发布第四季度财报：营收同比增长265% - 新浪财经", "link": "https://finance.sina.com.cn/a1", "pubDate": "2026-02-26", "source": "新浪财经"},
+            {"title": "英伟达第四季度财报发布，营收同比增长265% - 东方财富网", "link": "https://eastmoney.com/b1", "pubDate": "2026-02-26", "source": "东方财富网"},
+            {"title": "台积电宣布扩大先进封装产能", "link": "https://example.com/c1", "pubDate": "2026-02-25", "source": "财联社"},
+        ]
+        prompts = []
+
+        def _fail_flash(prompt):
+            prompts.append(prompt)
+            raise RuntimeError("flash down")
+
+        with patch("core.retrieval.get_search_providers", return_value=[]), \
+             patch.object(mock_openai_client, "_fetch_google_news_rss", return_value=(items, None)), \
+             patch.object(mock_openai_client, "chat_flash", side_effect=_fail_flash):
+            out = mock_openai_client.search_news_structured("英伟达", [], time_range_days=7)
+
+        meta, news = out[0], out[1:]
+        # each of the 4 dimensions fetches the same items: first keeps 2 clusters; later ones repeat the
+        # 2 structured URLs, and the folded-in copy (never structured itself) matches the near-dup index
+        assert meta["near_duplicates_skipped"] == 4
+        assert meta["duplicate_urls_skipped"] == 6
+        assert len(prompts) == 1
+        sizes = {n["url"]: n["cluster_size"] for n in news}
+        assert sizes == {"https://finance.sina.com.cn/a1": 2, "https://example.com/c1": 1}
+
+
+# ---------------------------------------------------------------------------
+# Deadline
+# ---------------------------------------------------------------------------
+
+class TestNewsDeadline:
+    def test_expired_deadline_skips_rss_and_flags_partial(self, mock_openai_client):
+        from core.retrieval import Deadline
+
+        with patch("core.retrieval.get_search_providers", return_value=[]), \
+             patch.object(mock_openai_client, "_fetch_google_news_rss") as fetch:
+            out = mock_openai_client.search_news_structured("英伟达", [], deadline=Deadline(0))
+
+        meta = out[0]
+        fetch.assert_not_called()
+        assert meta["deadline_exceeded"] is True
+        assert len(meta["deadline_skipped_dimensions"]) == 4
+        assert any("预算" in w for w in meta["search_warnings"])
+
+    def test_rss_timeout_uses_remaining_budget(self, mock_openai_client):
+        from core.retrieval import Deadline
+
+        with patch("core.retrieval.get_search_providers", return_value=[]), \
+             patch.object(mock_openai_client, "_fetch_google_news_rss", return_value=([], None)) as fetch:
+            mock_openai_client.search_news_structured("英伟达", [], deadline=Deadline(3))
+
+        timeouts = [c.kwargs["timeout"] for c in fetch.call_args_list]
+        assert len(timeouts) == 4
+        assert all(0 < t <= 3 for t in timeouts)
@@ -0,0 +1,64 @@
+"""Tests for core.rerank (playbook BM25 re-ranking)."""
+
+from __future__ import annotations
+
+from core.rerank import PlaybookRanker, playbook_terms, tokenize
+from core.retrieval import SearchResult, format_search_results_for_prompt
+
+
+PLAYBOOK = {
+    "stock_name": "SoftBank Group",
+    "core_thesis": {"summary": "NAV 折价", "key_points": ["ARM 潜在 IPO 带来流动性溢价"]},
+    "validation_signals": ["ARM IPO 启动", "愿景基金季度 DPI > 1.2"],
+    "invalidation_triggers": ["ARM 股价下跌超 50%"],
+    "related_entities": ["ARM", "Vision Fund", "Alibaba"],
+}
+
+
+def _hit(title, snippet=""):
+    return SearchResult(title, f"https://example.com/{abs(hash(title))}", snippet, "stub")
+
+
+class TestTokenize:
+    def test_cjk_bigrams_and_latin_words(self):
+        assert tokenize("ARM 启动 IPO") == ["arm", "启动", "ipo"]
+        assert tokenize("愿景基金") == ["愿景", "景基", "基金"]
+        assert tokenize("The Vision Fund") == ["vision", "fund"]
+
+    def test_width_folding(self):
+        assert tokenize("ＡＲＭ") == ["arm"]
+
+
+class TestPlaybookRanker:
+    def test_terms_from_thesis_fields(self):
+        terms = playbook_terms(PLAYBOOK)
+        assert "ARM 潜在 IPO 带来流动性溢价" in terms
+        assert "Vision Fund" in terms
+        assert "NAV 折价" not in terms
+
+    def test_no_ranker_without_thesis(self):
+        assert PlaybookRanker.from_playbook(None) is None
+        assert PlaybookRanker.from_playbook({"stock_name": "X", "core_thesis": {}}) is None
+
+    def test_relevant_hits_move_up_and_ties_keep_order(self):
+        ranker = PlaybookRanker.from_playbook(PLAYBOOK)
+        hits = [
+            _hit("软银集团召开股东大会"),
+            _hit("孙正义出席活动"),
+            _hit("ARM 提交 IPO 申请", "估值或超 600 亿美元"),
+            _hit("SoftBank Vision Fund posts quarterly loss"),
+        ]
+        ranked = ranker.rank_results(hits)
+        assert [h.title for h in ranked] == [
+            "ARM 提交 IPO 申请",
+            "SoftBank Vision Fund posts quarterly loss",
+            "软银集团召开股东大会",
+            "孙正义出席活动",
+        ]
+
+    def test_format_reranks_before_truncation(self):
+        ranker = PlaybookRanker.from_playbook(PLAYBOOK)
+        hits = [_hit(f"软银无关新闻 {i}") for i in range(6)] + [_hit("ARM 股价下跌超 50%")]
+        assert "ARM 股价下跌" not in format_search_results_for_prompt(hits, limit=5)
+        text = format_search_results_for_prompt(hits, limit=5, ranker=ranker)
+        assert text.startswith("[1] (stub) ARM 股价下跌超 50%")
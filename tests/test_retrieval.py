@@ -3,13 +3,34 @@
 from __future__ import annotations
 
 import json
+import threading
 import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from core.retrieval import SearchManager, SearchProvider, SearchResult, format_search_results_for_prompt
+from core.retrieval import (
+    Deadline,
+    DeadlineExceeded,
+    FileSearchCache,
+    SearchManager,
+    SearchProvider,
+    SearchResult,
+    MEMORY_CACHE,
+    CacheEntry,
+    HealthTracker,
+    MemoryCacheTier,
+    OpenClawWebSearchProvider,
+    ProviderRegistry,
+    RateLimiter,
+    RateLimitRegistry,
+    PROVIDER_FLIGHTS,
+    SingleFlight,
+    SQLiteSearchCache,
+    create_search_cache,
+    format_search_results_for_prompt,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -29,6 +50,16 @@ class _StubProvider(SearchProvider):
         return self._results
 
 
+class _SlowProvider(_StubProvider):
+    def __init__(self, results=None, delay=0.3, name="slow"):
+        super().__init__(results, name=name)
+        self.delay = delay
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic"):
+        time.sleep(self.delay)
+        return self._results
+
+
 class _FailingProvider(SearchProvider):
     name = "failing"
 
@@ -97,6 +128,861 @@ class TestSearchManager:
             assert len(results) == 3
 
 
+class TestParallelFanOut:
+    def test_providers_run_concurrently(self, tmp_path):
+        providers = [
+            _SlowProvider([SearchResult(f"T{i}", f"https://p{i}.com", "", f"slow{i}")], delay=0.3, name=f"slow{i}")
+            for i in range(3)
+        ]
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=providers)
+            start = time.time()
+            results = sm.search("q")
+            elapsed = time.time() - start
+        assert len(results) == 3
+        assert elapsed < 0.8  # sequential would take ~0.9s
+
+    def test_merge_order_follows_provider_priority(self, tmp_path):
+        slow = _SlowProvider([SearchResult("A", "https://a.com", "", "slow"),
+                              SearchResult("Dup", "https://b.com", "", "slow")], delay=0.2, name="slow")
+        fast = _StubProvider([SearchResult("B", "https://b.com", "", "fast")], name="fast")
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[slow, fast])
+            outcome = sm.search_detailed("q")
+        # slow provider is listed first, so it wins the duplicate URL despite finishing last
+        assert [r.title for r in outcome.results] == ["A", "Dup"]
+        assert outcome.contributors == ["slow"]
+
+    def test_deadline_ignores_slow_provider(self, tmp_path):
+        slow = _SlowProvider([SearchResult("S", "https://s.com", "", "slow")], delay=1.5, name="slow")
+        fast = _StubProvider([SearchResult("F", "https://f.com", "", "fast")], name="fast")
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[slow, fast], hard_timeout_seconds=0.3)
+            start = time.time()
+            outcome = sm.search_detailed("q")
+            elapsed = time.time() - start
+            assert elapsed < 1.0
+            assert [r.title for r in outcome.results] == ["F"]
+            assert outcome.contributors == ["fast"]
+            assert outcome.timed_out == ["slow"]
+            # partial results are not cached under the union key
+            sm.providers = [_StubProvider([], name="empty")]
+            assert sm.search_detailed("q").from_cache is False
+
+    def test_failed_provider_reported(self, tmp_path):
+        r = SearchResult("D", "https://d.com", "d", "stub")
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[_FailingProvider(), _StubProvider([r])])
+            outcome = sm.search_detailed("q")
+        assert outcome.failed == ["failing"]
+        assert outcome.contributors == ["stub"]
+
+
+class _QueryEchoProvider(SearchProvider):
+    """Returns one result per query and records peak concurrency."""
+
+    def __init__(self, name="echo", delay=0.1):
+        self.name = name
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic"):
+        with self._lock:
+            self.calls.append(query)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return [SearchResult(query, f"https://{self.name}.com/{query}", "", self.name)]
+
+
+class TestSearchMany:
+    def test_results_keyed_by_query_and_deduped(self, tmp_path):
+        provider = _QueryEchoProvider()
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider])
+            outcomes = sm.search_many(["a", "b", "a", ""])
+        assert set(outcomes) == {"a", "b"}
+        assert sorted(provider.calls) == ["a", "b"]
+        assert outcomes["a"].results[0].title == "a"
+        assert outcomes["b"].contributors == ["echo"]
+
+    def test_batch_runs_concurrently_with_per_provider_cap(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0.2)
+        queries = [f"q{i}" for i in range(6)]
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider], per_provider_concurrency=3)
+            start = time.time()
+            outcomes = sm.search_many(queries)
+            elapsed = time.time() - start
+        assert all(len(outcomes[q].results) == 1 for q in queries)
+        assert provider.peak == 3
+        assert elapsed < 0.9  # two waves of 0.2s, sequential would be 1.2s
+
+    def test_cached_queries_skip_providers(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider])
+            sm.search("warm")
+            provider.calls.clear()
+            outcomes = sm.search_many(["warm", "cold"])
+        assert provider.calls == ["cold"]
+        assert outcomes["warm"].from_cache is True
+        assert outcomes["cold"].from_cache is False
+
+    def test_deadline_covers_whole_batch(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0.4)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider], per_provider_concurrency=1, hard_timeout_seconds=0.6)
+            outcomes = sm.search_many(["q1", "q2", "q3"])
+        assert outcomes["q1"].results and not outcomes["q1"].timed_out
+        # q2 is still running and q3 never started when the batch deadline passes
+        assert outcomes["q2"].timed_out == ["echo"]
+        assert outcomes["q3"].timed_out == ["echo"]
+
+
+# ---------------------------------------------------------------------------
+# Cache backends
+# ---------------------------------------------------------------------------
+
+def _results(tag, n=1):
+    return [SearchResult(f"{tag}{i}", f"https://{tag}.com/{i}", "snippet", "stub") for i in range(n)]
+
+
+class TestSearchCacheBackends:
+    @pytest.mark.parametrize("backend", ["file", "sqlite"])
+    def test_manager_round_trip(self, tmp_path, backend):
+        provider = _QueryEchoProvider(delay=0)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider], cache=create_search_cache(backend))
+            sm.search("q")
+            sm.search("q")
+            sm2 = SearchManager(providers=[provider], cache=create_search_cache(backend))
+            assert sm2.search_detailed("q").from_cache is True
+        assert provider.calls == ["q"]
+
+    @pytest.mark.parametrize("backend", ["file", "sqlite"])
+    @pytest.mark.parametrize("tier", ["memory", "disk"])
+    def test_cached_contributors_match_live(self, tmp_path, backend, tier):
+        # results carry a display label that differs from the registered provider name
+        hits = [SearchResult("t", "https://a.com/1", "", "openclaw:web_search")]
+        provider = _StubProvider(hits, name="openclaw_web_search")
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            live = SearchManager(providers=[provider], cache=create_search_cache(backend)).search_detailed("q")
+            if tier == "disk":
+                MEMORY_CACHE.clear()
+            cached = SearchManager(providers=[provider], cache=create_search_cache(backend)).search_detailed("q")
+        assert cached.from_cache is True and live.from_cache is False
+        assert cached.contributors == live.contributors == ["openclaw_web_search"]
+
+    def test_legacy_sqlite_payload_still_decodes(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db")
+        cache.set("k", _results("a"))
+        entry = cache.get("k")
+        assert entry.contributors is None and entry.results[0].title == "a0"
+
+    @pytest.mark.parametrize("backend", ["file", "sqlite"])
+    def test_ttl_applies_to_both_backends(self, tmp_path, backend):
+        provider = _QueryEchoProvider(delay=0)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider], cache=create_search_cache(backend), cache_ttl_seconds=60)
+            sm.search("q")
+            with patch("core.retrieval.time.time", return_value=time.time() + 120):
+                sm.search("q")
+        assert provider.calls == ["q", "q"]
+
+    def test_default_backend_is_sqlite_single_file(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("IA_SEARCH_CACHE_BACKEND", raising=False)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[_QueryEchoProvider(delay=0)])
+            sm.search_many(["a", "b", "c"])
+        assert isinstance(sm.cache, SQLiteSearchCache)
+        assert [p.name for p in tmp_path.iterdir() if p.suffix == ".json"] == []
+        assert (tmp_path / "search_cache.sqlite3").exists()
+
+    def test_env_selects_file_backend(self, monkeypatch):
+        monkeypatch.setenv("IA_SEARCH_CACHE_BACKEND", "file")
+        assert isinstance(create_search_cache(), FileSearchCache)
+        assert isinstance(create_search_cache("sqlite"), SQLiteSearchCache)
+
+    def test_sqlite_get_many(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db")
+        cache.set("k1", _results("a", 2))
+        cache.set("k2", _results("b"))
+        got = cache.get_many(["k1", "k2", "missing", "k1"])
+        assert set(got) == {"k1", "k2"}
+        assert [r.title for r in got["k1"].results] == ["a0", "a1"]
+        assert got["k2"].ts is not None
+
+    def test_sqlite_expires_old_entries(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db", max_age_seconds=60, maintenance_every=1000)
+        with patch("core.retrieval.time.time", return_value=time.time() - 3600):
+            cache.set("old", _results("o"))
+        cache.set("new", _results("n"))
+        assert cache.maintain() == 1
+        assert cache.get("old") is None
+        assert cache.get("new") is not None
+
+    def test_sqlite_lru_entry_cap(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db", max_entries=3, maintenance_every=1)
+        base = time.time()
+        for i, key in enumerate(["k0", "k1", "k2"]):
+            with patch("core.retrieval.time.time", return_value=base + i):
+                cache.set(key, _results(key))
+        with patch("core.retrieval.time.time", return_value=base + 10):
+            cache.get("k0")  # touch: k1 becomes least recently used
+        with patch("core.retrieval.time.time", return_value=base + 20):
+            cache.set("k3", _results("k3"))
+        assert set(cache.get_many(["k0", "k1", "k2", "k3"])) == {"k0", "k2", "k3"}
+
+    def test_sqlite_maintain_reclaims_pages(self, tmp_path):
+        path = tmp_path / "c.db"
+        cache = SQLiteSearchCache(path, max_age_seconds=60, maintenance_every=10_000)
+        with patch("core.retrieval.time.time", return_value=time.time() - 3600):
+            for i in range(300):
+                cache.set(f"old{i}", _results(f"old{i}" * 20, 5))
+        cache.set("new", _results("n"))
+        conn = cache._conn()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+
+        assert cache.maintain() == 300
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        assert conn.execute("PRAGMA page_count").fetchone()[0] < pages_before / 2
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        assert path.stat().st_size < pages_before * 4096 / 2
+
+    def test_sqlite_reads_buffer_access_times(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db", maintenance_every=10_000)
+        base = time.time()
+        with patch("core.retrieval.time.time", return_value=base):
+            cache.set("k", _results("k"))
+        with patch("core.retrieval.time.time", return_value=base + 50):
+            assert cache.get("k") is not None
+        read = lambda: cache._conn().execute("SELECT accessed FROM search_cache WHERE key = 'k'").fetchone()[0]
+        assert read() == base  # the read did not write
+        cache.maintain()
+        assert read() == base + 50
+
+    def test_sqlite_byte_cap(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db", max_bytes=2000, maintenance_every=1)
+        for i in range(20):
+            cache.set(f"k{i}", _results(f"k{i}", 3))
+        stats = cache.stats()
+        assert stats["bytes"] <= 2000
+        assert 0 < stats["entries"] < 20
+        assert cache.get("k19") is not None
+
+    def test_sqlite_cache_shared_across_threads(self, tmp_path):
+        cache = SQLiteSearchCache(tmp_path / "c.db")
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(20):
+                    cache.set(f"t{n}-{i}", _results("x"))
+                    assert cache.get(f"t{n}-{i}") is not None
+            except Exception as e:  # pragma: no cover - surfaced below
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert cache.stats()["entries"] == 80
+
+
+class TestMemoryCacheTier:
+    def test_shared_across_managers_without_disk_reads(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            SearchManager(providers=[provider]).search("q")
+            sm = SearchManager(providers=[provider])
+            with patch.object(sm.cache, "get_many", side_effect=AssertionError("disk read")):
+                outcome = sm.search_detailed("q")
+        assert outcome.from_cache is True
+        assert provider.calls == ["q"]
+        assert MEMORY_CACHE.stats()["hits"] >= 1
+
+    def test_disk_hit_is_promoted(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            SearchManager(providers=[provider]).search("q")
+            MEMORY_CACHE.clear()
+            sm = SearchManager(providers=[provider])
+            sm.search("q")  # disk hit, promoted
+            with patch.object(sm.cache, "get_many", side_effect=AssertionError("disk read")):
+                sm.search("q")
+        assert provider.calls == ["q"]
+
+    def test_memory_entries_respect_ttl(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        with patch("core.retrieval.SEARCH_CACHE_DIR", tmp_path):
+            sm = SearchManager(providers=[provider], cache_ttl_seconds=60)
+            sm.search("q")
+            with patch("core.retrieval.time.time", return_value=time.time() + 120):
+                sm.search("q")
+        assert provider.calls == ["q", "q"]
+
+    def test_keyed_by_cache_location(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        SearchManager(providers=[provider], cache=FileSearchCache(tmp_path / "a")).search("q")
+        SearchManager(providers=[provider], cache=FileSearchCache(tmp_path / "b")).search("q")
+        assert provider.calls == ["q", "q"]
+
+    def test_entry_and_byte_bounds(self):
+        tier = MemoryCacheTier(max_entries=2, max_bytes=10_000)
+        for key in ("a", "b", "c"):
+            tier.put("loc", key, CacheEntry(_results(key), ts=time.time()))
+        assert tier.get("loc", "a") is None
+        assert tier.get("loc", "c") is not None
+
+        small = MemoryCacheTier(max_entries=100, max_bytes=400)
+        for i in range(10):
+            small.put("loc", f"k{i}", CacheEntry(_results(f"k{i}", 2), ts=None))
+        assert small.stats()["bytes"] <= 400
+        assert small.get("loc", "k9") is not None
+        assert small.get("loc", "k0") is None
+
+
+def _wait_for_refreshes(timeout=3.0):
+    import core.retrieval as retrieval
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with retrieval._REFRESH_LOCK:
+            if not retrieval._REFRESHING:
+                return
+        time.sleep(0.01)
+    raise AssertionError("background refresh did not finish")
+
+
+class _VersionedProvider(SearchProvider):
+    """Returns a result tagged with an incrementing version; optional delay."""
+
+    name = "versioned"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic"):
+        time.sleep(self.delay)
+        with self._lock:
+            self.version += 1
+            v = self.version
+        return [SearchResult(f"v{v}", f"https://v.com/{query}/{v}", "", self.name)]
+
+
+class TestStaleWhileRevalidate:
+    def _manager(self, tmp_path, provider, **kw):
+        return SearchManager(
+            providers=[provider],
+            cache=SQLiteSearchCache(tmp_path / "c.db"),
+            cache_ttl_seconds=60,
+            **kw,
+        )
+
+    def test_stale_served_immediately_and_refreshed(self, tmp_path):
+        provider = _VersionedProvider()
+        sm = self._manager(tmp_path, provider, stale_ttl_seconds=3600)
+        sm.search("q")
+        provider.delay = 0.5
+        later = time.time() + 120
+        with patch("core.retrieval.time.time", return_value=later):
+            start = time.perf_counter()
+            outcome = sm.search_detailed("q")
+            assert time.perf_counter() - start < 0.3
+        assert outcome.stale is True
+        assert [r.title for r in outcome.results] == ["v1"]
+        _wait_for_refreshes()
+        fresh = sm.search_detailed("q")
+        assert fresh.stale is False
+        assert [r.title for r in fresh.results] == ["v2"]
+
+    def test_refreshes_are_deduplicated(self, tmp_path):
+        provider = _VersionedProvider()
+        sm = self._manager(tmp_path, provider, stale_ttl_seconds=3600)
+        sm.search("q")
+        provider.delay = 0.3
+        with patch("core.retrieval.time.time", return_value=time.time() + 120):
+            for _ in range(5):
+                assert sm.search_detailed("q").stale is True
+            other = self._manager(tmp_path, provider, stale_ttl_seconds=3600)
+            assert other.search_detailed("q").stale is True
+        _wait_for_refreshes()
+        assert provider.version == 2  # initial call + a single background refresh
+
+    def test_past_hard_ttl_blocks_on_provider(self, tmp_path):
+        provider = _VersionedProvider()
+        sm = self._manager(tmp_path, provider, stale_ttl_seconds=300)
+        sm.search("q")
+        with patch("core.retrieval.time.time", return_value=time.time() + 600):
+            outcome = sm.search_detailed("q")
+        assert outcome.stale is False
+        assert outcome.from_cache is False
+        assert [r.title for r in outcome.results] == ["v2"]
+
+    def test_disabled_by_default(self, tmp_path):
+        provider = _VersionedProvider()
+        sm = self._manager(tmp_path, provider)
+        sm.search("q")
+        with patch("core.retrieval.time.time", return_value=time.time() + 120):
+            outcome = sm.search_detailed("q")
+        assert outcome.stale is False
+        assert [r.title for r in outcome.results] == ["v2"]
+
+
+class TestSingleFlight:
+    def test_concurrent_managers_share_one_provider_call(self, tmp_path):
+        provider = _VersionedProvider(delay=0.3)
+        cache = SQLiteSearchCache(tmp_path / "c.db")
+        outcomes = []
+
+        def worker():
+            sm = SearchManager(providers=[provider], cache=cache)
+            outcomes.append(sm.search_detailed("shared"))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert provider.version == 1
+        assert {o.results[0].title for o in outcomes} == {"v1"}
+        assert PROVIDER_FLIGHTS.in_flight() == 0
+
+    def test_different_cache_locations_do_not_coalesce(self, tmp_path):
+        provider = _VersionedProvider(delay=0.2)
+        threads = [
+            threading.Thread(
+                target=lambda d=d: SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / d)).search("q")
+            )
+            for d in ("a.db", "b.db")
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert provider.version == 2
+
+    def test_waiters_receive_leader_error(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def leader():
+            started.set()
+            time.sleep(0.2)
+            raise RuntimeError("boom")
+
+        def call(fn):
+            try:
+                flight.do("k", fn)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        t1 = threading.Thread(target=call, args=(leader,))
+        t1.start()
+        started.wait()
+        t2 = threading.Thread(target=call, args=(lambda: "not run",))
+        t2.start()
+        t1.join()
+        t2.join()
+        assert errors == ["boom", "boom"]
+        assert flight.coalesced == 1
+        assert flight.in_flight() == 0
+
+    def test_file_cache_writes_are_atomic(self, tmp_path):
+        cache = FileSearchCache(tmp_path)
+        threads = [
+            threading.Thread(target=lambda n=n: [cache.set("k", _results(f"w{n}", 20)) for _ in range(20)])
+            for n in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert [p.name for p in tmp_path.iterdir()] == ["k.json"]
+        assert len(cache.get("k").results) == 20
+
+
+def _write_gateway_config(path, token="tok", port=18789):
+    path.write_text(json.dumps({"gateway": {"port": port, "auth": {"token": token}}}), "utf-8")
+
+
+class TestProviderRegistry:
+    @pytest.fixture(autouse=True)
+    def _no_gateway_env(self, monkeypatch):
+        monkeypatch.delenv("OPENCLAW_GATEWAY_URL", raising=False)
+        monkeypatch.delenv("OPENCLAW_GATEWAY_TOKEN", raising=False)
+
+    def test_openclaw_instance_shared_per_config(self, tmp_path):
+        cfg = tmp_path / "openclaw.json"
+        _write_gateway_config(cfg)
+        registry = ProviderRegistry()
+        first = registry.get_providers(openclaw_config_path=str(cfg))
+        second = registry.get_providers(openclaw_config_path=str(cfg))
+        assert len(first) == 1 and first[0] is second[0]
+
+        _write_gateway_config(cfg, token="rotated-token")
+        third = registry.get_providers(openclaw_config_path=str(cfg))
+        assert third[0] is not first[0]
+        assert third[0]._token == "rotated-token"
+
+    def test_gateway_config_parsed_once(self, tmp_path):
+        cfg = tmp_path / "openclaw.json"
+        _write_gateway_config(cfg, port=19000)
+        with patch("core.retrieval.json.loads", wraps=json.loads) as loads:
+            for _ in range(3):
+                OpenClawWebSearchProvider(config_path=str(cfg))
+        assert loads.call_count == 1
+        assert OpenClawWebSearchProvider(config_path=str(cfg))._gateway_http_base == "http://127.0.0.1:19000"
+
+    def test_missing_gateway_config_yields_no_provider(self, tmp_path):
+        registry = ProviderRegistry()
+        assert registry.get_providers(openclaw_config_path=str(tmp_path / "missing.json")) == []
+
+    def test_session_reused_across_calls(self, tmp_path):
+        cfg = tmp_path / "openclaw.json"
+        _write_gateway_config(cfg)
+        provider = ProviderRegistry().openclaw(str(cfg))
+        response = MagicMock()
+        response.json.return_value = {"ok": True, "result": {"details": {"results": [
+            {"title": "T", "url": "https://t.com", "description": "d"},
+        ]}}}
+        session = MagicMock()
+        session.post.return_value = response
+        with patch("requests.Session", return_value=session) as session_cls:
+            provider.search("a")
+            provider.search("b")
+        assert session_cls.call_count == 1
+        assert session.post.call_count == 2
+
+    def test_tavily_provider_shared_per_key(self):
+        fake_client = MagicMock()
+        with patch("core.tavily_search.TavilySearch", return_value=fake_client) as tavily_cls:
+            registry = ProviderRegistry()
+            a = registry.tavily("key-a")
+            assert registry.tavily("key-a") is a
+            assert registry.tavily("key-b") is not a
+            assert registry.tavily(None) is None
+        assert tavily_cls.call_count == 2
+
+
+class _FlakyProvider(SearchProvider):
+    """Fails while `failing` is True; counts calls."""
+
+    def __init__(self, name="flaky", delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.failing = True
+        self.calls = 0
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic"):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.failing:
+            raise RuntimeError("gateway down")
+        return [SearchResult(query, f"https://{self.name}.com/{query}", "", self.name)]
+
+
+class TestCircuitBreaker:
+    def _manager(self, tmp_path, providers, health, **kw):
+        return SearchManager(providers=providers, cache=SQLiteSearchCache(tmp_path / "c.db"), health=health, **kw)
+
+    def test_opens_after_consecutive_failures_and_skips(self, tmp_path):
+        health = HealthTracker()
+        flaky = _FlakyProvider()
+        good = _QueryEchoProvider(delay=0)
+        sm = self._manager(tmp_path, [flaky, good], health, per_provider_concurrency=1)
+        sm.search_many([f"q{i}" for i in range(3)])
+        assert flaky.calls == 3
+        assert health.snapshot(["flaky"])["flaky"]["state"] == "open"
+
+        outcome = sm.search_detailed("next")
+        assert flaky.calls == 3  # not called while open
+        assert outcome.skipped == ["flaky"]
+        assert outcome.contributors == ["echo"]
+
+    def test_half_open_probe_closes_on_success(self, tmp_path):
+        health = HealthTracker()
+        flaky = _FlakyProvider()
+        sm = self._manager(tmp_path, [flaky], health, per_provider_concurrency=1)
+        sm.search_many(["a", "b", "c"])
+        assert health.snapshot(["flaky"])["flaky"]["state"] == "open"
+
+        flaky.failing = False
+        with patch("core.retrieval.time.monotonic", return_value=time.monotonic() + HealthTracker.COOLDOWN_SECONDS + 1):
+            outcome = sm.search_detailed("d")
+        assert outcome.contributors == ["flaky"]
+        assert health.snapshot(["flaky"])["flaky"]["state"] == "closed"
+
+    def test_failed_probe_reopens(self, tmp_path):
+        health = HealthTracker()
+        flaky = _FlakyProvider()
+        sm = self._manager(tmp_path, [flaky], health, per_provider_concurrency=1)
+        sm.search_many(["a", "b", "c"])
+        later = time.monotonic() + HealthTracker.COOLDOWN_SECONDS + 1
+        with patch("core.retrieval.time.monotonic", return_value=later):
+            assert health.allow("flaky") is True  # probe
+            assert health.allow("flaky") is False  # only one probe at a time
+            health.record("flaky", False, 0.1)
+            assert health.snapshot(["flaky"])["flaky"]["state"] == "open"
+            assert health.allow("flaky") is False
+
+    def test_error_rate_trips_breaker(self):
+        health = HealthTracker()
+        for ok in (True, False, True, False, False):
+            health.record("p", ok, 0.1)
+        # never 3 consecutive failures, but 3/5 errors
+        assert health.snapshot(["p"])["p"]["state"] == "open"
+
+    def test_timeout_counts_as_failure(self, tmp_path):
+        health = HealthTracker()
+        slow = _SlowProvider([SearchResult("S", "https://s.com", "", "slow")], delay=0.5, name="slow")
+        sm = self._manager(tmp_path, [slow], health, hard_timeout_seconds=0.1)
+        sm.search_detailed("q")
+        snap = health.snapshot(["slow"])["slow"]
+        assert snap["consecutive_failures"] >= 1
+
+    def test_abandoned_call_counts_as_one_failure(self, tmp_path):
+        class _HangingProvider(SearchProvider):
+            name = "hanging"
+            supports_timeout = True
+
+            def search(self, query, *, timeout=None, **kw):
+                time.sleep(timeout + 0.05)  # outlives the deadline, then fails like an HTTP timeout
+                raise TimeoutError("read timed out")
+
+        health = HealthTracker()
+        sm = self._manager(tmp_path, [_HangingProvider()], health, hard_timeout_seconds=0.2)
+        assert sm.search_detailed("q").timed_out == ["hanging"]
+        time.sleep(0.3)  # let the abandoned worker finish and fail
+        assert health.snapshot(["hanging"])["hanging"]["consecutive_failures"] == 1
+
+    def test_partial_results_not_cached(self, tmp_path):
+        health = HealthTracker()
+        flaky = _FlakyProvider()
+        good = _QueryEchoProvider(delay=0)
+        sm = self._manager(tmp_path, [flaky, good], health)
+        assert sm.search_detailed("q").failed == ["flaky"]
+        flaky.failing = False
+        outcome = sm.search_detailed("q")
+        assert outcome.from_cache is False
+        assert outcome.contributors == ["flaky", "echo"]
+
+    def test_latency_ordering(self, tmp_path):
+        health = HealthTracker()
+        health.record("slow", True, 2.0)
+        health.record("fast", True, 0.1)
+        slow = _StubProvider([SearchResult("S", "https://same.com", "", "slow")], name="slow")
+        fast = _StubProvider([SearchResult("F", "https://same.com", "", "fast")], name="fast")
+        ordered = self._manager(tmp_path, [slow, fast], health, latency_ordering=True).search_detailed("q")
+        assert [r.title for r in ordered.results] == ["F"]
+        fixed = self._manager(tmp_path / "fixed", [slow, fast], health).search_detailed("q")
+        assert [r.title for r in fixed.results] == ["S"]
+
+
+class TestRateLimits:
+    def test_token_bucket_paces_calls(self):
+        limiter = RateLimiter(rate_per_second=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release()
+        elapsed = time.monotonic() - start
+        assert elapsed >= 0.18  # 4 refills at 50ms each
+        stats = limiter.stats()
+        assert stats["acquired"] == 5
+        assert stats["waited"] >= 3
+        assert stats["max_wait_ms"] > 0
+
+    def test_acquire_fails_fast_when_token_would_miss_the_timeout(self):
+        limiter = RateLimiter(rate_per_second=1, burst=1, max_in_flight=1)
+        limiter.acquire()
+        limiter.release()
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            limiter.acquire(timeout=0.2)  # next token in ~1s
+        assert time.monotonic() - start < 0.1
+        assert limiter.stats()["rejected"] == 1
+        assert limiter.in_flight == 0
+        assert limiter._slots.acquire(blocking=False)  # the slot was handed back
+
+    def test_acquire_times_out_waiting_for_a_slot(self):
+        limiter = RateLimiter(max_in_flight=1)
+        limiter.acquire()
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            limiter.acquire(timeout=0.05)
+        assert 0.04 <= time.monotonic() - start < 0.5
+
+    def test_rate_limited_call_past_deadline_is_skipped_not_delayed(self, tmp_path):
+        provider = _QueryEchoProvider(name="paced", delay=0)
+        limits = RateLimitRegistry({"paced": {"rate_per_second": 0.5, "burst": 1}})
+        sm = SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / "c.db"), limits=limits)
+        sm.search("q1", deadline=Deadline(5))
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            sm._query_provider(provider, "q2", 5, "news", "basic", True, deadline=Deadline(0.5))
+        assert time.monotonic() - start < 0.2
+        assert provider.calls == ["q1"]
+
+    def test_max_in_flight_caps_concurrency_across_managers(self, tmp_path):
+        provider = _QueryEchoProvider(name="capped", delay=0.1)
+        limits = RateLimitRegistry({"capped": {"max_in_flight": 2}})
+        managers = [
+            SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / f"{i}.db"), limits=limits)
+            for i in range(2)
+        ]
+        threads = [
+            threading.Thread(target=lambda sm=sm, i=i: sm.search_many([f"m{i}-q{n}" for n in range(4)]))
+            for i, sm in enumerate(managers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(provider.calls) == 8
+        assert provider.peak == 2  # callers queued instead of erroring
+        stats = limits.stats(["capped"])["capped"]
+        assert stats["acquired"] == 8
+        assert stats["waited"] > 0
+        assert stats["total_wait_ms"] > 0
+
+    def test_configure_merges_defaults_and_keeps_unchanged_limiters(self):
+        limits = RateLimitRegistry({"a": {"rate_per_second": 5, "burst": 5, "max_in_flight": 2}, "b": {"max_in_flight": 1}})
+        a, b = limits.limiter("a"), limits.limiter("b")
+        limits.configure({"a": {"rate_per_second": 1}})
+        assert limits.limiter("b") is b
+        new_a = limits.limiter("a")
+        assert new_a is not a
+        assert (new_a.rate_per_second, new_a.burst, new_a.max_in_flight) == (1.0, 5.0, 2)
+        limits.configure({"a": {"rate_per_second": 1}})
+        assert limits.limiter("a") is new_a
+        assert limits.limiter("unknown") is None
+
+    def test_configure_drops_unknown_and_invalid_settings(self, tmp_path, caplog):
+        limits = RateLimitRegistry({"a": {"rate_per_second": 5, "burst": 5}})
+        limits.configure({"a": {"rate_per_secnd": 1, "burst": "ten", "max_in_flight": 2}, "b": 3})
+        limiter = limits.limiter("a")
+        assert (limiter.rate_per_second, limiter.burst, limiter.max_in_flight) == (5.0, 5.0, 2)
+        assert limits.limiter("b") is None
+        assert "rate_per_secnd" in caplog.text and "'ten'" in caplog.text
+
+        health = HealthTracker()
+        provider = _QueryEchoProvider(name="a", delay=0)
+        sm = SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / "c.db"), limits=limits, health=health)
+        assert sm.search_detailed("q").failed == []
+        assert health.snapshot(["a"])["a"]["consecutive_failures"] == 0
+
+    def test_queued_calls_at_deadline_are_not_provider_failures(self, tmp_path):
+        health = HealthTracker()
+        provider = _QueryEchoProvider(name="capped", delay=0.4)
+        limits = RateLimitRegistry({"capped": {"max_in_flight": 1}})
+        sm = SearchManager(
+            providers=[provider],
+            cache=SQLiteSearchCache(tmp_path / "c.db"),
+            limits=limits,
+            health=health,
+            hard_timeout_seconds=0.2,
+        )
+        outcomes = sm.search_many(["q1", "q2", "q3"])
+        assert all(o.timed_out == ["capped"] for o in outcomes.values())
+        # only the call that reached the provider counts against its health
+        assert health.snapshot(["capped"])["capped"]["consecutive_failures"] == 1
+
+
+class _BudgetedProvider(SearchProvider):
+    """Honours `timeout=` like an HTTP client: gives up (raises) once it is exceeded."""
+
+    supports_timeout = True
+
+    def __init__(self, name, delay, results=None):
+        self.name = name
+        self.delay = delay
+        self._results = results or []
+        self.timeouts = []
+
+    def search(self, query, *, max_results=5, topic="news", depth="basic", timeout=None):
+        self.timeouts.append(timeout)
+        if timeout is not None and timeout < self.delay:
+            time.sleep(timeout)
+            raise TimeoutError("read timed out")
+        time.sleep(self.delay)
+        return self._results
+
+
+class TestDeadline:
+    def test_within_takes_the_earlier_deadline(self):
+        outer = Deadline(1.0)
+        assert Deadline.within(outer, 30) is outer
+        assert Deadline.within(outer, 0.1).seconds == 0.1
+        assert Deadline.within(None, 5).seconds == 5
+
+    def test_timeout_is_capped_and_floored(self):
+        d = Deadline(10)
+        assert d.timeout(cap=2) == 2
+        assert 9 < d.timeout() <= 10
+        assert Deadline(-1).timeout() == Deadline.MIN_TIMEOUT
+        assert Deadline(-1).expired
+
+    def test_provider_gets_remaining_budget_and_partial_results_return(self, tmp_path):
+        fast = _BudgetedProvider("fast", 0.0, [SearchResult("F", "https://f.com", "", "fast")])
+        slow = _BudgetedProvider("slow", 5.0, [SearchResult("S", "https://s.com", "", "slow")])
+        sm = SearchManager(providers=[slow, fast], cache=SQLiteSearchCache(tmp_path / "c.db"), hard_timeout_seconds=25)
+        started = time.monotonic()
+        outcome = sm.search_detailed("q", deadline=Deadline(0.3))
+        assert time.monotonic() - started < 1.5
+        assert [r.title for r in outcome.results] == ["F"]
+        assert outcome.timed_out == ["slow"]
+        assert outcome.failed == []
+        assert 0 < slow.timeouts[0] <= 0.3
+        # partial results are not union-cached
+        assert sm.search_detailed("q", deadline=Deadline(0.3)).from_cache is False
+
+    def test_expired_deadline_serves_cache_and_skips_providers(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        sm = SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / "c.db"))
+        sm.search("cached")
+        outcomes = sm.search_many(["cached", "fresh"], deadline=Deadline(0))
+        assert outcomes["cached"].from_cache is True
+        assert outcomes["fresh"].results == []
+        assert outcomes["fresh"].timed_out == [provider.name]
+        assert provider.calls == ["cached"]
+
+    def test_providers_without_timeout_support_are_called_unchanged(self, tmp_path):
+        provider = _StubProvider([SearchResult("A", "https://a.com", "", "stub")])
+        sm = SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / "c.db"))
+        assert len(sm.search("q", deadline=Deadline(5))) == 1
+
+
+class TestUrlCanonicalization:
+    def test_tracking_and_mobile_variants_merge_across_providers(self, tmp_path):
+        p1 = _StubProvider([SearchResult("A", "https://www.example.com/news/1/?utm_source=rss", "", "p1")], name="p1")
+        p2 = _StubProvider([
+            SearchResult("A mobile", "https://m.example.com/news/1?fbclid=x#top", "", "p2"),
+            SearchResult("B", "https://example.com/news/2", "", "p2"),
+        ], name="p2")
+        sm = SearchManager(providers=[p1, p2], cache=SQLiteSearchCache(tmp_path / "c.db"))
+        results = sm.search("q")
+        assert [r.url for r in results] == ["https://www.example.com/news/1", "https://example.com/news/2"]
+
+    def test_equivalent_queries_share_cache_entry(self, tmp_path):
+        provider = _QueryEchoProvider(delay=0)
+        sm = SearchManager(providers=[provider], cache=SQLiteSearchCache(tmp_path / "c.db"))
+        sm.search("NVDA  earnings")
+        assert sm.search_detailed(" nvda EARNINGS ").from_cache is True
+        assert provider.calls == ["NVDA  earnings"]
+
+
 # ---------------------------------------------------------------------------
 # format_search_results_for_prompt
 # ---------------------------------------------------------------------------
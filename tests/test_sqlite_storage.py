@@ -0,0 +1,209 @@
+"""Tests for core.sqlite_storage (SQLiteStorage parity + JSON migration)."""
+
+from __future__ import annotations
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from core.storage import Storage, create_storage
+from core.sqlite_storage import SQLiteStorage, migrate_json_to_sqlite
+
+
+def _record(recommendation: str, **extra):
+    record = {
+        "trigger": "user_initiated",
+        "environment_input": {"time_range": "7d", "auto_collected": [], "user_uploaded": []},
+        "research_result": {"recommendation": recommendation, "reasoning": "r"},
+        "full_report": f"# report {recommendation}",
+        "user_feedback": None,
+    }
+    record.update(extra)
+    return record
+
+
+def _add(storage, stock_id, record, second):
+    # add_research_record 以秒级时间戳生成 ID；测试中固定 ID 以避免碰撞
+    with patch("core.storage.datetime") as dt, patch("core.sqlite_storage.datetime") as dt2:
+        from datetime import datetime as real
+        ts = real(2026, 1, 1, 0, 0, second)
+        for m in (dt, dt2):
+            m.now.return_value = ts
+        storage.add_research_record(stock_id, record)
+
+
+def _strip_timestamps(items):
+    for item in items:
+        item.pop("milestone_updated_at", None)
+        if item.get("user_feedback"):
+            item["user_feedback"].pop("feedback_date", None)
+    return items
+
+
+@pytest.fixture()
+def sqlite_storage(tmp_path):
+    return SQLiteStorage(base_dir=str(tmp_path / "inv-sqlite"))
+
+
+class TestSQLiteStorage:
+    def test_wal_mode(self, sqlite_storage):
+        mode = sqlite_storage._conn().execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode.lower() == "wal"
+
+    def test_playbooks_roundtrip(self, sqlite_storage, sample_stock_playbook, sample_portfolio_playbook):
+        assert not sqlite_storage.has_portfolio_playbook()
+        sqlite_storage.save_portfolio_playbook(sample_portfolio_playbook)
+        assert sqlite_storage.has_portfolio_playbook()
+        assert sqlite_storage.get_portfolio_playbook()["watchlist"] == sample_portfolio_playbook["watchlist"]
+
+        sqlite_storage.save_stock_playbook("Test Corp", sample_stock_playbook)
+        assert sqlite_storage.get_stock_playbook("test corp")["ticker"] == "TEST"
+        stocks = sqlite_storage.list_stocks()
+        assert [s["stock_id"] for s in stocks] == ["test_corp"]
+
+        assert sqlite_storage.delete_stock("Test Corp")
+        assert sqlite_storage.get_stock_playbook("Test Corp") is None
+
+    def test_history_parity_with_json(self, tmp_path):
+        json_storage = Storage(base_dir=str(tmp_path / "json"))
+        db_storage = SQLiteStorage(base_dir=str(tmp_path / "db"))
+
+        for s in (json_storage, db_storage):
+            _add(s, "acme", _record("买入"), 1)
+            _add(s, "acme", _record("持有", environment_input={"user_uploaded": [{"filename": "a.pdf"}]}), 2)
+            _add(s, "acme", _record("卖出"), 3)
+            _add(s, "acme", _record("持有"), 4)
+            s.toggle_milestone("acme", "research_20260101_000001")
+            s.update_research_feedback("acme", "research_20260101_000003", {"decision": "卖出"})
+
+        for method, args in [
+            ("get_recent_research", (1,)),
+            ("get_research_context", (3,)),
+            ("get_historical_uploads", (5,)),
+            ("get_milestone_records", ()),
+        ]:
+            a = getattr(json_storage, method)("acme", *args)
+            b = getattr(db_storage, method)("acme", *args)
+            assert _strip_timestamps(a) == _strip_timestamps(b), method
+
+        a = json_storage.get_stock_context_bundle("acme", recent_limit=2)
+        b = db_storage.get_stock_context_bundle("acme", recent_limit=2)
+        for key in ("recent_research", "research_context", "historical_uploads"):
+            assert _strip_timestamps(a[key]) == _strip_timestamps(b[key]), key
+
+        for kwargs in (
+            {"limit": 2},
+            {"limit": 2, "before_id": "research_20260101_000003", "fields": "full"},
+            {"fields": "summary", "recommendation": "持有"},
+            {"milestone_only": True},
+            {"date_from": "2026-01-01T00:00:02", "date_to": "2026-01-01T00:00:03"},
+            {"before_id": "missing"},
+        ):
+            a = json_storage.query_research_history("acme", **kwargs)
+            b = db_storage.query_research_history("acme", **kwargs)
+            assert a["next_cursor"] == b["next_cursor"], kwargs
+            assert _strip_timestamps(a["records"]) == _strip_timestamps(b["records"]), kwargs
+
+        latest = db_storage.get_latest_research_with_feedback("acme")
+        assert latest["id"] == "research_20260101_000003"
+        ids = [r["id"] for r in db_storage.get_research_history("acme")["records"]]
+        assert ids == [f"research_20260101_00000{i}" for i in (4, 3, 2, 1)]
+
+    def test_toggle_unknown_record(self, sqlite_storage):
+        assert sqlite_storage.toggle_milestone("acme", "missing") is False
+        assert sqlite_storage.update_research_feedback("acme", "missing", {}) is False
+
+    def test_preferences_and_interactions(self, sqlite_storage):
+        pref_id = sqlite_storage.add_preference({"trigger": "t", "my_response": "r"})
+        assert sqlite_storage.toggle_preference(pref_id)
+        assert sqlite_storage.get_active_preferences() == []
+
+        for i in range(105):
+            sqlite_storage.log_interaction({"type": "x", "n": i})
+        recent = sqlite_storage.get_recent_interactions(limit=3)
+        assert [r["n"] for r in recent] == [104, 103, 102]
+        count = sqlite_storage._conn().execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+        assert count == 100
+
+
+class TestMigration:
+    def test_migrates_json_tree(self, tmp_path, sample_stock_playbook, sample_portfolio_playbook):
+        base = tmp_path / "inv"
+        json_storage = Storage(base_dir=str(base))
+        json_storage.save_portfolio_playbook(sample_portfolio_playbook)
+        json_storage.save_stock_playbook("acme", sample_stock_playbook)
+        _add(json_storage, "acme", _record("买入"), 1)
+        _add(json_storage, "acme", _record("持有"), 2)
+        json_storage.log_interaction({"type": "feedback"})
+
+        stats = migrate_json_to_sqlite(str(base))
+        assert stats["stocks"] == 1
+        assert stats["records"] == 2
+        assert stats["interactions"] == 1
+
+        db_storage = SQLiteStorage(base_dir=str(base))
+        assert db_storage.get_research_history("acme") == json_storage.get_research_history("acme")
+        assert db_storage.get_recent_interactions()[0]["type"] == "feedback"
+
+        # 可重复执行，不产生重复记录
+        migrate_json_to_sqlite(str(base))
+        assert len(db_storage.get_research_history("acme")["records"]) == 2
+
+    def test_migration_leaves_legacy_json_untouched(self, tmp_path, sample_stock_playbook):
+        base = tmp_path / "inv"
+        json_storage = Storage(base_dir=str(base))
+        json_storage.save_stock_playbook("acme", sample_stock_playbook)
+        stock_dir = json_storage._get_stock_dir("acme")
+        legacy = {"stock_id": "acme", "records": [
+            {"id": "research_2", "date": "2026-01-02", "research_result": {}, "full_report": "new"},
+            {"id": "research_1", "date": "2026-01-01", "research_result": {}, "full_report": "old"},
+        ]}
+        (stock_dir / "history.json").write_text(json.dumps(legacy), "utf-8")
+        prefs_path = json_storage._get_preferences_path()
+        prefs_path.write_text(json.dumps({"preferences": [], "interaction_log": [{"type": "b"}, {"type": "a"}]}), "utf-8")
+        before = {p: p.read_bytes() for p in base.rglob("*") if p.is_file() and ".locks" not in p.parts}
+
+        stats = migrate_json_to_sqlite(str(base))
+        assert stats["records"] == 2 and stats["interactions"] == 2
+
+        after = {p: p.read_bytes() for p in base.rglob("*") if p.is_file() and ".locks" not in p.parts
+                 and not p.name.startswith("storage.db")}
+        assert after == before
+        db_storage = SQLiteStorage(base_dir=str(base))
+        assert [r["full_report"] for r in db_storage.get_research_history("acme")["records"]] == ["new", "old"]
+        assert [i["type"] for i in db_storage.get_recent_interactions()] == ["b", "a"]
+
+    def test_failed_auto_migration_is_retried(self, tmp_path, sample_stock_playbook):
+        base = tmp_path / "inv"
+        json_storage = Storage(base_dir=str(base))
+        json_storage.save_stock_playbook("acme", sample_stock_playbook)
+        _add(json_storage, "acme", _record("买入"), 1)
+        playbook_path = json_storage._get_stock_dir("acme") / "playbook.json"
+        good = playbook_path.read_text("utf-8")
+        playbook_path.write_text("{corrupt", "utf-8")
+
+        with pytest.raises(ValueError):
+            SQLiteStorage(base_dir=str(base))
+        assert (base / "storage.db").exists()
+
+        playbook_path.write_text(good, "utf-8")
+        db_storage = SQLiteStorage(base_dir=str(base))
+        assert [s["stock_id"] for s in db_storage.list_stocks()] == ["acme"]
+        assert len(db_storage.get_research_index("acme")) == 1
+
+        # 已完成的迁移不再重复执行
+        with patch.object(SQLiteStorage, "migrate_from_json", side_effect=AssertionError):
+            SQLiteStorage(base_dir=str(base))
+
+    def test_create_storage_selects_backend(self, tmp_path, monkeypatch):
+        base = str(tmp_path / "inv")
+        monkeypatch.delenv("IA_STORAGE_BACKEND", raising=False)
+        assert type(create_storage(base)) is Storage
+
+        monkeypatch.setenv("IA_STORAGE_BACKEND", "sqlite")
+        assert isinstance(create_storage(base), SQLiteStorage)
+
+        monkeypatch.delenv("IA_STORAGE_BACKEND")
+        Storage(base).set_storage_backend("sqlite")
+        assert isinstance(create_storage(base), SQLiteStorage)
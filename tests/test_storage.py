@@ -0,0 +1,629 @@
+"""Tests for core.storage (JSON backend: append-only research log)."""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import threading
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from core.storage import Storage
+
+
+def _record(recommendation: str, report: str = "# report", **extra):
+    record = {
+        "environment_input": {"time_range": "7d", "auto_collected": [], "user_uploaded": []},
+        "research_result": {"recommendation": recommendation},
+        "full_report": report,
+        "user_feedback": None,
+    }
+    record.update(extra)
+    return record
+
+
+def _add_at(storage, stock_id: str, record, second: int):
+    # 研究记录 ID 精确到秒；固定时间戳避免同一秒内 ID 重复
+    with patch("core.storage.datetime") as dt:
+        dt.now.return_value = datetime(2026, 1, 1, 0, 0, second)
+        storage.add_research_record(stock_id, record)
+
+
+class TestResearchLog:
+    def test_append_does_not_rewrite_existing_lines(self, tmp_storage):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        log_path = tmp_storage._get_stock_dir("acme") / tmp_storage.RESEARCH_LOG
+        first = log_path.read_bytes()
+
+        tmp_storage.add_research_record("acme", _record("持有"))
+        assert log_path.read_bytes().startswith(first)
+        assert not (tmp_storage._get_stock_dir("acme") / "history.json").exists()
+
+    def test_recent_research_skips_reports(self, tmp_storage):
+        tmp_storage.add_research_record("acme", _record("买入", report="x" * 10000))
+        recent = tmp_storage.get_recent_research("acme", limit=1)
+        assert "full_report" not in recent[0]
+        assert recent[0]["research_result"]["recommendation"] == "买入"
+
+        with_report = tmp_storage.get_recent_research("acme", limit=1, include_report=True)
+        assert with_report[0]["full_report"] == "x" * 10000
+        assert tmp_storage.get_research_report("acme", recent[0]["id"]) == "x" * 10000
+
+    def test_index_only_read_paths_do_not_open_reports(self, tmp_storage, monkeypatch):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        record_id = tmp_storage.get_research_index("acme")[0]["id"]
+        tmp_storage.update_research_feedback("acme", record_id, {"decision": "持有"})
+
+        def _boom(*args, **kwargs):
+            raise AssertionError("full_report should not be read")
+
+        monkeypatch.setattr(tmp_storage, "_read_report", _boom)
+        assert tmp_storage.get_recent_research("acme")
+        assert tmp_storage.get_research_context("acme")[0]["user_feedback"]["decision"] == "持有"
+
+    def test_updates_append_new_version(self, tmp_storage):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        record_id = tmp_storage.get_research_index("acme")[0]["id"]
+
+        assert tmp_storage.toggle_milestone("acme", record_id) is True
+        assert tmp_storage.update_research_feedback("acme", record_id, {"decision": "卖出"})
+
+        entry = tmp_storage.get_research_index("acme")[0]
+        assert entry["is_milestone"] and entry["has_feedback"] and entry["has_report"]
+        record = tmp_storage.get_research_history("acme")["records"][0]
+        assert record["user_feedback"]["decision"] == "卖出"
+        assert record["full_report"] == "# report"
+
+    def test_index_rebuilt_when_missing(self, tmp_storage):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        record_id = tmp_storage.get_research_index("acme")[0]["id"]
+        tmp_storage.toggle_milestone("acme", record_id)
+        before = tmp_storage.get_research_history("acme")
+
+        (tmp_storage._get_stock_dir("acme") / tmp_storage.RESEARCH_INDEX).unlink()
+        assert tmp_storage.get_research_history("acme") == before
+        assert tmp_storage.get_research_index("acme")[0]["is_milestone"] is True
+
+    def test_legacy_history_json_converted(self, tmp_storage):
+        stock_dir = tmp_storage._ensure_stock_dir("acme")
+        legacy = {
+            "stock_id": "acme",
+            "records": [
+                {"id": "research_2", "date": "2026-01-02", "research_result": {}, "full_report": "new"},
+                {"id": "research_1", "date": "2026-01-01", "research_result": {}, "full_report": "old",
+                 "is_milestone": True},
+            ],
+        }
+        (stock_dir / "history.json").write_text(json.dumps(legacy), "utf-8")
+
+        history = tmp_storage.get_research_history("acme")
+        assert history["records"] == legacy["records"]
+        assert (stock_dir / "history.json.bak").exists()
+        assert not (stock_dir / "history.json").exists()
+        assert [m["id"] for m in tmp_storage.get_milestone_records("acme")] == ["research_1"]
+
+    def test_compaction_drops_superseded_versions(self, tmp_storage):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        record_id = tmp_storage.get_research_index("acme")[0]["id"]
+        for _ in range(5):
+            tmp_storage.toggle_milestone("acme", record_id)
+        before = tmp_storage.get_research_history("acme")
+
+        tmp_storage.compact_research_log("acme")
+        log_path = tmp_storage._get_stock_dir("acme") / tmp_storage.RESEARCH_LOG
+        assert len(log_path.read_bytes().splitlines()) == 1
+        assert tmp_storage.get_research_history("acme") == before
+
+    def test_entries_read_before_compaction_resolve_to_new_offsets(self, tmp_storage):
+        for second, rec in enumerate(["买入", "持有", "卖出"]):
+            _add_at(tmp_storage, "acme", _record(rec, report=f"report {second}"), second)
+        for _ in range(3):
+            tmp_storage.toggle_milestone("acme", "research_20260101_000000")
+        stale = tmp_storage.get_research_index("acme")  # a lock-free reader's snapshot
+        tmp_storage.compact_research_log("acme")
+
+        assert stale[-1]["offset"] != tmp_storage.get_research_index("acme")[-1]["offset"]
+        records = tmp_storage._load_records("acme", stale, include_report=True)
+        assert [r["full_report"] for r in records] == ["report 2", "report 1", "report 0"]
+        assert records == tmp_storage.get_research_history("acme")["records"]
+
+    def test_reader_holding_pre_compaction_index_retries(self, tmp_storage, monkeypatch):
+        for second, rec in enumerate(["买入", "持有"]):
+            _add_at(tmp_storage, "acme", _record(rec, report=f"report {second}"), second)
+        tmp_storage.toggle_milestone("acme", "research_20260101_000000")
+        stale_index = tmp_storage._load_research_index("acme")
+        tmp_storage.compact_research_log("acme")
+
+        real_load = tmp_storage._load_research_index
+        calls = []
+
+        def load(stock_id):
+            calls.append(stock_id)
+            return stale_index if len(calls) == 1 else real_load(stock_id)
+
+        monkeypatch.setattr(tmp_storage, "_load_research_index", load)
+        records = tmp_storage._load_records("acme", stale_index["entries"], include_report=True)
+        assert len(calls) == 2  # the stale index's inode no longer matched the log
+        assert [r["full_report"] for r in records] == ["report 1", "report 0"]
+
+    def test_reads_take_no_lock(self, tmp_storage):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        record_id = tmp_storage.get_research_index("acme")[0]["id"]
+        held, release = threading.Event(), threading.Event()
+
+        def writer():
+            with tmp_storage._stock_lock("acme"):
+                held.set()
+                release.wait(5)
+
+        t = threading.Thread(target=writer)
+        t.start()
+        held.wait(5)
+        try:
+            result = {}
+            reader = threading.Thread(target=lambda: result.update(
+                history=tmp_storage.get_research_history("acme"),
+                report=tmp_storage.get_research_report("acme", record_id),
+            ))
+            reader.start()
+            reader.join(2)
+            assert not reader.is_alive(), "reader blocked on the stock lock"
+            assert result["report"] == "# report"
+        finally:
+            release.set()
+            t.join()
+
+    def test_reading_unknown_stock_creates_no_lock_files(self, tmp_storage):
+        assert tmp_storage.get_research_history("ghost")["records"] == []
+        assert tmp_storage.get_research_report("ghost", "research_x") is None
+        assert tmp_storage.query_research_history("ghost")["records"] == []
+        assert not list((tmp_storage.base_dir / ".locks").glob("stock_ghost*"))
+        assert not tmp_storage._get_stock_dir("ghost").exists()
+
+
+class TestHistoryQuery:
+    @pytest.fixture()
+    def history(self, tmp_storage):
+        for second, rec in enumerate(["买入", "持有", "卖出", "持有", "买入"]):
+            _add_at(tmp_storage, "acme", _record(rec, report=f"report {second}"), second)
+        tmp_storage.toggle_milestone("acme", "research_20260101_000001")
+        return tmp_storage
+
+    def test_cursor_pagination(self, history):
+        first = history.query_research_history("acme", limit=2)
+        assert [r["id"][-1] for r in first["records"]] == ["4", "3"]
+        assert "full_report" not in first["records"][0]
+        second = history.query_research_history("acme", before_id=first["next_cursor"], limit=2)
+        assert [r["id"][-1] for r in second["records"]] == ["2", "1"]
+        last = history.query_research_history("acme", before_id=second["next_cursor"], limit=2)
+        assert [r["id"][-1] for r in last["records"]] == ["0"]
+        assert last["next_cursor"] is None
+
+    def test_filters_and_projection(self, history, monkeypatch):
+        page = history.query_research_history("acme", recommendation="持有", fields="full")
+        assert [r["full_report"] for r in page["records"]] == ["report 3", "report 1"]
+
+        assert [r["id"][-1] for r in history.query_research_history("acme", milestone_only=True)["records"]] == ["1"]
+        dated = history.query_research_history("acme", date_from="2026-01-01T00:00:02", date_to="2026-01-01T00:00:03")
+        assert [r["id"][-1] for r in dated["records"]] == ["3", "2"]
+
+        monkeypatch.setattr(history, "_load_records", lambda *a, **k: pytest.fail("summary read the log"))
+        summary = history.query_research_history("acme", fields="summary", limit=1)["records"][0]
+        assert summary == {
+            "id": "research_20260101_000004", "date": "2026-01-01T00:00:04", "is_milestone": False,
+            "recommendation": "买入", "has_feedback": False, "has_uploads": False, "has_report": True,
+        }
+
+    def test_invalid_fields(self, tmp_storage):
+        with pytest.raises(ValueError):
+            tmp_storage.query_research_history("acme", fields="everything")
+
+
+class TestReportCompression:
+    def test_large_reports_compressed_transparently(self, tmp_storage):
+        report = "## 分析\n" + "营收增长，毛利率稳定。" * 500
+        _add_at(tmp_storage, "acme", _record("买入", report=report, _raw_response="raw " * 300), 1)
+        _add_at(tmp_storage, "acme", _record("持有", report="short"), 2)
+
+        reports_path = tmp_storage._get_stock_dir("acme") / tmp_storage.RESEARCH_REPORTS
+        with open(reports_path, "rb") as f:
+            codecs = []
+            for entry in tmp_storage.get_research_index("acme"):
+                f.seek(entry["report_offset"])
+                codecs.append(json.loads(f.readline())["codec"])
+        assert codecs == ["none", "zlib"]
+        assert reports_path.stat().st_size < len(report.encode("utf-8")) // 5
+
+        old = tmp_storage.get_research_history("acme")["records"][1]
+        assert old["full_report"] == report
+        assert old["_raw_response"] == "raw " * 300
+        assert "_raw_response" not in tmp_storage.get_recent_research("acme", limit=2)[1]
+        assert tmp_storage.get_research_report("acme", old["id"]) == report
+
+    def test_gzip_codec_and_rebuild(self, tmp_storage, monkeypatch):
+        monkeypatch.setattr(tmp_storage, "REPORT_CODEC", "gzip")
+        tmp_storage.add_research_record("acme", _record("买入", report="x" * 5000))
+        before = tmp_storage.get_research_history("acme")
+        reports_path = tmp_storage._get_stock_dir("acme") / tmp_storage.RESEARCH_REPORTS
+        with open(reports_path, "rb") as f:
+            assert json.loads(f.readline())["codec"] == "gzip"
+
+        (tmp_storage._get_stock_dir("acme") / tmp_storage.RESEARCH_INDEX).unlink()
+        assert tmp_storage.get_research_history("acme") == before
+        assert tmp_storage.get_research_index("acme")[0]["has_report"] is True
+
+    def test_reads_uncompressed_legacy_frames(self, tmp_storage):
+        stock_dir = tmp_storage._ensure_stock_dir("acme")
+        (stock_dir / tmp_storage.RESEARCH_LOG).write_text(
+            json.dumps({"id": "research_1", "date": "2026-01-01", "_seq": 1}) + "\n", "utf-8")
+        (stock_dir / tmp_storage.RESEARCH_REPORTS).write_text(
+            json.dumps({"seq": 1, "id": "research_1", "full_report": "legacy"}) + "\n", "utf-8")
+        assert tmp_storage.get_research_report("acme", "research_1") == "legacy"
+
+    def test_archive_old_reports(self, tmp_storage):
+        for second in range(3):
+            _add_at(tmp_storage, "acme", _record(f"r{second}", report=f"report {second} " * 200), second)
+        tmp_storage.add_research_record("acme", _record("new", report="fresh"))
+        before = tmp_storage.get_research_history("acme")
+
+        assert tmp_storage.archive_research_reports("acme", older_than_days=30) == 3
+        stock_dir = tmp_storage._get_stock_dir("acme")
+        assert len(list((stock_dir / tmp_storage.RESEARCH_ARCHIVE_DIR).glob("*.jsonl.gz"))) == 1
+        assert len((stock_dir / tmp_storage.RESEARCH_REPORTS).read_bytes().split(b"\n")) == 3  # 只剩 1 帧
+        assert tmp_storage.get_research_history("acme") == before
+        assert tmp_storage.archive_research_reports("acme", older_than_days=30) == 0
+
+        # 归档后的记录仍可修改、压缩，并能从日志重建索引
+        old_id = before["records"][-1]["id"]
+        tmp_storage.toggle_milestone("acme", old_id)
+        tmp_storage.compact_research_log("acme")
+        (stock_dir / tmp_storage.RESEARCH_INDEX).unlink()
+        assert tmp_storage.get_research_report("acme", old_id) == "report 0 " * 200
+        assert tmp_storage.get_milestone_records("acme")[0]["full_report"] == "report 0 " * 200
+
+
+class TestStockDirLookup:
+    def test_reads_do_not_create_directories(self, tmp_storage):
+        assert tmp_storage.get_stock_playbook("ghost") is None
+        assert tmp_storage.get_research_history("ghost") == {"stock_id": "ghost", "records": []}
+        assert tmp_storage.get_recent_research("ghost") == []
+        assert tmp_storage.get_research_report("ghost", "research_1") is None
+        assert tmp_storage.toggle_milestone("ghost", "research_1") is False
+        tmp_storage.compact_research_log("ghost")
+        assert tmp_storage.delete_stock("ghost") is False
+        assert not (tmp_storage.base_dir / "stocks" / "ghost").exists()
+        assert tmp_storage.list_stocks() == []
+
+    def test_writes_create_directories(self, tmp_storage, sample_stock_playbook, tmp_path):
+        tmp_storage.add_research_record("acme", _record("买入"))
+        assert tmp_storage._get_stock_dir("acme").is_dir()
+
+        source = tmp_path / "note.txt"
+        source.write_text("hello", "utf-8")
+        dest = tmp_storage.save_uploaded_file("acme", str(source))
+        assert (tmp_storage._get_stock_dir("acme") / "uploads").is_dir()
+        assert open(dest, encoding="utf-8").read() == "hello"
+
+
+def _append_records(base_dir: str, stock_id: str, count: int):
+    storage = Storage(base_dir=base_dir)
+    for i in range(count):
+        storage.add_research_record(stock_id, _record(f"r{i}"))
+        storage.add_preference({"trigger": stock_id, "my_response": str(i)})
+
+
+class TestConcurrentWrites:
+    def test_threads_do_not_lose_records(self, tmp_storage):
+        def worker(stock_id):
+            for i in range(10):
+                tmp_storage.add_research_record(stock_id, _record(f"r{i}"))
+                tmp_storage.log_interaction({"type": stock_id})
+
+        threads = [threading.Thread(target=worker, args=(s,)) for s in ("acme", "acme", "acme", "beta")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(tmp_storage.get_research_index("acme")) == 30
+        assert len(tmp_storage.get_research_index("beta")) == 10
+        assert len(tmp_storage.get_recent_interactions(limit=100)) == 40
+
+    def test_processes_do_not_lose_records(self, tmp_storage):
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=_append_records, args=(str(tmp_storage.base_dir), "acme", 10))
+                 for _ in range(3)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+            assert p.exitcode == 0
+
+        assert len(tmp_storage.get_research_index("acme")) == 30
+        assert len(tmp_storage.get_research_history("acme")["records"]) == 30
+        assert len(tmp_storage.get_user_preferences()["preferences"]) == 30
+
+    def test_auth_and_key_writers_do_not_lose_updates(self, tmp_storage):
+        def set_keys():
+            for i in range(20):
+                tmp_storage.set_tavily_api_key(f"tvly-{i}")
+
+        def set_auth():
+            for i in range(20):
+                tmp_storage.set_auth_config(i % 2 == 0, "hash" if i == 0 else None)
+
+        threads = [threading.Thread(target=set_keys), threading.Thread(target=set_auth)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        config = tmp_storage.get_config()
+        assert config["tavily_api_key"] == "tvly-19"
+        assert config["auth_password_hash"] == "hash"
+        assert config["auth_enabled"] is False
+
+    def test_atomic_write_leaves_no_temp_files(self, tmp_storage, sample_stock_playbook):
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        tmp_storage.set_llm_provider("openai")
+        leftovers = list(tmp_storage.base_dir.rglob("*.tmp"))
+        assert leftovers == []
+
+    def test_failed_write_keeps_previous_file(self, tmp_storage):
+        tmp_storage.set_llm_provider("openai")
+        with pytest.raises(TypeError):
+            tmp_storage.save_config({"llm_provider": object()})
+        assert tmp_storage.get_llm_provider() == "openai"
+        assert list(tmp_storage.base_dir.glob("*.tmp")) == []
+
+
+class TestInteractionLog:
+    def test_log_does_not_touch_preferences(self, tmp_storage):
+        tmp_storage.add_preference({"trigger": "t", "my_response": "r"})
+        prefs_path = tmp_storage._get_preferences_path()
+        before = prefs_path.stat().st_mtime_ns
+
+        for i in range(5):
+            tmp_storage.log_interaction({"type": "x", "n": i})
+        assert prefs_path.stat().st_mtime_ns == before
+        assert "interaction_log" not in tmp_storage.get_user_preferences()
+        assert [r["n"] for r in tmp_storage.get_recent_interactions(limit=3)] == [4, 3, 2]
+
+    def test_log_is_bounded(self, tmp_storage):
+        cap = tmp_storage.MAX_INTERACTIONS
+        for i in range(cap * 3 + 7):
+            tmp_storage.log_interaction({"n": i})
+        path = tmp_storage._interactions_path()
+        assert len(path.read_bytes().splitlines()) <= 2 * cap
+        recent = tmp_storage.get_recent_interactions(limit=1000)
+        assert len(recent) == cap
+        assert recent[0]["n"] == cap * 3 + 6
+
+    def test_legacy_interaction_log_migrated(self, tmp_storage):
+        prefs = tmp_storage._default_preferences()
+        prefs["interaction_log"] = [{"n": 2}, {"n": 1}]
+        tmp_storage._get_preferences_path().write_text(json.dumps(prefs), "utf-8")
+
+        assert [r["n"] for r in tmp_storage.get_recent_interactions()] == [2, 1]
+        tmp_storage.log_interaction({"n": 3})
+        assert [r["n"] for r in tmp_storage.get_recent_interactions()] == [3, 2, 1]
+        stored = json.loads(tmp_storage._get_preferences_path().read_text("utf-8"))
+        assert "interaction_log" not in stored
+
+    def test_legacy_interaction_log_survives_preference_write_first(self, tmp_storage):
+        prefs = tmp_storage._default_preferences()
+        prefs["interaction_log"] = [{"n": 2}, {"n": 1}]
+        tmp_storage._get_preferences_path().write_text(json.dumps(prefs), "utf-8")
+
+        tmp_storage.add_preference({"trigger": "t", "my_response": "r"})
+        assert [r["n"] for r in tmp_storage.get_recent_interactions()] == [2, 1]
+        assert len(tmp_storage.get_user_preferences()["preferences"]) == 1
+
+    def test_unchanged_preferences_not_rewritten(self, tmp_storage):
+        tmp_storage.update_preference_summary({"decision_style": "价值"})
+        prefs_path = tmp_storage._get_preferences_path()
+        before = prefs_path.stat().st_mtime_ns
+        assert tmp_storage.save_user_preferences(tmp_storage.get_user_preferences()) is False
+        tmp_storage.update_preference_summary({"decision_style": "价值"})
+        assert prefs_path.stat().st_mtime_ns == before
+
+        prefs = tmp_storage.get_user_preferences()
+        prefs["preference_summary"]["risk_tolerance"] = "低"
+        assert tmp_storage.save_user_preferences(prefs) is True
+
+
+class TestContextBundle:
+    def _populate(self, storage, sample_stock_playbook, sample_portfolio_playbook):
+        storage.save_portfolio_playbook(sample_portfolio_playbook)
+        storage.save_stock_playbook("acme", sample_stock_playbook)
+        storage.add_preference({"trigger": "t", "my_response": "r"})
+        for i in range(4):
+            uploads = [{"filename": f"{i}.pdf"}] if i % 2 else []
+            _add_at(storage, "acme", _record(f"r{i}", environment_input={"user_uploaded": uploads}), i)
+        record_id = storage.get_research_index("acme")[-1]["id"]
+        storage.toggle_milestone("acme", record_id)
+
+    def test_matches_individual_reads(self, tmp_storage, sample_stock_playbook, sample_portfolio_playbook):
+        self._populate(tmp_storage, sample_stock_playbook, sample_portfolio_playbook)
+        bundle = tmp_storage.get_stock_context_bundle("acme", recent_limit=2)
+
+        assert bundle["portfolio_playbook"] == tmp_storage.get_portfolio_playbook()
+        assert bundle["stock_playbook"] == tmp_storage.get_stock_playbook("acme")
+        assert bundle["recent_research"] == tmp_storage.get_recent_research("acme", limit=2)
+        assert bundle["research_context"] == tmp_storage.get_research_context("acme", limit=3)
+        assert bundle["historical_uploads"] == tmp_storage.get_historical_uploads("acme", limit=5)
+        assert bundle["preferences_prompt"] == tmp_storage.get_preferences_for_prompt()
+
+    def test_snapshot_reused_until_write(self, tmp_storage, sample_stock_playbook,
+                                         sample_portfolio_playbook, monkeypatch):
+        self._populate(tmp_storage, sample_stock_playbook, sample_portfolio_playbook)
+        first = tmp_storage.get_stock_context_bundle("acme")
+        first["recent_research"].clear()
+
+        real_load = tmp_storage._load_records
+        monkeypatch.setattr(tmp_storage, "_load_records", lambda *a, **k: pytest.fail("records re-read"))
+        second = tmp_storage.get_stock_context_bundle("acme")
+        assert len(second["recent_research"]) == 4
+
+        monkeypatch.setattr(tmp_storage, "_load_records", real_load)
+        tmp_storage.add_research_record("acme", _record("卖出"))
+        third = tmp_storage.get_stock_context_bundle("acme")
+        assert third["recent_research"][0]["research_result"]["recommendation"] == "卖出"
+
+    def test_cache_is_bounded_and_dropped_on_write_and_delete(self, tmp_storage, sample_stock_playbook,
+                                                              sample_portfolio_playbook, monkeypatch):
+        monkeypatch.setattr(Storage, "BUNDLE_CACHE_MAX_ENTRIES", 2)
+        self._populate(tmp_storage, sample_stock_playbook, sample_portfolio_playbook)
+        for limit in (1, 2, 3):
+            tmp_storage.get_stock_context_bundle("acme", recent_limit=limit)
+        assert [k[1] for k in tmp_storage._bundle_cache] == [2, 3]
+
+        tmp_storage.get_stock_context_bundle("beta")
+        tmp_storage.add_research_record("acme", _record("卖出"))
+        assert [k[0] for k in tmp_storage._bundle_cache] == ["beta"]
+        tmp_storage.get_stock_context_bundle("acme")
+        tmp_storage.delete_stock("acme")
+        assert [k[0] for k in tmp_storage._bundle_cache] == ["beta"]
+
+    def test_unknown_stock(self, tmp_storage):
+        bundle = tmp_storage.get_stock_context_bundle("ghost")
+        assert bundle["stock_playbook"] is None
+        assert bundle["recent_research"] == bundle["research_context"] == bundle["historical_uploads"] == []
+
+
+class TestReadCache:
+    def test_repeated_reads_hit_cache(self, tmp_storage):
+        tmp_storage.set_openai_api_key("sk-1")
+        tmp_storage.get_openai_api_key()
+        before = tmp_storage.cache_stats()
+        for _ in range(5):
+            assert tmp_storage.get_openai_api_key() == "sk-1"
+        after = tmp_storage.cache_stats()
+        assert after["hits"] - before["hits"] == 5
+        assert after["misses"] == before["misses"]
+
+    def test_lru_bound_evicts_least_recently_used(self, tmp_storage, sample_stock_playbook, monkeypatch):
+        monkeypatch.setattr(Storage, "READ_CACHE_MAX_ENTRIES", 3)
+        for stock in ("a", "b", "c", "d"):
+            tmp_storage.save_stock_playbook(stock, sample_stock_playbook)
+        tmp_storage._invalidate_cache()
+        for stock in ("a", "b", "c"):
+            tmp_storage.get_stock_playbook(stock)
+        tmp_storage.get_stock_playbook("a")  # a is now the most recent
+        evictions = tmp_storage.cache_stats()["evictions"]
+        tmp_storage.get_stock_playbook("d")  # evicts b
+
+        stats = tmp_storage.cache_stats()
+        assert stats["entries"] == 3 and stats["evictions"] == evictions + 1
+        cached = set(tmp_storage._read_cache)
+        assert any("/a/" in k for k in cached) and not any("/b/" in k for k in cached)
+
+    def test_byte_bound_and_delete_evict(self, tmp_storage, sample_stock_playbook, monkeypatch):
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        tmp_storage.get_stock_playbook("acme")
+        size = tmp_storage.cache_stats()["bytes"]
+        assert size > 0
+        tmp_storage.delete_stock("acme")
+        assert not any("acme" in k for k in tmp_storage._read_cache)
+
+        monkeypatch.setattr(Storage, "READ_CACHE_MAX_BYTES", size - 1)
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        assert tmp_storage.get_stock_playbook("acme")["ticker"] == "TEST"
+        assert not any("acme" in k for k in tmp_storage._read_cache)  # too large to cache at all
+        assert tmp_storage.cache_stats()["bytes"] <= size - 1
+
+    @staticmethod
+    def _replace_same_size_and_mtime(path, text):
+        # 模拟另一进程在同一 mtime 刻度内以 os.replace 写入等长内容
+        st = path.stat()
+        assert len(text.encode("utf-8")) == st.st_size
+        tmp = path.with_suffix(".other")
+        tmp.write_text(text, "utf-8")
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, path)
+
+    def test_same_tick_replace_by_other_process_is_seen(self, tmp_storage, sample_stock_playbook,
+                                                       sample_portfolio_playbook):
+        tmp_storage.set_llm_provider("openai")
+        assert tmp_storage.get_llm_provider() == "openai"
+        self._replace_same_size_and_mtime(tmp_storage.config_path,
+                                          tmp_storage.config_path.read_text("utf-8").replace("openai", "gemini"))
+        assert tmp_storage.get_llm_provider() == "gemini"
+
+        tmp_storage.save_portfolio_playbook(sample_portfolio_playbook)
+        sample_stock_playbook["ticker"] = "AAAA"
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        assert tmp_storage.get_stock_context_bundle("acme")["stock_playbook"]["ticker"] == "AAAA"
+        path = tmp_storage._get_stock_dir("acme") / "playbook.json"
+        self._replace_same_size_and_mtime(path, path.read_text("utf-8").replace("AAAA", "BBBB"))
+        assert tmp_storage.get_stock_context_bundle("acme")["stock_playbook"]["ticker"] == "BBBB"
+
+    def test_write_invalidates(self, tmp_storage, sample_stock_playbook):
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        assert tmp_storage.get_stock_playbook("acme")["ticker"] == "TEST"
+        sample_stock_playbook["ticker"] = "NEW"
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        assert tmp_storage.get_stock_playbook("acme")["ticker"] == "NEW"
+
+    def test_external_change_detected(self, tmp_storage):
+        tmp_storage.set_llm_provider("openai")
+        assert tmp_storage.get_llm_provider() == "openai"
+        tmp_storage.config_path.write_text(json.dumps({"llm_provider": "gemini-x"}), "utf-8")
+        assert tmp_storage.get_llm_provider() == "gemini-x"
+
+    def test_returned_objects_are_independent(self, tmp_storage, sample_stock_playbook):
+        tmp_storage.save_stock_playbook("acme", sample_stock_playbook)
+        first = tmp_storage.get_stock_playbook("acme")
+        first["last_research"] = {"id": "x"}
+        first["core_thesis"]["summary"] = "mutated"
+        second = tmp_storage.get_stock_playbook("acme")
+        assert "last_research" not in second
+        assert second["core_thesis"]["summary"] == "Leading AI chip maker"
+
+
+class TestSearchRateLimitConfig:
+    def test_round_trip(self, tmp_storage):
+        assert tmp_storage.get_search_rate_limits() == {}
+        limits = {"tavily": {"rate_per_second": 1, "max_in_flight": 2}}
+        tmp_storage.set_search_rate_limits(limits)
+        assert tmp_storage.get_search_rate_limits() == limits
+        tmp_storage.set_search_rate_limits(None)
+        assert "search_rate_limits" not in tmp_storage.get_config()
+
+
+class TestStockManifest:
+    def test_list_stocks_tracks_writes(self, tmp_storage, sample_stock_playbook):
+        tmp_storage.save_stock_playbook("acme", dict(sample_stock_playbook))
+        tmp_storage.add_research_record("acme", _record("买入"))
+
+        stocks = tmp_storage.list_stocks()
+        assert len(stocks) == 1
+        assert stocks[0]["stock_name"] == "TestCorp"
+        assert stocks[0]["summary"] == "Leading AI chip maker"
+        assert stocks[0]["last_recommendation"] == "买入"
+        assert stocks[0]["last_research_date"]
+
+        tmp_storage.delete_stock("acme")
+        assert tmp_storage.list_stocks() == []
+
+    def test_list_stocks_reads_only_manifest(self, tmp_storage, sample_stock_playbook, monkeypatch):
+        for name in ("a", "b", "c"):
+            tmp_storage.save_stock_playbook(name, dict(sample_stock_playbook))
+        tmp_storage.list_stocks()
+
+        monkeypatch.setattr(tmp_storage, "get_stock_playbook", lambda *_: pytest.fail("playbook read"))
+        assert [s["stock_id"] for s in tmp_storage.list_stocks()] == ["a", "b", "c"]
+
+    def test_rebuilds_when_missing_or_stale(self, tmp_storage, sample_stock_playbook):
+        tmp_storage.save_stock_playbook("acme", dict(sample_stock_playbook))
+        tmp_storage._manifest_path().unlink()
+        assert [s["stock_id"] for s in tmp_storage.list_stocks()] == ["acme"]
+
+        # 外部直接在 stocks/ 下新增股票目录
+        other = tmp_storage.base_dir / "stocks" / "other"
+        other.mkdir()
+        (other / "playbook.json").write_text(json.dumps({"stock_name": "Other"}), "utf-8")
+        assert sorted(s["stock_id"] for s in tmp_storage.list_stocks()) == ["acme", "other"]
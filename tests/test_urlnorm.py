@@ -0,0 +1,142 @@
+"""Tests for core.urlnorm (URL canonicalization and query normalization)."""
+
+from __future__ import annotations
+
+import base64
+
+import pytest
+
+from core.urlnorm import canonicalize_url, normalize_query, url_dedup_key
+
+
+def _google_news_link(target: str) -> str:
+    # Legacy Google News article ids: url-safe base64 of a protobuf carrying the publisher URL.
+    payload = b"\x08\x13\x22" + bytes([len(target)]) + target.encode() + b"\xd2\x01\x00"
+    article_id = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+    return f"https://news.google.com/rss/articles/{article_id}?oc=5"
+
+
+# Each group: real-world variants of one article -> expected canonical URL.
+CORPUS = [
+    (
+        "https://www.reuters.com/technology/nvidia-results-2026-02-25/",
+        [
+            "https://www.reuters.com/technology/nvidia-results-2026-02-25/",
+            "https://www.reuters.com/technology/nvidia-results-2026-02-25/?utm_source=twitter&utm_medium=social",
+            "https://www.reuters.com/technology/nvidia-results-2026-02-25/#main-content",
+            "http://reuters.com/technology/nvidia-results-2026-02-25",
+            "https://www.reuters.com/technology/nvidia-results-2026-02-25/amp/",
+            "https://www-reuters-com.cdn.ampproject.org/c/s/www.reuters.com/technology/nvidia-results-2026-02-25/",
+            "https://www.google.com/url?q=https://www.reuters.com/technology/nvidia-results-2026-02-25/&sa=D&ust=1",
+            _google_news_link("https://www.reuters.com/technology/nvidia-results-2026-02-25/"),
+        ],
+    ),
+    (
+        "https://finance.sina.com.cn/stock/relnews/us/2026-02-26/doc-inahxyz1234567.shtml",
+        [
+            "https://finance.sina.com.cn/stock/relnews/us/2026-02-26/doc-inahxyz1234567.shtml",
+            "https://finance.sina.com.cn/stock/relnews/us/2026-02-26/doc-inahxyz1234567.shtml?spm=a2c4g.11186623",
+            "https://finance.sina.com.cn/stock/relnews/us/2026-02-26/doc-inahxyz1234567.shtml?hmsr=toutiao&hmpl=feed",
+        ],
+    ),
+    (
+        "https://www.bloomberg.com/news/articles/2026-02-26/tsmc-capex",
+        [
+            "https://www.bloomberg.com/news/articles/2026-02-26/tsmc-capex?srnd=premium&fbclid=IwAR0abc",
+            "https://m.bloomberg.com/news/articles/2026-02-26/tsmc-capex?srnd=premium",
+            "https://mobile.bloomberg.com/news/articles/2026-02-26/tsmc-capex?srnd=premium&gclid=xyz",
+        ],
+    ),
+    (
+        "https://www.theguardian.com/business/2026/feb/26/chipmakers-results",
+        [
+            "https://amp.theguardian.com/business/2026/feb/26/chipmakers-results",
+            "https://www.theguardian.com/business/2026/feb/26/chipmakers-results?CMP=share_btn_tw",
+            "https://www.theguardian.com/business/2026/feb/26/chipmakers-results?CMP=share_btn_tw&amp=1",
+        ],
+    ),
+    (
+        "https://edition.cnn.com/2026/02/26/tech/ai-chips/index.html",
+        [
+            "https://edition.cnn.com/2026/02/26/tech/ai-chips/index.html",
+            "https://edition.cnn.com/2026/02/26/tech/ai-chips/index.html?ref=rss&ocid=msn",
+            "HTTPS://EDITION.CNN.COM:443/2026/02/26/tech/ai-chips/index.html",
+        ],
+    ),
+    (
+        "https://www.eastmoney.com/a/202602263012345678.html",
+        [
+            "https://www.eastmoney.com/a/202602263012345678.html",
+            "https://wap.eastmoney.com/a/202602263012345678.html",
+            "https://www.eastmoney.com/a/202602263012345678.amp.html",
+        ],
+    ),
+]
+
+# Different pages that must stay distinct.
+DISTINCT = [
+    ("https://example.com/news?id=1", "https://example.com/news?id=2"),
+    ("https://example.com/a/b", "https://example.com/a/B"),
+    ("https://finance.example.com/x", "https://example.com/x"),
+    ("https://example.com:8080/x", "https://example.com/x"),
+    # generic parameter names carry content outside the hosts where they are known tracking
+    ("https://example.com/articles?ref=AAPL", "https://example.com/articles?ref=MSFT"),
+    ("https://example.com/quotes?from=2026-01-01", "https://example.com/quotes?from=2026-02-01"),
+    ("https://example.com/board?oc=1", "https://example.com/board?oc=2"),
+]
+
+
+class TestCanonicalizeUrl:
+    @pytest.mark.parametrize("canonical,variants", CORPUS, ids=[c for c, _ in CORPUS])
+    def test_corpus_variants_share_dedup_key(self, canonical, variants):
+        keys = {url_dedup_key(v) for v in variants}
+        assert keys == {url_dedup_key(canonical)}
+
+    def test_tracking_params_and_fragment_removed(self):
+        url = "https://www.example.com/news/123/?utm_source=x&id=5&fbclid=y&spm=z#top"
+        assert canonicalize_url(url) == "https://www.example.com/news/123?id=5"
+
+    def test_query_params_sorted(self):
+        assert canonicalize_url("https://example.com/p?b=2&a=1") == "https://example.com/p?a=1&b=2"
+
+    def test_unwraps_redirects_and_amp_cache(self):
+        target = "https://www.reuters.com/markets/acme-q3-2026/"
+        assert canonicalize_url(_google_news_link(target)) == "https://www.reuters.com/markets/acme-q3-2026"
+        assert canonicalize_url("https://www.google.com/url?q=https://example.com/x&sa=D") == "https://example.com/x"
+        assert canonicalize_url(
+            "https://example-com.cdn.ampproject.org/c/s/example.com/news/1/amp"
+        ) == "https://example.com/news/1"
+
+    def test_opaque_google_news_link_kept_without_tracking(self):
+        url = "https://news.google.com/rss/articles/AU_yqLOpaqueId123?oc=5&hl=zh-CN"
+        assert canonicalize_url(url) == "https://news.google.com/rss/articles/AU_yqLOpaqueId123?hl=zh-CN"
+
+    def test_content_params_kept(self):
+        assert canonicalize_url("https://example.com/a?from=rss&ref=x&id=1") == "https://example.com/a?from=rss&id=1&ref=x"
+        assert canonicalize_url("https://edition.cnn.com/x?ref=rss") == "https://edition.cnn.com/x"
+        assert canonicalize_url("https://amp.example.com/x") == "https://amp.example.com/x"
+
+    def test_canonical_url_keeps_mobile_host(self):
+        # the canonical form must stay openable; only the dedup key folds mobile hosts
+        assert canonicalize_url("https://m.example.com/x") == "https://m.example.com/x"
+        assert url_dedup_key("https://m.example.com/x") == url_dedup_key("https://www.example.com/x")
+
+    @pytest.mark.parametrize("a,b", DISTINCT)
+    def test_distinct_pages_stay_distinct(self, a, b):
+        assert url_dedup_key(a) != url_dedup_key(b)
+
+    @pytest.mark.parametrize("value", ["", "   ", "not a url", "javascript:void(0)"])
+    def test_garbage_is_passed_through(self, value):
+        assert canonicalize_url(value) == value.strip()
+
+    def test_idempotent(self):
+        for _, variants in CORPUS:
+            for v in variants:
+                once = canonicalize_url(v)
+                assert canonicalize_url(once) == once
+
+
+class TestNormalizeQuery:
+    def test_folds_case_width_and_whitespace(self):
+        assert normalize_query("  英伟达　ＮＶＩＤＩＡ   财报 ") == "英伟达 nvidia 财报"
+        assert normalize_query("NVDA earnings") == normalize_query("nvda  EARNINGS")
@@ -10,13 +10,15 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for, R
 from datetime import datetime
 import json
 import hashlib
+import time
 
 from core.llm_factory import create_llm_client, get_llm_config, GEMINI_MODELS, normalize_provider
-from core.storage import Storage
+from core.storage import create_storage
 from core.interview import InterviewManager
 from core.environment import EnvironmentCollector
 from core.research import ResearchEngine
 from core.preference_learner import PreferenceLearner
+from core.retrieval import SEARCH_METRICS, provider_yield_summary
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # 用于 session
@@ -70,7 +72,7 @@ def requires_auth(f):
     return decorated
 
 # 初始化
-storage = Storage()
+storage = create_storage()
 client = None
 interview_manager = None
 env_collector = None
@@ -109,13 +111,8 @@ def api_setup_auth():
     password = data.get('password', '')
     enable = data.get('enable', True)
 
-    config = storage.get_config()
-
-    if password:
-        config['auth_password_hash'] = hashlib.sha256(password.encode()).hexdigest()
-    config['auth_enabled'] = enable
-
-    storage.save_config(config)
+    password_hash = hashlib.sha256(password.encode()).hexdigest() if password else None
+    storage.set_auth_config(enable, password_hash)
     return jsonify({'success': True, 'auth_enabled': enable})
 
 
@@ -213,22 +210,26 @@ def logout():
 
 # ==================== 页面路由 ====================
 
+def _stock_playbooks(with_last_research=False):
+    """所有股票的 Playbook（经由 storage.list_stocks，兼容 JSON / SQLite 后端）"""
+    playbooks = []
+    for entry in storage.list_stocks():
+        playbook = storage.get_stock_playbook(entry['stock_id'])
+        if not playbook:
+            continue
+        if with_last_research:
+            history = storage.get_recent_research(entry['stock_id'], limit=1)
+            playbook['last_research'] = history[0] if history else None
+        playbooks.append(playbook)
+    return playbooks
+
+
 @app.route('/')
 @requires_auth
 def index():
     """首页 - 仪表盘"""
     portfolio = storage.get_portfolio_playbook()
-    stocks = []
-    stocks_dir = storage.base_dir / "stocks"
-    if stocks_dir.exists():
-        for stock_dir in stocks_dir.iterdir():
-            if stock_dir.is_dir():
-                playbook = storage.get_stock_playbook(stock_dir.name)
-                if playbook:
-                    # 获取最近研究
-                    history = storage.get_recent_research(stock_dir.name, limit=1)
-                    playbook['last_research'] = history[0] if history else None
-                    stocks.append(playbook)
+    stocks = _stock_playbooks(with_last_research=True)
     return render_template('index.html', portfolio=portfolio, stocks=stocks)
 
 @app.route('/portfolio')
@@ -236,15 +237,7 @@ def index():
 def portfolio():
     """总体 Playbook 页面"""
     playbook = storage.get_portfolio_playbook()
-    stock_list = []
-    stocks_dir = storage.base_dir / "stocks"
-    if stocks_dir.exists():
-        for stock_dir in stocks_dir.iterdir():
-            if stock_dir.is_dir():
-                stock_playbook = storage.get_stock_playbook(stock_dir.name)
-                if stock_playbook:
-                    stock_list.append(stock_playbook)
-    return render_template('portfolio.html', playbook=playbook, stocks=stock_list)
+    return render_template('portfolio.html', playbook=playbook, stocks=_stock_playbooks())
 
 @app.route('/settings')
 @requires_auth
@@ -263,25 +256,14 @@ def settings_page():
 @requires_auth
 def stocks():
     """股票列表页面"""
-    stock_list = []
-    stocks_dir = storage.base_dir / "stocks"
-    if stocks_dir.exists():
-        for stock_dir in stocks_dir.iterdir():
-            if stock_dir.is_dir():
-                playbook = storage.get_stock_playbook(stock_dir.name)
-                if playbook:
-                    # 获取最近研究
-                    history = storage.get_recent_research(stock_dir.name, limit=1)
-                    playbook['last_research'] = history[0] if history else None
-                    stock_list.append(playbook)
-    return render_template('stocks.html', stocks=stock_list)
+    return render_template('stocks.html', stocks=_stock_playbooks(with_last_research=True))
 
 @app.route('/stock/<stock_id>')
 @requires_auth
 def stock_detail(stock_id):
     """个股详情页面"""
     playbook = storage.get_stock_playbook(stock_id)
-    history = storage.get_recent_research(stock_id, limit=10)
+    history = storage.get_recent_research(stock_id, limit=10, include_report=True)
     return render_template('stock_detail.html', playbook=playbook, history=history, stock_id=stock_id)
 
 @app.route('/add-stock')
@@ -293,16 +275,13 @@ def add_stock():
 def research_history():
     """研究历史页面"""
     all_history = []
-    stocks_dir = storage.base_dir / "stocks"
-    if stocks_dir.exists():
-        for stock_dir in stocks_dir.iterdir():
-            if stock_dir.is_dir():
-                playbook = storage.get_stock_playbook(stock_dir.name)
-                history = storage.get_recent_research(stock_dir.name, limit=20)
-                for h in history:
-                    h['stock_name'] = playbook.get('stock_name', stock_dir.name) if playbook else stock_dir.name
-                    h['stock_id'] = stock_dir.name
-                    all_history.append(h)
+    for stock in storage.list_stocks():
+        # 报告正文在展开时通过 /report 接口按需加载
+        history = storage.query_research_history(stock['stock_id'], limit=20)["records"]
+        for h in history:
+            h['stock_name'] = stock.get('stock_name') or stock['stock_id']
+            h['stock_id'] = stock['stock_id']
+            all_history.append(h)
     # 按日期排序
     all_history.sort(key=lambda x: x.get('date', ''), reverse=True)
     return render_template('research_history.html', history=all_history)
@@ -321,36 +300,35 @@ def preferences_page():
 @app.route('/batch-scan')
 def batch_scan_page():
     """批量扫描页面"""
-    # 获取所有股票及其研究状态
+    # 获取所有股票及其研究状态（由 stocks manifest 提供，不逐个读取 Playbook / 历史）
     stocks = []
-    stocks_dir = storage.base_dir / "stocks"
-    if stocks_dir.exists():
-        for stock_dir in stocks_dir.iterdir():
-            if stock_dir.is_dir():
-                playbook = storage.get_stock_playbook(stock_dir.name)
-                if playbook:
-                    history = storage.get_recent_research(stock_dir.name, limit=1)
-                    last_research = history[0] if history else None
-
-                    # 计算天数间隔
-                    days_since = 30  # 默认30天
-                    if last_research and last_research.get('date'):
-                        from datetime import datetime
-                        try:
-                            last_date = datetime.fromisoformat(last_research['date'].replace('Z', '+00:00'))
-                            days_since = (datetime.now() - last_date.replace(tzinfo=None)).days
-                            days_since = max(1, days_since)  # 至少1天
-                        except:
-                            pass
-
-                    stocks.append({
-                        'stock_id': stock_dir.name,
-                        'stock_name': playbook.get('stock_name', stock_dir.name),
-                        'ticker': playbook.get('ticker', ''),
-                        'core_thesis': playbook.get('core_thesis', {}).get('summary', ''),
-                        'last_research': last_research,
-                        'days_since': days_since
-                    })
+    for entry in storage.list_stocks():
+        last_research = None
+        if entry.get('last_research_date'):
+            last_research = {
+                'id': entry.get('last_research_id'),
+                'date': entry['last_research_date'],
+                'research_result': {'recommendation': entry.get('last_recommendation')},
+            }
+
+        # 计算天数间隔
+        days_since = 30  # 默认30天
+        if last_research:
+            try:
+                last_date = datetime.fromisoformat(last_research['date'].replace('Z', '+00:00'))
+                days_since = (datetime.now() - last_date.replace(tzinfo=None)).days
+                days_since = max(1, days_since)  # 至少1天
+            except:
+                pass
+
+        stocks.append({
+            'stock_id': entry['stock_id'],
+            'stock_name': entry.get('stock_name', entry['stock_id']),
+            'ticker': entry.get('ticker', ''),
+            'core_thesis': entry.get('summary', ''),
+            'last_research': last_research,
+            'days_since': days_since
+        })
 
     return render_template('batch_scan.html', stocks=stocks)
 
@@ -392,10 +370,7 @@ def api_save_stock(stock_id):
 @app.route('/api/stock/<stock_id>', methods=['DELETE'])
 def api_delete_stock(stock_id):
     """删除股票"""
-    import shutil
-    stock_dir = storage.base_dir / "stocks" / stock_id.lower().replace(" ", "_")
-    if stock_dir.exists():
-        shutil.rmtree(stock_dir)
+    storage.delete_stock(stock_id)
     return jsonify({'success': True})
 
 @app.route('/api/interview/start', methods=['POST'])
@@ -744,11 +719,38 @@ def api_execute_research(stock_id):
 
     return jsonify(result)
 
+HISTORY_PAGE_MAX = 100
+
 @app.route('/api/research/<stock_id>/history', methods=['GET'])
 def api_get_research_history(stock_id):
-    """获取研究历史"""
-    history = storage.get_recent_research(stock_id, limit=20)
-    return jsonify(history)
+    """分页获取研究历史（默认不含 full_report，按需通过 /report 接口加载）
+
+    参数：before_id（上一页的 next_cursor）、limit、fields（summary / record / full）、
+    milestone_only、recommendation、date_from、date_to
+    """
+    limit = max(1, min(request.args.get('limit', 20, type=int), HISTORY_PAGE_MAX))
+    fields = request.args.get('fields', 'record')
+    if fields not in storage.HISTORY_FIELDS:
+        return jsonify({'error': f'fields 必须是 {", ".join(storage.HISTORY_FIELDS)} 之一'}), 400
+    page = storage.query_research_history(
+        stock_id,
+        before_id=request.args.get('before_id') or None,
+        limit=limit,
+        fields=fields,
+        milestone_only=request.args.get('milestone_only', '').lower() in ('1', 'true', 'yes'),
+        recommendation=request.args.get('recommendation') or None,
+        date_from=request.args.get('date_from') or None,
+        date_to=request.args.get('date_to') or None,
+    )
+    return jsonify(page)
+
+@app.route('/api/research/<stock_id>/report/<record_id>', methods=['GET'])
+def api_get_research_report(stock_id, record_id):
+    """按需获取单条研究记录的完整报告"""
+    report = storage.get_research_report(stock_id, record_id)
+    if report is None:
+        return jsonify({'error': '没有找到研究报告'}), 404
+    return jsonify({'record_id': record_id, 'full_report': report})
 
 @app.route('/api/research/<stock_id>/feedback', methods=['POST'])
 def api_save_research_feedback(stock_id):
@@ -883,6 +885,18 @@ def api_get_interactions():
     interactions = storage.get_recent_interactions(limit)
     return jsonify(interactions)
 
+# ==================== 检索指标 API ====================
+
+@app.route('/api/metrics/retrieval', methods=['GET'])
+def api_retrieval_metrics():
+    """检索指标（进程内）：各 Provider 成本/产出汇总 + 全部计数器与直方图；?caller= 按调用方过滤汇总"""
+    caller = request.args.get('caller') or None
+    return jsonify({
+        'caller': caller,
+        'providers': provider_yield_summary(caller=caller),
+        'metrics': SEARCH_METRICS.snapshot(),
+    })
+
 # ==================== 批量扫描 API ====================
 
 @app.route('/api/batch-scan/stock/<stock_id>', methods=['POST'])
@@ -898,15 +912,17 @@ def api_scan_single_stock(stock_id):
     playbook = storage.get_stock_playbook(stock_id)
     stock_name = playbook.get('stock_name', stock_id) if playbook else stock_id
 
-    # 采集新闻（现在返回包含元数据的字典）
+    # 采集新闻（现在返回包含元数据的字典）；批量扫描允许先返回过期缓存、后台刷新
+    t0 = time.monotonic()
     try:
-        news_result = env_collector.collect_news(stock_id, stock_name, days)
+        news_result = env_collector.collect_news(stock_id, stock_name, days, allow_stale=True)
     except Exception as e:
         import logging
         logging.getLogger(__name__).error(f"batch_scan collect_news failed for {stock_id}: {type(e).__name__}: {e}")
         news_result = {'news': [], 'search_metadata': {'error': str(e)}}
     news = news_result.get('news', [])
     search_metadata = news_result.get('search_metadata', {})
+    t1 = time.monotonic()
 
     # 评估影响
     assessment = env_collector.assess_impact(
@@ -915,6 +931,7 @@ def api_scan_single_stock(stock_id):
         auto_collected=news,
         user_uploaded=[]
     )
+    t2 = time.monotonic()
 
     # 检查失效条件（如果 Playbook 存在）
     invalidation_warnings = []
@@ -951,7 +968,8 @@ def api_scan_single_stock(stock_id):
         'key_risk': assessment.get('conclusion', {}).get('key_risk', ''),
         'key_opportunity': assessment.get('conclusion', {}).get('key_opportunity', ''),
         'search_metadata': search_metadata,  # 搜索警告
-        'invalidation_warnings': invalidation_warnings  # 失效条件警告
+        'invalidation_warnings': invalidation_warnings,  # 失效条件警告
+        'timing_ms': {'collect_news': round((t1 - t0) * 1000), 'assess_impact': round((t2 - t1) * 1000)},
     })
 
 @app.route('/api/batch-scan/research/<stock_id>', methods=['POST'])